@@ -0,0 +1,101 @@
+"""Codecs of the payloads stored by the Redis DAOs.
+
+A payload is either JSON, the original format, or a compact binary format:
+a header of two bytes (magic and version) followed by a msgpack array with
+the values of the fields in a fixed order, so the field names are not
+repeated in every payload. Lists of booleans are bit-packed.
+
+The codec of a payload is chosen by the entity type it stores (see
+``register_codec``), whatever the key layout of the Redis DAOs. Page
+sections in their own hash store each field as JSON, so their codec only
+reads and writes the payloads of the legacy ``PageSection`` hash. Reads
+detect the format of each payload, so a keyspace with JSON and binary
+payloads can be read while it is migrated. msgpack is optional, without it
+every payload is written as JSON.
+"""
+
+import json
+import struct
+from typing import Dict, List, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 0xc1 is never used by msgpack and never starts a JSON text
+MAGIC = 0xc1
+VERSION = 1
+
+# msgpack extension type of the bit-packed lists of booleans
+_BOOL_LIST_TYPE = 1
+
+
+def pack_bools(values: List[bool]) -> bytes:
+    bits = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value:
+            bits[i >> 3] |= 1 << (i & 7)
+    return struct.pack('>I', len(values)) + bytes(bits)
+
+
+def unpack_bools(data: bytes) -> List[bool]:
+    (size,) = struct.unpack_from('>I', data)
+    bits = data[4:]
+    return [bool(bits[i >> 3] & (1 << (i & 7))) for i in range(size)]
+
+
+class PayloadCodec():
+    def __init__(self, fields: List[str], binary: bool=True):
+        # New fields must be added at the end, older payloads read them as None
+        self.fields = list(fields)
+        self.binary = binary and msgpack is not None
+
+    def encode(self, data: dict) -> Union[bytes, str]:
+        if not self.binary:
+            return json.dumps(data)
+
+        values = [self._pack_value(data.get(field)) for field in self.fields]
+        return bytes([MAGIC, VERSION]) + msgpack.packb(values, use_bin_type=True)
+
+    def decode(self, payload: Union[bytes, str]) -> dict:
+        if payload is None:
+            return None
+
+        if isinstance(payload, bytes) and payload[:1] == bytes([MAGIC]):
+            if msgpack is None:
+                raise Exception('msgpack is required to read binary payloads!')
+            if payload[1] != VERSION:
+                raise Exception(f'The payload version {payload[1]} is not supported!')
+
+            values = msgpack.unpackb(payload[2:], raw=False, ext_hook=self._ext_hook)
+            values += [None] * (len(self.fields) - len(values))
+            return dict(zip(self.fields, values))
+
+        return json.loads(payload)
+
+    @staticmethod
+    def _pack_value(value):
+        if isinstance(value, list) and value and all(isinstance(v, bool) for v in value):
+            return msgpack.ExtType(_BOOL_LIST_TYPE, pack_bools(value))
+        return value
+
+    @staticmethod
+    def _ext_hook(code: int, data: bytes):
+        if code == _BOOL_LIST_TYPE:
+            return unpack_bools(data)
+        return msgpack.ExtType(code, data)
+
+
+_codecs: Dict[str, PayloadCodec] = dict()
+
+
+def register_codec(entity_type: str, codec: PayloadCodec) -> None:
+    _codecs[entity_type] = codec
+
+
+def get_codec(entity_type: str) -> PayloadCodec:
+    codec = _codecs.get(entity_type)
+    if codec is None:
+        raise Exception(f'There is no codec registered for the entity type "{entity_type}"!')
+    return codec
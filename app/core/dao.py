@@ -21,6 +21,12 @@ class AbstractDAO(abc.ABC):
     def get_by_id(self, entity) -> 'entity':
         """Get entity as a parameter to be found by id on database
         """
+
+    @abc.abstractmethod
+    def get_many(self, ids) -> List['entity']:
+        """Get a list of ids to be found on database with a single bulk lookup.
+        The result keeps the order of the ids and has None for each id not found
+        """
     
     @abc.abstractmethod
     def update(self, entity) -> 'entity':
@@ -49,6 +55,9 @@ class _DAO(AbstractDAO):
     def get_by_id(self, entity) -> 'entity':
         pass
 
+    def get_many(self, ids) -> List['entity']:
+        pass
+
     def update(self, entity) -> bool:
         pass
 
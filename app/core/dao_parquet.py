@@ -1,123 +1,174 @@
 import datetime
 import os.path
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 
 from app.core.dao import AbstractDAO
-from app.model import Group, Notebook, PageSection, Sentence
+from app.core.dataset import ParquetDataset
+from app.core.hash_index import HashIndex
+from app.core.sequence import SequenceStore
+from app.core.session import Session
+from app.core.table_cache import table_cache
+from app.model import (PAGE_SECTION_COLUMNS, Group, Notebook, PageSection, Sentence, SentenceProgress,
+                       advance_sentence_progress, attributes, lineage_section_numbers)
 
 # The directory containing this file
 HERE = os.path.abspath(os.path.dirname(__file__))
 
-notebook_file = Path(HERE).parent / 'data_base' / 'notebook.parquet'
+data_base_dir = Path(HERE).parent / 'data_base'
+
 notebook_columns = ['id', 'name', 'created_at', 'updated_at', 'list_size', 'days_period', 'foreign_idiom', 'mother_idiom']
 notebook_types = ['int64', str, 'datetime64[ns]', 'datetime64[ns]', 'Int64', 'Int64', str, str]
-if not notebook_file.exists():
-    df = pd.DataFrame(columns=notebook_columns)
-    df = df.astype(dict(zip(notebook_columns, notebook_types)))
-    df.to_parquet(notebook_file, index=False)
+notebook_dataset = ParquetDataset(data_base_dir / 'notebook',
+                                  columns=notebook_columns,
+                                  types=notebook_types,
+                                  key=['id'],
+                                  legacy_file=data_base_dir / 'notebook.parquet')
 
 
-page_section_file = Path(HERE).parent / 'data_base' / 'page_section.parquet'
 page_section_columns = ['id',    'created_at',       'section_number',   'page_number',  'created_by_id',    'group',    'distillation_at', 'distillation_actual', 'distillated', 'memorized',   'translated_sentence', 'sentence_id',   'notebook_id']
 page_section_types   = ['Int64', 'datetime64[ns]',    'Int64',            'Int64',        'Int64',            str,        'datetime64[ns]',  'datetime64[ns]',       bool,         bool,          str,                    'Int64',        'Int64']
-if not page_section_file.exists():
-    df = pd.DataFrame(columns=page_section_columns)
-    df = df.astype(dict(zip(page_section_columns, page_section_types)))
-    df.to_parquet(page_section_file, index=False)
+# Each page section is a set of rows (one per sentence) partitioned by notebook,
+# an update appends a new version of all rows of the section
+page_section_dataset = ParquetDataset(data_base_dir / 'page_section',
+                                      columns=page_section_columns,
+                                      types=page_section_types,
+                                      key=['section_number'],
+                                      row_key=['section_number', 'id'],
+                                      partition_by='notebook_id',
+                                      sort_by=['distillation_at', 'section_number', 'id'],
+                                      legacy_file=data_base_dir / 'page_section.parquet')
 
 
-sentence_file = Path(HERE).parent / 'data_base' / 'sentence.parquet'
 sentence_columns = ['id', 'created_at', 'foreign_language', 'mother_tongue', 'foreign_idiom', 'mother_idiom',]
 sentence_types = ['Int64', 'datetime64[ns]', str, str, str, str]
-if not sentence_file.exists():
-    df = pd.DataFrame(columns=sentence_columns)
-    df = df.astype(dict(zip(sentence_columns, sentence_types)))
-    df.to_parquet(sentence_file, index=False)
+sentence_dataset = ParquetDataset(data_base_dir / 'sentence',
+                                  columns=sentence_columns,
+                                  types=sentence_types,
+                                  key=['id'],
+                                  legacy_file=data_base_dir / 'sentence.parquet')
+
+sentence_progress_columns = ['sentence_id', 'notebook_id', 'section_number', 'group', 'created_at', 'last_distillation_at', 'next_distillation_at', 'memorized']
+sentence_progress_types   = ['Int64',       'Int64',       'Int64',          str,     'datetime64[ns]', 'datetime64[ns]', 'datetime64[ns]', bool]
+# The progress of each sentence of a notebook, kept by PageSectionDAO.flush
+sentence_progress_dataset = ParquetDataset(data_base_dir / 'sentence_progress',
+                                           columns=sentence_progress_columns,
+                                           types=sentence_progress_types,
+                                           key=['notebook_id', 'sentence_id'],
+                                           partition_by='notebook_id',
+                                           sort_by=['sentence_id'])
+# Persistent counters for ids, section numbers and page numbers
+sequence_store = SequenceStore(data_base_dir / 'sequence.json')
+
+# Persistent index from the normalized foreign_language to the sentence id
+sentence_index = HashIndex(data_base_dir / 'sentence_foreign_language.index',
+                           rebuild=lambda: table_cache.read(sentence_dataset)[['foreign_language', 'id']] \
+                                                      .itertuples(index=False))
 
 
 
 class NotebookDAO(AbstractDAO):
 
+    def __init__(self, session: Session=None):
+        self.session = session
+
     def insert(self, entity: Notebook) -> Notebook:
-        # Load notebook dataframe by notebook_file
-        df = pd.read_parquet(notebook_file)
+        # Load notebook dataframe by notebook_dataset
+        df = table_cache.read(notebook_dataset)
 
         # Checks if exists a notebook with same name
         has_notebook = df[df['name'].str.upper() == entity.name.upper()]['name'].to_list()
+        if self.session is not None:
+            has_notebook += [n.name for n in self.session.pending_new(Notebook) if n.name.upper() == entity.name.upper()]
         if has_notebook:
             raise Exception(f'Notebook name "{entity.name}" already exists. Choice another name to notebook')
         
-        # Checks maximum id that exist in the notebook dataframe
-        if df.empty:
-            new_id = 1
+        # Get a id sequence to notebook
+        entity.id = sequence_store.next_value('notebook_id_sequence',
+                                              seed=lambda: df['id'].max())
+
+        if self.session is not None:
+            self.session.add_new(self, Notebook, entity.id, entity)
         else:
-            new_id = df['id'].max() + 1
+            self.flush([entity], [])
 
-        # Add maximum id that exist in the notebook dataframe plus 1 into notebook object id 
-        entity.id = new_id
+        return entity
 
-        # Registry new notebook into dataframe using pd.concat method 
-        df_registro = pd.DataFrame(entity.data_to_dataframe())
-        df_concat = pd.concat([df, df_registro], ignore_index=True)
 
-        df_concat.to_parquet(notebook_file)
+    def flush(self, inserted: List[Notebook], updated: List[Notebook]) -> None:
+        # Appends the notebooks to the dataset as a new fragment
+        df_registro = pd.DataFrame([row for entity in inserted + updated for row in entity.data_to_dataframe()])
+        table_cache.append(notebook_dataset, df_registro)
 
-        return entity
 
+    def get_all(self, entity: Notebook=None, *, eager: bool=False) -> List[Notebook]:
+        """The page sections of each notebook are loaded on the first access to page_section_list,
+        or all at once with eager=True
+        """
+        df_notebook = table_cache.read(notebook_dataset)
 
-    def get_all(self, entity: Notebook=None) -> List[Notebook]:
-        df_notebook = pd.read_parquet(notebook_file)
-
-        page_section_dao = PageSectionDAO()
-        
-        notebook_list = []
-        for index, row in df_notebook.iterrows():
-            page_section_list = page_section_dao.find_by_field(
-                PageSection(notebook=Notebook(id_=row['id']))
-            )
+        page_section_dict = dict()
+        if eager:
+            for page_section in PageSectionDAO(self.session).find_by_field(PageSection()):
+                page_section_dict.setdefault(page_section.notebook.id, []).append(page_section)
 
-            notebook_list.append(
-                Notebook(name=row['name'],
-                         id_=row['id'],
-                         created_at=row['created_at'],
-                         updated_at=row['updated_at'],
-                         list_size=row['list_size'],
-                         days_period=row['days_period'],
-                         foreign_idiom=row['foreign_idiom'],
-                         mother_idiom=row['mother_idiom'],
-                         page_section_list=page_section_list
-                )
-            )
+        notebook_list = self.build_notebooks(df_notebook)
+        for notebook in notebook_list:
+            if eager:
+                notebook.page_section_list = page_section_dict.get(notebook.id, [])
+            else:
+                notebook.set_page_section_loader(self.load_page_section_list)
 
         return notebook_list
 
 
+    def load_page_section_list(self, notebook: Notebook) -> List[PageSection]:
+        return PageSectionDAO().find_by_field(PageSection(notebook=Notebook(id_=notebook.id)))
+
+
     def get_by_id(self, entity: Notebook) -> Notebook:
-        df = pd.read_parquet(notebook_file)
+        return self.get_dict_by_ids([entity.id]).get(entity.id)
 
-        df_result = df[df['id'] == entity.id]
 
-        if df_result.empty:
-            return None
-
-        notebook = Notebook()
-        for index, row in df_result.iterrows():            
-
-            notebook.id = row['id']
-            notebook.name = row['name']
-            notebook.created_at = row['created_at']
-            notebook.updated_at = row['updated_at']
-            notebook.list_size = row['list_size']
-            notebook.days_period = row['days_period']
-            notebook.foreign_idiom = row['foreign_idiom']
-            notebook.mother_idiom = row['mother_idiom']
-            
+    def get_many(self, ids: List[int]) -> List[Notebook]:
+        notebook_dict = self.get_dict_by_ids(ids)
+        return [notebook_dict.get(id_) for id_ in ids]
+
 
-        return notebook
+    def get_dict_by_ids(self, ids: List[int]) -> Dict[int, Notebook]:
+        # Only the notebooks missing from the session are read
+        notebook_dict = self.session.get_many(Notebook, ids) if self.session is not None else dict()
+
+        missing_ids = [id_ for id_ in ids if id_ not in notebook_dict]
+        if missing_ids:
+            df_result = table_cache.query(notebook_dataset, [('id', 'in', missing_ids)])
+            notebook_dict.update({n.id: n for n in self.build_notebooks(df_result)})
+
+        return notebook_dict
+
+
+    def build_notebooks(self, df_result: pd.DataFrame) -> List[Notebook]:
+        notebook_list = []
+        # As object columns the Int64 values come out as int, which timedelta accepts
+        for row in df_result.astype(object).itertuples(index=False):
+            notebook = Notebook()
+            notebook.id = row.id
+            notebook.name = row.name
+            notebook.created_at = row.created_at
+            notebook.updated_at = row.updated_at
+            notebook.list_size = row.list_size
+            notebook.days_period = row.days_period
+            notebook.foreign_idiom = row.foreign_idiom
+            notebook.mother_idiom = row.mother_idiom
+            if self.session is not None:
+                notebook = self.session.register(Notebook, notebook.id, notebook)
+            notebook_list.append(notebook)
+
+        return notebook_list
 
 
     def update(self, entity: Notebook) -> Notebook:
@@ -135,9 +186,10 @@ class NotebookDAO(AbstractDAO):
 
 class PageSectionDAO(AbstractDAO):
 
-    def insert(self, entity: PageSection) -> PageSection:
-        df = pd.read_parquet(page_section_file)
+    def __init__(self, session: Session=None):
+        self.session = session
 
+    def insert(self, entity: PageSection) -> PageSection:
         if entity.created_at:
             # Checks if the group already exists on the same date
             check_page_section = PageSection(group=entity.group, 
@@ -145,32 +197,35 @@ class PageSectionDAO(AbstractDAO):
                                             notebook=entity.notebook)
             
             page_section_result_list = self.find_by_field(check_page_section)        
+            if self.session is not None:
+                page_section_result_list += [
+                    p for p in self.session.pending_new(PageSection)
+                    if p.group == entity.group and p.created_at == entity.created_at \
+                        and p.notebook.id == entity.notebook.id
+                ]
 
             if len(page_section_result_list) > 0:
                 raise Exception(f'There is already a page for the group {entity.group.value} and selected day {entity.created_at}!')
 
-        if df.empty:
-            next_section_number = 1
-            next_id = 1
-            next_page = 1
-        else:
-            next_section_number = df['section_number'].max() + 1
-            next_id = df['id'].max() + 1
-            next_page = df[df['notebook_id'] == entity.notebook.id]['page_number'].max() + 1
-        
-        if not next_section_number:
-            next_section_number = 1
-
-        if pd.isna(next_id):
-            next_id = 1
-
-        if pd.isna(next_page):
-            next_page = 1
-
-        next_page = entity.page_number if entity.page_number is not None else next_page
-    
+        next_section_number = sequence_store.next_value(
+            'section_number_sequence',
+            seed=lambda: table_cache.read(page_section_dataset)['section_number'].max()
+        )
+
+        # Each sentence of the page section is a row with its own id
+        next_id = sequence_store.next_value(
+            'page_section_id_sequence',
+            count=max(len(entity.sentences), 1),
+            seed=lambda: table_cache.read(page_section_dataset)['id'].max()
+        )
+
+        next_page = entity.page_number
+        if next_page is None:
+            next_page = sequence_store.next_value(
+                f'pg_num_nb{entity.notebook.id}_sequence',
+                seed=lambda: self.get_max_page_number(entity.notebook.id)
+            )
 
-        # Add maximum id that exist in the page_section dataframe plus 1 into page_section object id 
         page_section = PageSection()
         page_section.set_id(next_id)
         page_section.page_number = next_page
@@ -186,102 +241,98 @@ class PageSectionDAO(AbstractDAO):
         page_section.memorializeds = entity.memorializeds
         page_section.notebook = entity.notebook
 
-        # Registry new page_section into dataframe using pd.concat method 
-        df_registro = pd.DataFrame(page_section.data_to_dataframe())
-        df_concat = pd.concat([df, df_registro], ignore_index=True)
-
-        df_concat.to_parquet(page_section_file)
+        if self.session is not None:
+            self.session.add_new(self, PageSection, page_section.section_number, page_section)
+        else:
+            self.flush([page_section], [])
 
         return page_section
+
+
+    def flush(self, inserted: List[PageSection], updated: List[PageSection]) -> None:
+        # Appends the rows of the page sections to the dataset, an update is a new version of all rows
+        df_registro = pd.concat([entity.to_frame() for entity in inserted + updated], ignore_index=True)
+        table_cache.append(page_section_dataset, df_registro)
+
+        SentenceProgressDAO().advance(inserted + updated)
     
 
     def get_all(self, entity: PageSection) -> List[PageSection]:
         pass
 
+
+    def get_max_page_number(self, notebook_id: int) -> int:
+        df = table_cache.query(page_section_dataset,
+                               [('notebook_id', '==', notebook_id)],
+                               columns=['page_number'])
+        return df['page_number'].max()
+
     
     def get_by_id(self, entity: PageSection) -> PageSection:
-        df = pd.read_parquet(page_section_file)
+        return self.get_many([entity.section_number])[-1]
 
-        df_result = df[df['section_number'] == entity.section_number]
 
-        if df_result.empty:
-            return None
-
-        sentence_dao = SentenceDAO()
-        notebook_dao = NotebookDAO()        
-
-        sentence_id_list         = []
-        translated_sentence_list = []
-        memorized_list           = []
-        id_list                  = []
-        for index, row in df_result.iterrows():
-            id_list.append(row['id'])
-            sentence_id_list.append(row['sentence_id'])
-            translated_sentence_list.append(row['translated_sentence'])
-            memorized_list.append(row['memorized'])
-        else:
-            sentences = []
-            for id_ in sentence_id_list:
-                sentences.append(
-                    sentence_dao.get_by_id(
-                        Sentence(id_=id_)
-                    )
-                )
+    def get_many(self, ids: List[int]) -> List[PageSection]:
+        # PageSection objects are identified by section_number, as in get_by_id
+        page_section_dict = self.session.get_many(PageSection, ids) if self.session is not None else dict()
 
-            notebook = notebook_dao.get_by_id(
-                Notebook(id_=row['notebook_id'])
-            )
-         
-            page_section = PageSection(
-                id_                  = min(id_list),
-                section_number          = row['section_number'],
-                created_at           = row['created_at'],                    
-                group                = Group(row['group']),
-                distillation_at      = row['distillation_at'],
-                distillation_actual   = row['distillation_actual'],
-                distillated          = row['distillated'],
-                memorializeds        = memorized_list,
-                translated_sentences = translated_sentence_list,
-                sentences            = sentences,
-                notebook             = notebook
-            )
-            return page_section
+        missing_ids = [id_ for id_ in ids if id_ not in page_section_dict]
+        if missing_ids:
+            df_result = table_cache.query(page_section_dataset, [('section_number', 'in', missing_ids)])
+            page_section_dict.update({
+                p.section_number: p for p in self.build_page_sections(df_result)
+            })
+
+        return [page_section_dict.get(id_) for id_ in ids]
 
     
     def update(self, entity: PageSection) -> PageSection:
-        df = pd.read_parquet(page_section_file)
-
-        df_page = df[df['section_number'] == entity.section_number]
-
-        is_distillated = df_page['distillated'].tolist()[-1]
+        pending = self.session.get_pending(PageSection, entity.section_number) if self.session is not None else None
+
+        if pending is not None:
+            is_distillated = pending.distillated
+            id_list = [pending.id]
+            stored = {'created_by_id'       : pending.created_by_id,
+                      'page_number'         : pending.page_number,
+                      'distillation_actual' : pending.distillation_actual}
+        else:
+            df_page = table_cache.query(page_section_dataset,
+                                        [('section_number', '==', entity.section_number)],
+                                        columns=['id', 'distillated', 'created_by_id', 'page_number', 'distillation_actual'])
+            is_distillated = df_page['distillated'].tolist()[-1]
+            id_list = df_page['id'].tolist()
+            stored = {name: value if pd.notna(value) else None
+                      for name, value in df_page.astype(object).iloc[-1].items()}
 
         if is_distillated:
             raise Exception(f'Changing PageSection "group {entity.group.value}" is not allowed because it has already been distilled.')
 
-        id_list = df_page['id'].tolist()
         entity.set_id(min(id_list))
 
-        df.drop(df[df['section_number'] == entity.section_number].index, inplace=True)
-
-        # Registry new page_section into dataframe using pd.concat method 
-        df_registro = pd.DataFrame(entity.data_to_dataframe())
-        df_concat = pd.concat([df, df_registro], ignore_index=True)
-
-        df_concat.to_parquet(page_section_file)
+        # The page sections built by the pages do not carry the fields set on insert or on distillation
+        if entity.created_by_id is None and stored['created_by_id'] is not None:
+            entity.set_created_by_loader(int(stored['created_by_id']), self.load_created_by)
+        if entity.page_number is None and stored['page_number'] is not None:
+            entity.page_number = int(stored['page_number'])
+        if entity.distillation_actual is None:
+            entity.distillation_actual = stored['distillation_actual']
+
+        # Writes a new version of the page_section rows, readers keep only the latest one
+        if self.session is not None:
+            self.session.add_dirty(self, PageSection, entity.section_number, entity)
+        else:
+            self.flush([], [entity])
 
         return entity
 
 
     def find_by_field(self, entity: PageSection) -> List[PageSection]:
-        df = pd.read_parquet(page_section_file)
-        df_result = df.copy()
+        query_filters = []
 
-        notebook_dao = NotebookDAO()
-        sentence_dao = SentenceDAO()
-
-        pages = df_result['section_number'].unique().tolist()
-        
-        filters = dict([v for v in vars(entity).items() if not v[0].startswith('_') and bool(v[-1])])
+        filters = dict([v for v in attributes(entity).items() if not v[0].startswith('_') and bool(v[-1])])
+        if 'created_by' not in filters and entity.created_by_id is not None:
+            # created_by is not loaded yet, its section number is known
+            filters['created_by_id'] = entity.created_by_id
         for attr, value in filters.items():
             if not bool(value): continue
 
@@ -292,74 +343,129 @@ class PageSectionDAO(AbstractDAO):
                 value = value.value            
             elif isinstance(value, PageSection):
                 attr = 'created_by_id'
-                value = value.created_by.section_number
+                value = value.section_number
             elif attr in 'created_at':
                 if isinstance(value, datetime.date):
                     value = value
                     # value = pd.to_datetime(value).strftime("%Y-%m-%d")
                 elif '#' in value:
                     value = None
-            elif attr in 'section_number distillated distillation_at':
+            elif attr in 'section_number created_by_id distillated distillation_at':
                 ...
             else:
                 raise Exception(f'This field "{attr}" cannot be used to find PageSection objects!')
             
-            df_result = df_result[df_result[attr] == value]
+            query_filters.append((attr, '==', value))
+
+        # The filters are pushed down to the dataset, so only the matching partitions and row groups are read
+        df_result = table_cache.query(page_section_dataset, query_filters)
+
+        return self.build_page_sections(df_result)
+
+
+    def find_due(self, notebook_id: int, start: datetime.date, end: datetime.date,
+                 group: Group=None) -> List[PageSection]:
+        """Finds the page sections of the notebook with distillation_at between start and end, both included
+        """
+        # The partition of the notebook is the only one read, and the fragments are sorted by
+        # distillation_at, so the row group statistics skip the rows out of the range
+        query_filters = [('notebook_id', '==', int(notebook_id)),
+                         ('distillation_at', '>=', start),
+                         ('distillation_at', '<=', end)]
+        if group is not None:
+            query_filters.append(('group', '==', group.value))
+
+        df_result = table_cache.query(page_section_dataset, query_filters)
+
+        return self.build_page_sections(df_result)
+
+
+    def count_by_group(self, notebook_id: int) -> Dict[str, int]:
+        """The number of page sections of the notebook with created_at, by group value
+        """
+        df = table_cache.query(page_section_dataset,
+                               [('notebook_id', '==', int(notebook_id))],
+                               columns=['section_number', 'group', 'created_at'])
+        df = df.drop_duplicates('section_number', keep='last')
+        return df[df['created_at'].notna()]['group'].value_counts().to_dict()
+
+
+    def lineage(self, entity: PageSection) -> List[PageSection]:
+        """The chain of page sections created one from another (A -> B -> C -> D) that has entity,
+        from the first one. The links of the notebook are read with a single query of two columns
+        """
+        # Only the page sections created by another one have a created_by_id
+        query_filters = [('created_by_id', '>=', 0)]
+        if entity.notebook is not None:
+            query_filters.append(('notebook_id', '==', int(entity.notebook.id)))
+
+        df_links = table_cache.query(page_section_dataset, query_filters, columns=['section_number', 'created_by_id'])
+        df_links = df_links.drop_duplicates('section_number', keep='last').dropna()
+        created_by_ids = dict(zip(df_links['section_number'].tolist(), df_links['created_by_id'].tolist()))
+
+        section_numbers = lineage_section_numbers(entity.section_number, created_by_ids)
 
+        return [p for p in self.get_many(section_numbers) if p is not None]
+
+
+    def load_created_by(self, page_section: PageSection) -> PageSection:
+        return self.get_many([page_section.created_by_id])[-1]
+
+
+    def build_page_sections(self, df_result: pd.DataFrame) -> List[PageSection]:
         if df_result.empty:
-            return []        
-        
-        result_list = list()
+            return []
 
-        pages = df_result['section_number'].unique().tolist()
+        # The rows are grouped by page, keeping the order of the pages and of their rows, so the
+        # per sentence columns of each page are a zero-copy slice of a single record batch
+        codes, section_numbers = pd.factorize(df_result['section_number'])
+        order = np.argsort(codes, kind='stable')
+        sizes = np.bincount(codes)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
 
-        for page in pages:
-            sentence_id_list         = []
-            translated_sentence_list = []
-            memorized_list           = []
-            id_list                  = []
+        df_sorted = df_result.iloc[order]
+        columns = pa.Table.from_pandas(df_sorted[PAGE_SECTION_COLUMNS.names], schema=PAGE_SECTION_COLUMNS,
+                                       preserve_index=False).combine_chunks().to_batches()[0]
+        first_ids = np.minimum.reduceat(df_sorted['id'].to_numpy(), starts)
+        sentence_ids = df_sorted['sentence_id'].tolist()
 
-            df_page = df_result.loc[df_result['section_number'] == page]
-            for index, row in df_page.iterrows():
-                id_list.append(row['id'])
-                sentence_id_list.append(row['sentence_id'])
-                translated_sentence_list.append(row['translated_sentence'])
-                memorized_list.append(row['memorized'])
-            else:
-                sentences = []
-                for id_ in sentence_id_list:
-                    sentences.append(
-                        sentence_dao.get_by_id(
-                            Sentence(id_=id_)
-                        )
-                    )
-
-                notebook = notebook_dao.get_by_id(
-                    Notebook(id_=row['notebook_id'])
-                )
+        df_pages = df_result.drop_duplicates('section_number', keep='last') \
+                            .set_index('section_number') \
+                            .loc[section_numbers]
 
-                created_by = self.get_by_id(
-                    PageSection(section_number=row['created_by_id'])
-                )
+        # One lookup against the sentence table for every sentence of every page
+        sentence_dict = SentenceDAO(self.session).get_dict_by_ids(df_result['sentence_id'].unique().tolist())
 
-                page_section = PageSection(
-                    id_                  = min(id_list),
-                    section_number          = row['section_number'],
-                    created_at           = row['created_at'],
-                    created_by           = created_by,
-                    group                = Group(row['group']),
-                    distillation_at      = row['distillation_at'],
-                    distillation_actual  = row['distillation_actual'],
-                    distillated          = row['distillated'],
-                    memorializeds        = memorized_list,
-                    translated_sentences = translated_sentence_list,
-                    sentences            = sentences,
-                    notebook             = notebook
-                )
+        # One lookup against the notebook table for every notebook of the pages
+        notebook_dict = NotebookDAO(self.session).get_dict_by_ids(df_pages['notebook_id'].unique().tolist())
 
-                result_list.append(page_section)
+        # The page sections they were created by are loaded on the first access to created_by
+        created_by_ids = df_pages['created_by_id'].astype(object).where(df_pages['created_by_id'].notna(), None).tolist()
+        page_numbers = df_pages['page_number'].astype(object).where(df_pages['page_number'].notna(), None).tolist()
+
+        result_list = list()
+        for section_number, first_id, start, size, created_by_id, page_number, row in zip(
+                section_numbers, first_ids, starts, sizes, created_by_ids, page_numbers, df_pages.itertuples(index=False)):
+            page_section = PageSection(
+                id_                  = int(first_id),
+                section_number       = section_number,
+                page_number          = page_number,
+                created_at           = row.created_at,
+                created_by_id        = created_by_id,
+                created_by_loader    = self.load_created_by,
+                group                = Group(row.group),
+                distillation_at      = row.distillation_at,
+                distillation_actual  = row.distillation_actual,
+                distillated          = row.distillated,
+                sentences            = [sentence_dict.get(id_) for id_ in sentence_ids[start:start + size]],
+                notebook             = notebook_dict.get(row.notebook_id),
+                columns              = columns.slice(start, size)
+            )
+            if self.session is not None:
+                page_section = self.session.register(PageSection, page_section.section_number, page_section)
+            result_list.append(page_section)
 
-        return list(result_list)
+        return result_list
     
 
     def delete(self, entity: PageSection) -> bool:
@@ -369,49 +475,78 @@ class PageSectionDAO(AbstractDAO):
 
 class SentenceDAO(AbstractDAO):
 
+    def __init__(self, session: Session=None):
+        self.session = session
+
     def insert(self, entity: Sentence) -> Sentence:
-         # Load sentence dataframe by sentence_file
-        df = pd.read_parquet(sentence_file)
+        return self.insert_many([entity])[-1]
+
+    def insert_many(self, entities: List[Sentence]) -> List[Sentence]:
+        if not entities:
+            return []
+
+        # Reserves a block of ids for all the new sentences
+        new_id = sequence_store.next_value('sentence_id_sequence',
+                                           count=len(entities),
+                                           seed=lambda: table_cache.read(sentence_dataset)['id'].max())
+
+        for id_, entity in enumerate(entities, start=new_id):
+            entity.id = id_
 
-        # Checks maximum id that exist in the sentence dataframe
-        if df.empty:
-            new_id = 1
+        if self.session is not None:
+            for entity in entities:
+                self.session.add_new(self, Sentence, entity.id, entity)
         else:
-            new_id = df['id'].max() + 1
+            self.flush(entities, [])
 
-        # Add maximum id that exist in the sentence dataframe plus 1 into sentence object id 
-        entity.id = new_id
+        return entities
 
-        # Registry new sentence into dataframe using pd.concat method 
-        df_registro = pd.DataFrame(entity.data_to_dataframe())
-        df_concat = pd.concat([df, df_registro], ignore_index=True)
 
-        df_concat.to_parquet(sentence_file)
+    def flush(self, inserted: List[Sentence], updated: List[Sentence]) -> None:
+        # Appends the sentences to the dataset as a single fragment
+        df_registro = pd.DataFrame([row for entity in inserted + updated for row in entity.data_to_dataframe()])
+        table_cache.append(sentence_dataset, df_registro)
 
-        return entity
+        sentence_index.add_many((entity.foreign_language, entity.id) for entity in inserted)
 
     def get_all(self, entity: Sentence) -> List[Sentence]:
         pass
 
     def get_by_id(self, entity: Sentence) -> Sentence:
-        df = pd.read_parquet(sentence_file)
+        return self.get_dict_by_ids([entity.id]).get(entity.id)
 
-        sentence = Sentence()
 
-        df_result = df[df['id'] == entity.id]
+    def get_many(self, ids: List[int]) -> List[Sentence]:
+        sentence_dict = self.get_dict_by_ids(ids)
+        return [sentence_dict.get(id_) for id_ in ids]
 
-        if df_result.empty:
-            return None
 
-        for index, row in df_result.iterrows():
-            sentence.id = row['id']
-            sentence.created_at = row['created_at']
-            sentence.foreign_language = row['foreign_language']
-            sentence.mother_tongue = row['mother_tongue']
-            sentence.foreign_idiom = row['foreign_idiom']
-            sentence.mother_idiom = row['mother_idiom']
+    def get_dict_by_ids(self, ids: List[int]) -> Dict[int, Sentence]:
+        # Only the sentences missing from the session are read
+        sentence_dict = self.session.get_many(Sentence, ids) if self.session is not None else dict()
 
-        return sentence
+        missing_ids = [id_ for id_ in ids if id_ not in sentence_dict]
+        if missing_ids:
+            df_result = table_cache.query(sentence_dataset, [('id', 'in', missing_ids)])
+            sentence_dict.update({s.id: s for s in self.build_sentences(df_result)})
+
+        return sentence_dict
+
+
+    def build_sentences(self, df_result: pd.DataFrame) -> List[Sentence]:
+        sentence_list = []
+        for row in df_result.itertuples(index=False):
+            sentence = Sentence(id_=row.id,
+                                created_at=row.created_at,
+                                foreign_language=row.foreign_language,
+                                mother_tongue=row.mother_tongue,
+                                foreign_idiom=row.foreign_idiom,
+                                mother_idiom=row.mother_idiom)
+            if self.session is not None:
+                sentence = self.session.register(Sentence, sentence.id, sentence)
+            sentence_list.append(sentence)
+
+        return sentence_list
 
 
     def update(self, entity: Sentence) -> List[Sentence]:
@@ -419,12 +554,15 @@ class SentenceDAO(AbstractDAO):
 
 
     def find_by_field(self, entity: Sentence) -> List[Sentence]:
-        df = pd.read_parquet(sentence_file)
-        df_result = df.copy()
+        filters = dict([v for v in attributes(entity).items() if not v[0].startswith('_') and bool(v[-1])])
+
+        # Exact match by foreign_language is answered by the index
+        if list(filters) == ['foreign_language']:
+            sentence = self.find_by_foreign_languages([entity.foreign_language]).get(entity.foreign_language)
+            return [] if sentence is None else [sentence]
+
+        query_filters = []
 
-        sentence_dao = SentenceDAO()
-        
-        filters = dict([v for v in vars(entity).items() if not v[0].startswith('_') and bool(v[-1])])
         for attr, value in filters.items():
             if not bool(value): continue
 
@@ -435,22 +573,33 @@ class SentenceDAO(AbstractDAO):
             else:
                 raise Exception(f'This field "{attr}" cannot be used to find PageSection objects!')
 
-            df_result = df_result[df_result[attr] == value]
+            query_filters.append((attr, '==', value))
+
+        df_result = table_cache.query(sentence_dataset, query_filters)
 
         if df_result.empty:
             return []
         
-        sentence_list = []
-        for index, row in df_result.iterrows():
-            sentence_filter = Sentence(id_=row['id'])
-            found_sentence = sentence_dao.get_by_id(sentence_filter)
+        return self.build_sentences(df_result)
 
-            if found_sentence:
-                sentence_list.append(
-                    found_sentence
-                )
-        
-        return sentence_list
+
+    def find_by_foreign_languages(self, values: List[str]) -> Dict[str, Sentence]:
+        ids = sentence_index.get_many(values)
+
+        # Sentences inserted in the session are not in the index until the commit
+        if self.session is not None:
+            pending_ids = {sentence_index.normalize(s.foreign_language): s.id for s in self.session.pending_new(Sentence)}
+            ids = [pending_ids.get(sentence_index.normalize(value), id_) for value, id_ in zip(values, ids)]
+
+        sentence_dict = self.get_dict_by_ids([id_ for id_ in ids if id_ is not None])
+
+        # An id without a sentence means the index is stale, so it is rebuilt once
+        if any(id_ is not None and id_ not in sentence_dict for id_ in ids):
+            sentence_index.rebuild()
+            ids = sentence_index.get_many(values)
+            sentence_dict = self.get_dict_by_ids([id_ for id_ in ids if id_ is not None])
+
+        return {value: sentence_dict[id_] for value, id_ in zip(values, ids) if id_ in sentence_dict}
 
 
     def delete(self, entity: Sentence) -> bool:
@@ -458,6 +607,136 @@ class SentenceDAO(AbstractDAO):
 
 
 
+class SentenceProgressDAO(AbstractDAO):
+    """The progress of the sentences of a notebook, one record per sentence written by
+    PageSectionDAO. Lookups by sentence id read a single partition
+    """
+
+    def insert(self, entity: SentenceProgress) -> SentenceProgress:
+        pass
+
+
+    def advance(self, page_sections: List[PageSection]) -> List[SentenceProgress]:
+        """Applies the inserted or updated page sections, in order, to the progress of their sentences
+        """
+        progress_dicts = dict()     # notebook id -> {sentence id: progress}
+        changed = dict()            # (notebook id, sentence id) -> progress
+        for page_section in page_sections:
+            if not page_section.created_at or page_section.notebook is None:
+                continue
+
+            notebook_id = page_section.notebook.id
+            progress_dict = progress_dicts.setdefault(notebook_id, dict())
+            missing_ids = [s.id for s in page_section.sentences if s is not None and s.id not in progress_dict]
+            if missing_ids:
+                found = self.get_dict_by_ids(missing_ids, notebook_id)
+                progress_dict.update({id_: found.get(id_) for id_ in missing_ids})
+
+            for progress in advance_sentence_progress(progress_dict, page_section):
+                changed[(notebook_id, progress.sentence_id)] = progress
+
+        if changed:
+            df_registro = pd.DataFrame([row for progress in changed.values() for row in progress.data_to_dataframe()])
+            table_cache.append(sentence_progress_dataset, df_registro)
+
+        return list(changed.values())
+
+
+    def rebuild(self, notebook_id: int) -> List[SentenceProgress]:
+        """Replays every page section of the notebook, e.g. for the notebooks written before the
+        progress was kept. The progress already stored for the notebook is replaced
+        """
+        page_section_list = PageSectionDAO().find_by_field(PageSection(notebook=Notebook(id_=notebook_id)))
+        page_section_list.sort(key=lambda p: (str(p.created_at), p.section_number))
+
+        progress_dict = dict()
+        changed = dict()
+        for page_section in page_section_list:
+            for progress in advance_sentence_progress(progress_dict, page_section):
+                changed[progress.sentence_id] = progress
+
+        df_registro = pd.DataFrame([row for progress in changed.values() for row in progress.data_to_dataframe()],
+                                   columns=sentence_progress_columns)
+        table_cache.replace_partition(sentence_progress_dataset, int(notebook_id), df_registro)
+
+        return list(changed.values())
+
+
+    def get_all(self, entity: SentenceProgress) -> List[SentenceProgress]:
+        return self.find_by_field(SentenceProgress(notebook_id=entity.notebook_id))
+
+
+    def get_by_id(self, entity: SentenceProgress) -> SentenceProgress:
+        return self.get_dict_by_ids([entity.sentence_id], entity.notebook_id).get(entity.sentence_id)
+
+
+    def get_many(self, ids: List[int], notebook_id: int=None) -> List[SentenceProgress]:
+        progress_dict = self.get_dict_by_ids(ids, notebook_id)
+        return [progress_dict.get(id_) for id_ in ids]
+
+
+    def get_dict_by_ids(self, ids: List[int], notebook_id: int=None) -> Dict[int, SentenceProgress]:
+        """The progress of each sentence in the notebook. Without the notebook every partition is read,
+        and a sentence of several notebooks gets the progress with the latest last_distillation_at
+        """
+        query_filters = [('sentence_id', 'in', list(ids))]
+        if notebook_id is not None:
+            query_filters.append(('notebook_id', '==', int(notebook_id)))
+        df_result = table_cache.query(sentence_progress_dataset, query_filters)
+        if notebook_id is None:
+            df_result = df_result.sort_values('last_distillation_at', kind='stable', na_position='first')
+        return {p.sentence_id: p for p in self.build_sentence_progress(df_result)}
+
+
+    def build_sentence_progress(self, df_result: pd.DataFrame) -> List[SentenceProgress]:
+        progress_list = []
+        # As object columns the Int64 values come out as int and the missing values as None
+        for row in df_result.astype(object).where(df_result.notna(), None).itertuples(index=False):
+            progress_list.append(
+                SentenceProgress(
+                    sentence_id          = row.sentence_id,
+                    notebook_id          = row.notebook_id,
+                    section_number       = row.section_number,
+                    group                = Group(row.group),
+                    created_at           = row.created_at,
+                    last_distillation_at = row.last_distillation_at,
+                    next_distillation_at = row.next_distillation_at,
+                    memorized            = row.memorized,
+                )
+            )
+
+        return progress_list
+
+
+    def update(self, entity: SentenceProgress) -> SentenceProgress:
+        pass
+
+
+    def find_by_field(self, entity: SentenceProgress) -> List[SentenceProgress]:
+        query_filters = []
+
+        filters = dict([v for v in attributes(entity).items() if bool(v[-1])])
+        for attr, value in filters.items():
+            if isinstance(value, Group):
+                value = value.value
+            elif attr in 'sentence_id notebook_id section_number next_distillation_at last_distillation_at memorized':
+                ...
+            else:
+                raise Exception(f'This field "{attr}" cannot be used to find SentenceProgress objects!')
+
+            query_filters.append((attr, '==', value))
+
+        df_result = table_cache.query(sentence_progress_dataset, query_filters)
+
+        return self.build_sentence_progress(df_result)
+
+
+    def delete(self, entity: SentenceProgress) -> bool:
+        pass
+
+
+
+
 
 if __name__ == '__main__':
 
@@ -1,27 +1,107 @@
 import datetime
+import functools
 import hashlib
 import json
 import os.path
-from typing import List
+from typing import Dict, List
 
-import pandas as pd
 import redis
-import streamlit as st
 
+from app.core.codec import PayloadCodec, get_codec, register_codec
 from app.core.dao import AbstractDAO
-from app.model import Group, Notebook, PageSection, Sentence
+from app.core.hash_index import normalize_text
+from app.core.near_cache import near_cache
+from app.core.redis_client import get_redis
+from app.core.redis_keys import KeyLayout, get_key_layout
+from app.model import (Group, Notebook, PageSection, Sentence, SentenceProgress, advance_sentence_progress, attributes,
+                       lineage_section_numbers)
 
 # The directory containing this file
 HERE = os.path.abspath(os.path.dirname(__file__))
 
+# Resolves each id of ARGV through an index hash (KEYS[1], id -> field) to the value of
+# the field in the data hash (KEYS[2]), so both lookups cost a single round trip
+HMGET_BY_INDEX_SCRIPT = """
+local values = {}
+for i, id in ipairs(ARGV) do
+    local field = redis.call('HGET', KEYS[1], id)
+    values[i] = field and redis.call('HGET', KEYS[2], field) or false
+end
+return values
+"""
+
+# Reserves ARGV[1] values of a sequence that keeps the next value to be handed out (KEYS[1]),
+# starting at 1, and returns the first reserved value
+NEXT_VALUE_SCRIPT = """
+local count = tonumber(ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SET', KEYS[1], 1)
+end
+return redis.call('INCRBY', KEYS[1], count) - count
+"""
+
+
+# Payloads of each entity type in every key layout, written in the binary format when msgpack is
+# installed. Page sections in their own hash are per field JSON, their codec reads the legacy hash
+register_codec(Notebook.__name__, PayloadCodec(
+    ['id', 'name', 'created_at', 'updated_at', 'list_size', 'days_period', 'foreign_idiom', 'mother_idiom']
+))
+register_codec(Sentence.__name__, PayloadCodec(
+    ['id', 'created_at', 'foreign_language', 'mother_tongue', 'foreign_idiom', 'mother_idiom']
+))
+register_codec(PageSection.__name__, PayloadCodec(
+    ['id', 'section_number', 'page_number', 'group', 'created_at', 'created_by_id', 'distillation_at',
+     'distillation_actual', 'distillated', 'notebook_id', 'sentences_id', 'translated_sentence', 'memorized']
+))
+register_codec(SentenceProgress.__name__, PayloadCodec(
+    ['sentence_id', 'notebook_id', 'section_number', 'group', 'created_at', 'last_distillation_at',
+     'next_distillation_at', 'memorized']
+))
+
+
+# Lists of the page sections stored as one field per sentence, e.g. memorized:0, memorized:1, ...
+PAGE_SECTION_SENTENCE_FIELDS = ['translated_sentence', 'memorized']
+
+
+def page_section_to_fields(data: dict) -> dict:
+    fields = {field: json.dumps(value) for field, value in data.items() if field not in PAGE_SECTION_SENTENCE_FIELDS}
+    for field in PAGE_SECTION_SENTENCE_FIELDS:
+        for i, value in enumerate(data.get(field) or []):
+            fields[f'{field}:{i}'] = json.dumps(value)
+    return fields
+
+
+def page_section_from_fields(fields: dict) -> dict:
+    data = dict()
+    sentence_values = {field: dict() for field in PAGE_SECTION_SENTENCE_FIELDS}
+    for field, value in fields.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        name, _, i = field.partition(':')
+        if i:
+            sentence_values[name][int(i)] = json.loads(value)
+        else:
+            data[field] = json.loads(value)
+    for field, values in sentence_values.items():
+        data[field] = [values[i] for i in sorted(values)]
+    return data
+
+
+def date_to_score(date) -> int:
+    # Dates are scored as YYYYMMDD, so a range of days is a range of scores
+    if date is None:
+        return 0
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date[:10])
+    return date.year * 10000 + date.month * 100 + date.day
+
 
 class NotebookDAO(AbstractDAO):
-    def __init__(self):
-        # connect to redis
-        self.r = redis.Redis(host=st.secrets.HOST,
-                        port=st.secrets.PORT,
-                        password=st.secrets.PASSWORD, 
-                        decode_responses=True)     
+    def __init__(self, keys: KeyLayout=None):
+        # Every DAO shares the connection pool of the process, payloads are read as bytes
+        self.r = get_redis()
+        self.raw = get_redis(decode_responses=False)
+        self.keys = keys if keys is not None else get_key_layout()
+        self.hmget_by_index = self.raw.register_script(HMGET_BY_INDEX_SCRIPT)
 
 
     def insert(self, entity: Notebook) -> Notebook:
@@ -32,29 +112,46 @@ class NotebookDAO(AbstractDAO):
 
         notebook_dict = entity.data_to_redis()
 
-        new_notebook = json.dumps(notebook_dict)
+        new_notebook = get_codec(hash_main).encode(notebook_dict)
         
         # Register the new notebook in redis
-        is_inserted = self.r.hsetnx(hash_main, entity.name, new_notebook)
+        if self.keys.cluster:
+            is_inserted = self.r.hsetnx(self.keys.notebook_names, entity.name, entity.id)
+        else:
+            is_inserted = self.r.hsetnx(hash_main, entity.name, new_notebook)
 
         # Checks if a notebook was inserted        
         if not is_inserted:
             raise Exception(f'Notebook name "{entity.name}" already exists. Choice another name to notebook!')
         
-        self.set_map_id_name(entity)
+        if self.keys.cluster:
+            self.r.set(self.keys.notebook(entity.id), new_notebook)
+        else:
+            self.set_map_id_name(entity)
 
         return entity
 
 
-    def get_all(self, entity: Notebook) -> List[Notebook]:
-        
-        resp = self.r.hgetall(entity.__class__.__name__)
+    def get_all(self, entity: Notebook, *, eager: bool=False) -> List[Notebook]:
+        """The page sections of each notebook are loaded on the first access to page_section_list,
+        or all at once with eager=True
+        """
+        if self.keys.cluster:
+            ids = [int(id_) for id_ in self.r.hvals(self.keys.notebook_names)]
+            data_list = [data for data in self.get_data_many(ids) if data]
+        else:
+            codec = get_codec(Notebook.__name__)
+            data_list = [codec.decode(value) for value in self.raw.hvals(Notebook.__name__)]
+
+        if eager:
+            ids = sorted(data['id'] for data in data_list)
+            return [notebook for notebook in self.get_many(ids) if notebook is not None]
         
         notebook_list = list()
         
-        for name, value in resp.items():
+        for data in data_list:
         
-            data = json.loads(value)
+            near_cache.put(Notebook, data['id'], data)
         
             notebook_list.append(
                 Notebook(
@@ -65,56 +162,102 @@ class NotebookDAO(AbstractDAO):
                     list_size=data['list_size'],
                     days_period=data['days_period'],
                     foreign_idiom=data['foreign_idiom'],
-                    mother_idiom=data['mother_idiom']
+                    mother_idiom=data['mother_idiom'],
+                    page_section_loader=self.load_page_section_list
                 )
             )
 
         return list(sorted(notebook_list, key=lambda x: x.id))
 
 
-    def get_by_id(self, entity: Notebook) -> Notebook:
-        hash_main_notebook_id = f'{entity.__class__.__name__}_id'
-        hash_main_notebook = entity.__class__.__name__
+    def load_page_section_list(self, notebook: Notebook) -> List[PageSection]:
+        page_section_id_list = self.r.zrange(self.keys.page_section_membership(notebook.id), 0, -1)
+
+        page_section_list = PageSectionDAO(self.keys).get_many(page_section_id_list, [notebook.id] * len(page_section_id_list))
+        return [p for p in page_section_list if p is not None]
 
-        hash_key_name = self.r.hget(hash_main_notebook_id, entity.id)
-        resp = self.r.hget(hash_main_notebook, hash_key_name)
 
-        if not (hash_key_name and resp):
+    def get_by_id(self, entity: Notebook) -> Notebook:
+        # Served by the near cache, the page sections are loaded on the first access to page_section_list
+        notebook = self.get_many([entity.id], eager=False)[-1]
+
+        if notebook is None:
             raise Exception(f'There is no a notebook with id={entity.id}!')
+            
+        return notebook
 
-        data = json.loads(resp)
 
-        notebook = Notebook()
+    def get_many(self, ids: List[int], *, eager: bool=True) -> List[Notebook]:
+        """With eager=False the page sections are loaded on the first access to page_section_list
+        """
+        if not ids:
+            return []
 
-        notebook.id = data['id']
-        notebook.name = data['name']
-        notebook.created_at = data['created_at']
-        notebook.updated_at = data['updated_at']
-        notebook.list_size = data['list_size']
-        notebook.days_period = data['days_period']
-        notebook.foreign_idiom = data['foreign_idiom']
-        notebook.mother_idiom = data['mother_idiom']
+        data_list = near_cache.get_many(Notebook, ids, self.get_data_many)
+
+        # The page section ids of every notebook are read in a single round trip
+        page_section_id_lists = [None] * len(ids)
+        if eager:
+            pipe = self.r.pipeline(transaction=False)
+            for id_ in ids:
+                pipe.zrange(self.keys.page_section_membership(id_), 0, -1)
+            page_section_id_lists = pipe.execute()
+
+        # Loads the page sections of every notebook with a single bulk call
+        page_section_notebook_ids = dict(
+            (page_section_id, notebook_id) for notebook_id, id_list in zip(ids, page_section_id_lists) if id_list
+            for page_section_id in id_list
+        )
+        page_section_ids = list(page_section_notebook_ids)
+        page_section_dict = dict(zip(page_section_ids, PageSectionDAO(self.keys).get_many(
+            page_section_ids, [page_section_notebook_ids[id_] for id_ in page_section_ids]
+        )))
+
+        notebook_list = []
+        for data, page_section_id_list in zip(data_list, page_section_id_lists):
+            if data is None:
+                notebook_list.append(None)
+                continue
+
+            notebook = Notebook()
+
+            notebook.id = data['id']
+            notebook.name = data['name']
+            notebook.created_at = data['created_at']
+            notebook.updated_at = data['updated_at']
+            notebook.list_size = data['list_size']
+            notebook.days_period = data['days_period']
+            notebook.foreign_idiom = data['foreign_idiom']
+            notebook.mother_idiom = data['mother_idiom']
+
+            if eager:
+                notebook.page_section_list = [
+                    page_section_dict[id_] for id_ in page_section_id_list if page_section_dict.get(id_)
+                ]
+            else:
+                notebook.set_page_section_loader(self.load_page_section_list)
 
-        hash_key_page_id_list = f'{notebook.__class__.__name__}_{notebook.id}'
+            notebook_list.append(notebook)
+            
+        return notebook_list
 
-        has_list = self.r.hget('notebook_has_page_section_id', hash_key_page_id_list)
-        
-        if has_list is None:
-            notebook.page_section_list = list()
-            return notebook
 
-        data_list = json.loads(has_list)
+    def get_data_many(self, ids: List[int]) -> List[dict]:
+        hash_main_notebook_id = f'{Notebook.__name__}_id'
+        hash_main_notebook = Notebook.__name__
 
-        page_section_dao = PageSectionDAO()
-        page_section_list = []
-        for page_section_id in data_list:
-            ps = page_section_dao.get_by_id(PageSection(id_=page_section_id))
-            if ps:
-                page_section_list.append(ps)
+        if self.keys.cluster:
+            # Each notebook is in its own slot, the pipeline sends one command per node
+            pipe = self.raw.pipeline(transaction=False)
+            for id_ in ids:
+                pipe.get(self.keys.notebook(id_))
+            resp_list = pipe.execute()
+        else:
+            # The id -> name map and the notebooks are read in a single round trip
+            resp_list = self.hmget_by_index(keys=[hash_main_notebook_id, hash_main_notebook], args=ids)
 
-        notebook.page_section_list = page_section_list
-            
-        return notebook
+        codec = get_codec(hash_main_notebook)
+        return [codec.decode(resp) if resp else None for resp in resp_list]
 
 
     def update(self, entity: Notebook) -> Notebook:
@@ -130,7 +273,15 @@ class NotebookDAO(AbstractDAO):
         
         hash_key = entity.name
 
-        is_deleted = self.r.hdel(hash_main, hash_key)
+        if self.keys.cluster:
+            notebook_id = self.r.hget(self.keys.notebook_names, hash_key)
+            is_deleted = self.r.hdel(self.keys.notebook_names, hash_key)
+            if is_deleted:
+                self.r.delete(self.keys.notebook(notebook_id))
+        else:
+            is_deleted = self.r.hdel(hash_main, hash_key)
+        if is_deleted:
+            near_cache.bump_version(Notebook)
 
         return is_deleted
   
@@ -141,21 +292,18 @@ class NotebookDAO(AbstractDAO):
 
 
     def get_notebook_id_sequence(self):
-        key_sequence = 'notebook_id_sequence'        
-        if not self.r.exists(key_sequence):
-            self.r.set(key_sequence, 0)
-        new_id = self.r.incr(key_sequence)
-        return new_id
+        # The sequence keeps the last id, INCR creates it when missing
+        return self.r.incr(self.keys.notebook_id_sequence)
 
 
 
 class PageSectionDAO(AbstractDAO):
-    def __init__(self):
-        # connect to redis
-        self.r = redis.Redis(host=st.secrets.HOST,
-                        port=st.secrets.PORT,
-                        password=st.secrets.PASSWORD, 
-                        decode_responses=True)     
+    def __init__(self, keys: KeyLayout=None):
+        # Every DAO shares the connection pool of the process
+        self.r = get_redis()
+        self.raw = get_redis(decode_responses=False)
+        self.keys = keys if keys is not None else get_key_layout()
+        self.next_value = self.r.register_script(NEXT_VALUE_SCRIPT)
         
 
     def insert(self, entity: PageSection) -> PageSection:
@@ -178,21 +326,28 @@ class PageSectionDAO(AbstractDAO):
         page_section.notebook = entity.notebook
 
         page_section_dict = page_section.data_to_redis()
-
-        new_page_section = json.dumps(page_section_dict)
         
-        is_inserted = None
-        if page_section.created_at:
-            # Register the new notebook in redis
-            is_inserted = self.r.hsetnx(hash_main, page_section.id, new_page_section)
+        notebook_id = page_section.notebook.id
 
-        # Checks if a notebook was inserted        
+        is_inserted = None
+        if page_section.created_at and self.keys.cluster:
+            is_inserted = self.r.sadd(self.keys.page_section_ids(notebook_id), page_section.id)
+        elif page_section.created_at:
+            # The id is claimed atomically, page sections not yet moved to their own hash are in the legacy hash
+            is_inserted = not self.r.hexists(hash_main, page_section.id) and \
+                          self.r.sadd(self.keys.page_section_ids(), page_section.id)
+
+        # Checks if a page section was inserted
         if not is_inserted:
             raise Exception(f'There is already a page for the group {page_section.group.value} and selected day {entity.created_at}!')
-            
+
+        self.r.hset(self.keys.page_section(page_section.id, notebook_id), mapping=page_section_to_fields(page_section_dict))
+        if self.keys.cluster:
+            self.r.hset(self.keys.page_section_locator(page_section.id), page_section.id, notebook_id)
+
         self.set_map_id_notebook_to_id_page_section(page_section)
-        self.set_map_page_number(entity)
-        self.set_map_section_number(entity)
+        self.set_indexes(page_section_dict)
+        SentenceProgressDAO(self.keys).advance(page_section)
 
         return page_section
     
@@ -202,82 +357,293 @@ class PageSectionDAO(AbstractDAO):
 
 
     def get_by_id(self, entity: PageSection) -> PageSection:
-        hash_main = entity.__class__.__name__
-        hash_key_id = entity.id
+        notebook_id = entity.notebook.id if entity.notebook is not None else None
+        return self.get_many([entity.id], [notebook_id])[-1]
 
-        has_page_section = self.r.hget(hash_main, hash_key_id)
-        
-        if not has_page_section:
-            return None
 
-        data = json.loads(has_page_section)
+    def get_many(self, ids: List[str], notebook_ids: List[int]=None) -> List[PageSection]:
+        """notebook_ids has the notebook of each id, when known, see get_data_many
+        """
+        if not ids:
+            return []
 
-        page_section = PageSection(
-                id_                  = data['id'],
-                section_number       = data['section_number'],
-                created_at           = data['created_at'],
-                group                = Group(data['group']),
-                distillation_at      = data['distillation_at'],
-                distillation_actual  = data['distillation_actual'],
-                distillated          = data['distillated'],
-                memorializeds        = data['memorized'],
-                translated_sentences = data['translated_sentence']
-            )
+        return self.build_page_sections(self.get_data_many(ids, notebook_ids))
 
-        sentences_id_list = data.get('sentences_id')
 
-        if sentences_id_list is None:
-            page_section.sentences = list()
-            return page_section
-        
-        sentence_dao = SentenceDAO()
-        sentence_list = []
-        for sentence_id in sentences_id_list:
-            sc = sentence_dao.get_by_id(Sentence(id_=sentence_id))
-            if sc is not None:
-                sentence_list.append(sc)
-        
-        page_section.sentences = sentence_list
+    def get_data_many(self, ids: List[str], notebook_ids: List[int]=None) -> List[dict]:
+        """Reads the stored data of each id, None when it does not exist. The page sections
+        not yet moved to their own hash are read from the legacy PageSection hash. In the
+        cluster layout the keys depend on the notebooks, the unknown ones are looked up
+        """
+        ids = list(ids)
+        if not ids:
+            return []
 
-        return page_section
+        notebook_ids = list(notebook_ids) if notebook_ids is not None else [None] * len(ids)
+        if self.keys.cluster and None in notebook_ids:
+            pipe = self.r.pipeline(transaction=False)
+            for id_, notebook_id in zip(ids, notebook_ids):
+                if notebook_id is None and id_ is not None:
+                    pipe.hget(self.keys.page_section_locator(id_), id_)
+            located = iter(pipe.execute())
+            notebook_ids = [
+                next(located) if notebook_id is None and id_ is not None else notebook_id
+                for id_, notebook_id in zip(ids, notebook_ids)
+            ]
+
+        pipe = self.r.pipeline(transaction=False)
+        for id_, notebook_id in zip(ids, notebook_ids):
+            pipe.hgetall(self.keys.page_section(id_, notebook_id))
+        data_list = [page_section_from_fields(fields) if fields else None for fields in pipe.execute()]
+
+        legacy_ids = [id_ for id_, data in zip(ids, data_list) if data is None and id_ is not None]
+        if legacy_ids and not self.keys.cluster:
+            codec = get_codec(PageSection.__name__)
+            legacy_dict = dict(zip(legacy_ids, self.raw.hmget(PageSection.__name__, legacy_ids)))
+            data_list = [codec.decode(legacy_dict[id_]) if data is None else data for id_, data in zip(ids, data_list)]
+
+        return data_list
+
+
+    def build_page_sections(self, data_list: List[dict], resolve_references: bool=False) -> List[PageSection]:
+        """Builds the page sections of the stored data, None stays None. With resolve_references
+        the notebook is loaded as well, the created_by page section is loaded on first access
+        """
+        found_list = [data for data in data_list if data]
+
+        # Loads the sentences of every page section with a single bulk call
+        sentence_ids = list(dict.fromkeys(
+            id_ for data in found_list for id_ in (data.get('sentences_id') or [])
+        ))
+        sentence_dict = dict(zip(sentence_ids, SentenceDAO(self.keys).get_many(sentence_ids)))
+
+        notebook_dict = dict()
+        if resolve_references and found_list:
+            notebook_ids = list(dict.fromkeys(data['notebook_id'] for data in found_list))
+            notebook_dict = dict(zip(notebook_ids, NotebookDAO(self.keys).get_many(notebook_ids, eager=False)))
 
-        
+        page_section_list = []
+        for data in data_list:
+            if data is None:
+                page_section_list.append(None)
+                continue
+
+            page_section = PageSection(
+                    id_                  = data['id'],
+                    section_number       = data['section_number'],
+                    page_number          = data.get('page_number'),
+                    created_at           = data['created_at'],
+                    created_by_id        = data.get('created_by_id'),
+                    created_by_loader    = functools.partial(self.load_created_by, data['notebook_id']),
+                    group                = Group(data['group']),
+                    distillation_at      = data['distillation_at'],
+                    distillation_actual  = data['distillation_actual'],
+                    distillated          = data['distillated'],
+                    memorializeds        = data['memorized'],
+                    translated_sentences = data['translated_sentence'],
+                    notebook             = notebook_dict.get(data['notebook_id'])
+                )
 
+            # A missing sentence stays as None, so the sentences line up with their per sentence lists
+            page_section.sentences = [sentence_dict.get(id_) for id_ in (data.get('sentences_id') or [])]
 
-    def update(self, entity: PageSection) -> PageSection:
-        df = pd.read_parquet(page_section_file)
+            page_section_list.append(page_section)
 
-        df_page = df[df['section_number'] == entity.section_number]
+        return page_section_list
 
-        is_distillated = df_page['distillated'].tolist()[-1]
 
-        if is_distillated:
-            raise Exception(f'Changing PageSection "group {entity.group.value}" is not allowed because it has already been distilled.')
+    def load_created_by(self, notebook_id: int, page_section: PageSection) -> PageSection:
+        # created_by_id is a section number, unique only within the notebook
+        page_section_id = self.get_id_by_section_number(
+            PageSection(section_number=page_section.created_by_id, notebook=Notebook(id_=notebook_id))
+        )
+        if page_section_id is None:
+            return None
+        # The notebook is resolved as well, as in the Parquet DAO
+        return self.build_page_sections(self.get_data_many([page_section_id], [notebook_id]), resolve_references=True)[-1]
+
+
+    def lineage(self, entity: PageSection) -> List[PageSection]:
+        """The chain of page sections created one from another (A -> B -> C -> D) that has entity,
+        from the first one. The links of the notebook are read from the created_by_id index sets,
+        two fields of each page section in a single round trip
+        """
+        notebook_id = entity.notebook.id
+        page_section_id_list = list(self.r.sdiff([
+            self.keys.page_section_index(notebook_id, 'notebook_id', notebook_id),
+            self.keys.page_section_index(notebook_id, 'created_by_id', None),
+        ]))
+
+        pipe = self.r.pipeline(transaction=False)
+        for page_section_id in page_section_id_list:
+            pipe.hmget(self.keys.page_section(page_section_id, notebook_id), 'section_number', 'created_by_id')
+        links = [[json.loads(value) if value is not None else None for value in values] for values in pipe.execute()]
+
+        # The page sections not yet moved to their own hash are read from the legacy hash
+        legacy_ids = [id_ for id_, (section_number, _) in zip(page_section_id_list, links) if section_number is None]
+        if legacy_ids:
+            legacy_dict = dict(zip(legacy_ids, self.get_data_many(legacy_ids, [notebook_id] * len(legacy_ids))))
+            links = [
+                [legacy_dict[id_]['section_number'], legacy_dict[id_].get('created_by_id')]
+                if id_ in legacy_dict and legacy_dict[id_] else link
+                for id_, link in zip(page_section_id_list, links)
+            ]
+
+        created_by_ids = {section_number: created_by_id for section_number, created_by_id in links
+                          if section_number is not None}
+        section_numbers = lineage_section_numbers(entity.section_number, created_by_ids)
+
+        # The ids of the chain are read from the section_number index sets in a single round trip
+        pipe = self.r.pipeline(transaction=False)
+        for section_number in section_numbers:
+            pipe.sinter([self.keys.page_section_index(notebook_id, 'section_number', section_number),
+                         self.keys.page_section_index(notebook_id, 'notebook_id', notebook_id)])
+        page_section_ids = [next(iter(id_list), None) for id_list in pipe.execute()]
+
+        page_section_list = self.build_page_sections(
+            self.get_data_many(page_section_ids, [notebook_id] * len(page_section_ids)), resolve_references=True
+        )
+        return [p for p in page_section_list if p is not None]
+
+
+    def find_due(self, notebook_id: int, start: datetime.date, end: datetime.date,
+                 group: Group=None) -> List[PageSection]:
+        """Finds the page sections of the notebook with distillation_at between start and end, both included
+        """
+        # The membership sorted set is scored by distillation_at, so only the ids in the range are read
+        page_section_id_list = self.r.zrangebyscore(self.keys.page_section_membership(notebook_id),
+                                                    date_to_score(start), date_to_score(end))
+
+        # The notebook of the page sections is resolved with a single bulk call, as in the Parquet DAO
+        page_section_list = self.build_page_sections(
+            self.get_data_many(page_section_id_list, [notebook_id] * len(page_section_id_list)), resolve_references=True
+        )
+        return [p for p in page_section_list if p is not None and (group is None or p.group.value == group.value)]
+
+
+    def count_by_group(self, notebook_id: int) -> Dict[str, int]:
+        """The number of page sections of the notebook with created_at, by group value. Only the
+        cardinality of the intersections of the index sets is read (SINTERCARD, Redis 7), not their members
+        """
+        notebook_index = self.keys.page_section_index(notebook_id, 'notebook_id', notebook_id)
+        not_created_index = self.keys.page_section_index(notebook_id, 'created_at', None)
+        groups = list(dict.fromkeys(g.value for g in Group))
+
+        # A notebook without page sections has no index set
+        if not self.r.exists(notebook_index):
+            return dict()
+
+        pipe = self.r.pipeline(transaction=False)
+        for group in groups:
+            group_index = self.keys.page_section_index(notebook_id, 'group', group)
+            pipe.sintercard(2, [notebook_index, group_index])
+            pipe.sintercard(3, [notebook_index, group_index, not_created_index])
+        counts = pipe.execute()
+
+        return {group: created - not_created for group, created, not_created in zip(groups, counts[::2], counts[1::2])
+                if created - not_created}
 
-        id_list = df_page['id'].tolist()
-        entity.set_id(min(id_list))
 
-        df.drop(df[df['section_number'] == entity.section_number].index, inplace=True)
+    def update(self, entity: PageSection) -> PageSection:
+        hash_main = PageSection.__name__
+
+        page_section_id = self.get_id_by_section_number(entity)
+        if page_section_id is None:
+            raise Exception(f'There is no a PageSection with section_number={entity.section_number}!')
+
+        codec = get_codec(hash_main)
+        notebook_id = entity.notebook.id if entity.notebook is not None else None
+        key = self.keys.page_section(page_section_id, notebook_id)
+
+        # The page sections built by the pages do not carry the fields set on insert or on distillation,
+        # they are read with the page section (the transaction can run again, so the incoming values are kept)
+        created_by_id, page_number, distillation_actual = entity.created_by_id, entity.page_number, entity.distillation_actual
+
+        def update_page_section(pipe: redis.client.Pipeline):
+            # Reads under WATCH, the transaction is retried if another client changes the page section
+            fields_stored = pipe.hgetall(key)
+            if fields_stored:
+                data_old = page_section_from_fields(fields_stored)
+            elif not self.keys.cluster:
+                data_old = codec.decode(pipe.hget(hash_main, page_section_id))
+            else:
+                data_old = None
+            if data_old is None:
+                raise Exception(f'There is no a PageSection with section_number={entity.section_number}!')
+
+            if data_old['distillated']:
+                raise Exception(f'Changing PageSection "group {entity.group.value}" is not allowed because it has already been distilled.')
+
+            entity.set_id(page_section_id)
+            if created_by_id is None:
+                entity.set_created_by_loader(data_old.get('created_by_id'),
+                                             functools.partial(self.load_created_by, data_old['notebook_id']))
+            if page_number is None:
+                entity.page_number = data_old.get('page_number')
+            if distillation_actual is None:
+                entity.distillation_actual = data_old.get('distillation_actual')
+            data_new = entity.data_to_redis()
+
+            fields_old = page_section_to_fields(data_old)
+            fields_new = page_section_to_fields(data_new)
+
+            pipe.multi()
+            if fields_stored:
+                # Only the changed fields are written, e.g. a translation is a single field
+                fields_changed = {field: value for field, value in fields_new.items() if fields_old.get(field) != value}
+                fields_removed = [field for field in fields_old if field not in fields_new]
+                if fields_changed:
+                    pipe.hset(key, mapping=fields_changed)
+                if fields_removed:
+                    pipe.hdel(key, *fields_removed)
+            else:
+                # A page section of the legacy hash is moved to its own hash
+                pipe.hset(key, mapping=fields_new)
+                pipe.sadd(self.keys.page_section_ids(), page_section_id)
+                pipe.hdel(hash_main, page_section_id)
+            for key_old, key_new in zip(self.keys.page_section_indexes(data_old), self.keys.page_section_indexes(data_new)):
+                if key_old != key_new:
+                    pipe.srem(key_old, page_section_id)
+                    pipe.sadd(key_new, page_section_id)
+            if data_old['distillation_at'] != data_new['distillation_at'] or data_old['notebook_id'] != data_new['notebook_id']:
+                pipe.zrem(self.keys.page_section_membership(data_old['notebook_id']), page_section_id)
+                pipe.zadd(self.keys.page_section_membership(data_new['notebook_id']),
+                          {page_section_id: date_to_score(data_new['distillation_at'])})
+
+        # In the cluster layout every key of the transaction is in the slot of the notebook
+        watch_keys = [key] if self.keys.cluster else [key, hash_main]
+        self.raw.transaction(update_page_section, *watch_keys)
+
+        SentenceProgressDAO(self.keys).advance(entity)
 
-        # Registry new page_section into dataframe using pd.concat method 
-        df_registro = pd.DataFrame(entity.data_to_dataframe())
-        df_concat = pd.concat([df, df_registro], ignore_index=True)
+        return entity
 
-        df_concat.to_parquet(page_section_file)
 
-        return entity
+    def get_id_by_section_number(self, entity: PageSection) -> str:
+        notebook_id = entity.notebook.id if entity.notebook is not None else None
+        if notebook_id is None and self.keys.cluster:
+            raise Exception(f'The notebook of the PageSection with section_number={entity.section_number} must be given!')
 
+        index_keys = [self.keys.page_section_index(notebook_id, 'section_number', entity.section_number)]
+        if notebook_id is not None:
+            # Section numbers are sequences of each notebook
+            index_keys.append(self.keys.page_section_index(notebook_id, 'notebook_id', notebook_id))
 
-    def find_by_field(self, entity: PageSection) -> List[PageSection]:
-        df = pd.read_parquet(page_section_file)
-        df_result = df.copy()
+        id_list = self.r.sinter(index_keys)
+        if len(id_list) > 1:
+            raise Exception(f'There are {len(id_list)} PageSections with section_number={entity.section_number}, '
+                            f'the notebook must be given!')
 
-        notebook_dao = NotebookDAO()
-        sentence_dao = SentenceDAO()
+        return next(iter(id_list), None)
 
-        pages = df_result['section_number'].unique().tolist()
-        
-        filters = dict([v for v in vars(entity).items() if not v[0].startswith('_') and bool(v[-1])])
+
+    def find_by_field(self, entity: PageSection) -> List[PageSection]:
+        index_fields = []
+
+        filters = dict([v for v in attributes(entity).items() if not v[0].startswith('_') and bool(v[-1])])
+        if 'created_by' not in filters and entity.created_by_id is not None:
+            # created_by is not loaded yet, its section number is known
+            filters['created_by_id'] = entity.created_by_id
         for attr, value in filters.items():
             if bool(value) is False: continue
 
@@ -288,131 +654,81 @@ class PageSectionDAO(AbstractDAO):
                 value = value.value            
             elif isinstance(value, PageSection):
                 attr = 'created_by_id'
-                value = value.created_by.section_number
+                value = value.section_number
             elif attr in 'created_at':
                 if isinstance(value, datetime.date):
                     value = value
-                    # value = pd.to_datetime(value).strftime("%Y-%m-%d")
                 elif '#' in value:
                     value = None
-            elif attr in 'section_number distillated distillation_at':
+            elif attr in 'section_number created_by_id distillated distillation_at':
                 ...
             else:
                 raise Exception(f'This field "{attr}" cannot be used to find PageSection objects!')
             
-            df_result = df_result[df_result[attr] == value]
-
-        if df_result.empty:
-            return []        
-        
-        result_list = list()
-
-        pages = df_result['section_number'].unique().tolist()
-
-        for page in pages:
-            sentence_id_list         = []
-            translated_sentence_list = []
-            memorized_list           = []
-            id_list                  = []
-
-            df_page = df_result[df['section_number'] == page]
-            for index, row in df_page.iterrows():
-                id_list.append(row['id'])
-                sentence_id_list.append(row['sentence_id'])
-                translated_sentence_list.append(row['translated_sentence'])
-                memorized_list.append(row['memorized'])
+            index_fields.append((attr, value))
+
+        if self.keys.cluster:
+            # The index sets are kept per notebook, so the notebooks of the query are searched one by one
+            notebook_ids = [value for attr, value in index_fields if attr == 'notebook_id'] or \
+                           [notebook.id for notebook in NotebookDAO(self.keys).get_all(Notebook())]
+            pipe = self.r.pipeline(transaction=False)
+            for notebook_id in notebook_ids:
+                if index_fields:
+                    pipe.sinter([self.keys.page_section_index(notebook_id, attr, value) for attr, value in index_fields])
+                else:
+                    pipe.smembers(self.keys.page_section_ids(notebook_id))
+            page_section_notebook_ids = {
+                page_section_id: notebook_id
+                for notebook_id, id_list in zip(notebook_ids, pipe.execute()) for page_section_id in id_list
+            }
+        else:
+            # Every filter is a secondary index set, the matches are their intersection
+            if index_fields:
+                page_section_id_list = self.r.sinter([self.keys.page_section_index(None, attr, value)
+                                                      for attr, value in index_fields])
             else:
-                sentences = []
-                for id_ in sentence_id_list:
-                    sentences.append(
-                        sentence_dao.get_by_id(
-                            Sentence(id_=id_)
-                        )
-                    )
-
-                notebook = notebook_dao.get_by_id(
-                    Notebook(id_=row['notebook_id'])
-                )
+                page_section_id_list = self.r.smembers(self.keys.page_section_ids()) | set(self.r.hkeys(PageSection.__name__))
+            page_section_notebook_ids = dict.fromkeys(page_section_id_list)
 
-                created_by = self.get_by_id(
-                    PageSection(section_number=row['created_by_id'])
-                )
-
-                page_section = PageSection(
-                    id_                  = min(id_list),
-                    section_number          = row['section_number'],
-                    created_at           = row['created_at'],
-                    created_by           = created_by,
-                    group                = Group(row['group']),
-                    distillation_at      = row['distillation_at'],
-                    distillation_actual  = row['distillation_actual'],
-                    distillated          = row['distillated'],
-                    memorializeds        = memorized_list,
-                    translated_sentences = translated_sentence_list,
-                    sentences            = sentences,
-                    notebook             = notebook
-                )
+        data_list = [data for data in self.get_data_many(
+            list(page_section_notebook_ids), list(page_section_notebook_ids.values())
+        ) if data]
+        data_list.sort(key=lambda data: (int(data['notebook_id']), int(data['section_number'])))
 
-                result_list.append(page_section)
-
-        return list(result_list)
+        return self.build_page_sections(data_list, resolve_references=True)
     
 
     def delete(self, entity: PageSection) -> bool:
         pass
 
 
-    def get_section_number(self, entity: PageSection):
-        key_sequence = f'sec_num_id_nb{entity.notebook.id}_sequence'        
-        if not self.r.exists(key_sequence):
-            self.r.set(key_sequence, 1)
-        new_id = self.r.get(key_sequence)
-        return new_id
-    
-
-    def set_map_section_number(self, entity: PageSection):
-        key_sequence = f'sec_num_id_nb{entity.notebook.id}_sequence'        
-        if not self.r.exists(key_sequence):
-            self.r.set(key_sequence, 0)
-        self.r.incr(key_sequence)        
+    def get_section_number(self, entity: PageSection, count: int=1):
+        # Allocates count section numbers atomically and returns the first one
+        key_sequence = self.keys.section_number_sequence(entity.notebook.id)
+        return self.next_value(keys=[key_sequence], args=[count])
 
     
-    def get_page_number(self, entity: PageSection):
-        if entity.page_number is not None:
-            return
-        if entity.created_at:
-            key_sequence = f'pg_num_nb{entity.notebook.id}_gp{entity.group.value}_sequence'
-            if not self.r.exists(key_sequence):
-                self.r.set(key_sequence, 1)
-            new_page = self.r.get(key_sequence)
-            return new_page
-    
-
-    def set_map_page_number(self, entity: PageSection):
+    def get_page_number(self, entity: PageSection, count: int=1):
         if entity.page_number is not None:
             return entity.page_number
-        key_sequence = f'pg_num_nb{entity.notebook.id}_gp{entity.group.value}_sequence'
-        if not self.r.exists(key_sequence):
-            self.r.set(key_sequence, 0)
-        self.r.incr(key_sequence)        
+        if entity.created_at:
+            # Allocates count page numbers atomically and returns the first one
+            key_sequence = self.keys.page_number_sequence(entity.notebook.id, entity.group.value)
+            return self.next_value(keys=[key_sequence], args=[count])
 
     
-    def set_map_id_notebook_to_id_page_section(self, entity: PageSection):
-        hash_main = f'notebook_has_page_section_id'
-        hash_key = f"{entity.notebook.__class__.__name__}_{entity.notebook.id}"
-        page_section_id = entity.id
+    def set_indexes(self, data: dict):
+        # Adds the page section to the secondary index set of each indexed field
+        pipe = self.r.pipeline(transaction=False)
+        for index_key in self.keys.page_section_indexes(data):
+            pipe.sadd(index_key, data['id'])
+        pipe.execute()
 
-        has_list = self.r.hget(hash_main, hash_key)
 
-        if has_list is None:
-            new_list = [page_section_id]
-        else:
-            has_list = has_list
-            new_list = json.loads(has_list)
-            new_list.append(page_section_id)
-        
-        list_json = json.dumps(new_list)
-        resp = self.r.hset(hash_main, hash_key, list_json)
+    def set_map_id_notebook_to_id_page_section(self, entity: PageSection):
+        # A single atomic ZADD, concurrent inserts never lose each other
+        self.r.zadd(self.keys.page_section_membership(entity.notebook.id),
+                    {entity.id: date_to_score(entity.distillation_at)})
     
     
     def get_hash_checksum(self, entity: PageSection):
@@ -428,15 +744,19 @@ class PageSectionDAO(AbstractDAO):
 
 
 class SentenceDAO(AbstractDAO):
-    def __init__(self):
-        # connect to redis
-        self.r = redis.Redis(host=st.secrets.HOST,
-                        port=st.secrets.PORT,
-                        password=st.secrets.PASSWORD, 
-                        decode_responses=True)
+    def __init__(self, keys: KeyLayout=None):
+        # Every DAO shares the connection pool of the process
+        self.r = get_redis()
+        self.raw = get_redis(decode_responses=False)
+        self.keys = keys if keys is not None else get_key_layout()
+        self.hmget_by_index = self.raw.register_script(HMGET_BY_INDEX_SCRIPT)
+        self.next_value = self.r.register_script(NEXT_VALUE_SCRIPT)
         
 
     def insert(self, entity: Sentence) -> Sentence:
+        if self.keys.cluster:
+            return self.insert_many([entity])[0]
+
         hash_main = entity.__class__.__name__
 
         # Get a id sequence to notebook
@@ -444,48 +764,109 @@ class SentenceDAO(AbstractDAO):
 
         sentence_dict = entity.data_to_redis()
 
-        new_sentence = json.dumps(sentence_dict)
+        new_sentence = get_codec(hash_main).encode(sentence_dict)
         
-        # Register the new notebook in redis
-        is_inserted = self.r.hsetnx(hash_main, entity.foreign_language, new_sentence)
+        # Register the new notebook in redis, the texts are unique once normalized as in the Parquet index
+        is_inserted = self.r.hsetnx(hash_main, normalize_text(entity.foreign_language), new_sentence)
 
         # Checks if a notebook was inserted        
         if not is_inserted:
             raise Exception(f'The Sentence "{entity.foreign_language}" already exists. Choice another sentence to list!')
         
         self.set_map_id_name(entity)
-        self.set_sentence_id_sequence()
 
         return entity
 
 
+    def insert_many(self, entities: List[Sentence]) -> List[Sentence]:
+        if not entities:
+            return []
+
+        hash_main = Sentence.__name__
+
+        # Reserves a block of ids for all the new sentences
+        new_id = self.get_sentence_id_sequence(count=len(entities))
+        for id_, entity in enumerate(entities, start=new_id):
+            entity.id = id_
+
+        codec = get_codec(hash_main)
+
+        # The texts are unique once normalized, as in the Parquet index
+        texts = [normalize_text(entity.foreign_language) for entity in entities]
+
+        pipe = self.r.pipeline(transaction=False)
+        for entity, text in zip(entities, texts):
+            if self.keys.cluster:
+                # The unique index of the texts is written first, it holds the id of each text
+                pipe.hsetnx(self.keys.sentence_by_text(text), text, entity.id)
+            else:
+                pipe.hsetnx(hash_main, text, codec.encode(entity.data_to_redis()))
+        inserted_list = pipe.execute()
+
+        # Only the sentences actually inserted are mapped by id
+        pipe = self.r.pipeline(transaction=False)
+        for entity, text, is_inserted in zip(entities, texts, inserted_list):
+            if is_inserted and self.keys.cluster:
+                pipe.hset(self.keys.sentence(entity.id), entity.id, codec.encode(entity.data_to_redis()))
+            elif is_inserted:
+                pipe.hsetnx(f'{hash_main}_id', entity.id, text)
+        pipe.execute()
+
+        duplicated_list = [e.foreign_language for e, is_inserted in zip(entities, inserted_list) if not is_inserted]
+        if duplicated_list:
+            raise Exception(f'The Sentences {duplicated_list} already exist. Choice other sentences to list!')
+
+        return entities
+
+
     def get_all(self, entity: Sentence) -> List[Sentence]:
         pass
 
 
     def get_by_id(self, entity: Sentence) -> Sentence:
-        hash_main_sentence_id = f'{entity.__class__.__name__}_id'
-        hash_main_sentence = entity.__class__.__name__
+        return self.get_many([entity.id])[-1]
 
-        hash_key = self.r.hget(hash_main_sentence_id, entity.id)
-        resp = self.r.hget(hash_main_sentence, hash_key)
 
-        if not (hash_key and resp):
-            return None
-            # raise Exception(f'There is no a sentence with id={entity.id}!')
+    def get_many(self, ids: List[int]) -> List[Sentence]:
+        if not ids:
+            return []
+
+        sentence_list = []
+        for data in near_cache.get_many(Sentence, ids, self.get_data_many):
+            if data is None:
+                sentence_list.append(None)
+                continue
+
+            sentence = Sentence()
+
+            sentence.id = data['id']
+            sentence.created_at = data['created_at']
+            sentence.foreign_language = data['foreign_language']
+            sentence.mother_tongue = data['mother_tongue']
+            sentence.foreign_idiom = data['foreign_idiom']
+            sentence.mother_idiom = data['mother_idiom']
+
+            sentence_list.append(sentence)
+
+        return sentence_list
 
-        data = json.loads(resp)
 
-        sentence = Sentence()
+    def get_data_many(self, ids: List[int]) -> List[dict]:
+        hash_main_sentence_id = f'{Sentence.__name__}_id'
+        hash_main_sentence = Sentence.__name__
 
-        sentence.id = data['id']
-        sentence.created_at = data['created_at']
-        sentence.foreign_language = data['foreign_language']
-        sentence.mother_tongue = data['mother_tongue']
-        sentence.foreign_idiom = data['foreign_idiom']
-        sentence.mother_idiom = data['mother_idiom']
+        if self.keys.cluster:
+            # The pipeline sends one command per node
+            pipe = self.raw.pipeline(transaction=False)
+            for id_ in ids:
+                pipe.hget(self.keys.sentence(id_), id_)
+            resp_list = pipe.execute()
+        else:
+            # The id -> foreign_language map and the sentences are read in a single round trip
+            resp_list = self.hmget_by_index(keys=[hash_main_sentence_id, hash_main_sentence], args=ids)
 
-        return sentence
+        codec = get_codec(hash_main_sentence)
+        return [codec.decode(resp) if resp else None for resp in resp_list]
 
 
     def update(self, entity: Sentence) -> List[Sentence]:
@@ -493,7 +874,7 @@ class SentenceDAO(AbstractDAO):
 
 
     def find_by_field(self, entity: Sentence) -> List[Sentence]:
-        filters = dict([v for v in vars(entity).items() if not v[0].startswith('_') and bool(v[-1])])
+        filters = dict([v for v in attributes(entity).items() if not v[0].startswith('_') and bool(v[-1])])
         for attr, value in filters.items():
             if not bool(value): continue
 
@@ -503,15 +884,18 @@ class SentenceDAO(AbstractDAO):
             raise Exception(f'This field "{attr}" cannot be used to find PageSection objects!')
 
         hash_main = entity.__class__.__name__
-        hash_key = value
+        hash_key = normalize_text(value)
 
-        resp = self.r.hget(hash_main, hash_key)
+        if self.keys.cluster:
+            sentence_id = self.r.hget(self.keys.sentence_by_text(hash_key), hash_key)
+            data = self.get_data_many([sentence_id])[0] if sentence_id is not None else None
+        else:
+            resp = self.raw.hget(hash_main, hash_key)
+            data = get_codec(hash_main).decode(resp)
 
-        if resp is None:
+        if data is None:
             return []
         
-        data = json.loads(resp)
-        
         sentence_list = [
             Sentence(
                 id_=data.get('id'),
@@ -531,20 +915,163 @@ class SentenceDAO(AbstractDAO):
 
     def set_map_id_name(self, entity: Sentence):
         hash_main = f'{entity.__class__.__name__}_id'
-        self.r.hsetnx(hash_main, entity.id, entity.foreign_language)
-
-    def set_sentence_id_sequence(self):
-        key_sequence = 'sentence_id_sequence'        
-        if not self.r.exists(key_sequence):
-            self.r.set(key_sequence, 0)
-        self.r.incr(key_sequence)
-
-    def get_sentence_id_sequence(self):
-        key_sequence = 'sentence_id_sequence'        
-        if not self.r.exists(key_sequence):
-            self.r.set(key_sequence, 1)
-        new_id = self.r.get(key_sequence)
-        return new_id
+        self.r.hsetnx(hash_main, entity.id, normalize_text(entity.foreign_language))
+
+    def get_sentence_id_sequence(self, count: int=1):
+        # Allocates count ids atomically and returns the first one
+        return self.next_value(keys=[self.keys.sentence_id_sequence], args=[count])
+
+
+
+class SentenceProgressDAO(AbstractDAO):
+    """The progress of the sentences of a notebook, a field per sentence id in a hash of the
+    notebook written by PageSectionDAO, so a lookup reads only the fields of its sentences
+    """
+    def __init__(self, keys: KeyLayout=None):
+        # Every DAO shares the connection pool of the process, payloads are read as bytes
+        self.r = get_redis()
+        self.raw = get_redis(decode_responses=False)
+        self.keys = keys if keys is not None else get_key_layout()
+
+
+    def insert(self, entity: SentenceProgress) -> SentenceProgress:
+        pass
+
+
+    def advance(self, page_section: PageSection) -> List[SentenceProgress]:
+        """Applies an inserted or updated page section to the progress of its sentences
+        """
+        if not page_section.created_at or page_section.notebook is None:
+            return []
+
+        sentence_ids = list(dict.fromkeys(s.id for s in page_section.sentences if s is not None and s.id is not None))
+        if not sentence_ids:
+            return []
+
+        codec = get_codec(SentenceProgress.__name__)
+        key = self.keys.sentence_progress(page_section.notebook.id)
+        changed = []
+
+        def advance_progress(pipe: redis.client.Pipeline):
+            # Reads under WATCH, the transaction is retried if another client changes the progress
+            data_list = [codec.decode(resp) for resp in pipe.hmget(key, sentence_ids)]
+            progress_dict = dict(zip(sentence_ids, self.build_sentence_progress(data_list)))
+            changed[:] = advance_sentence_progress(progress_dict, page_section)
+
+            pipe.multi()
+            if changed:
+                pipe.hset(key, mapping={p.sentence_id: codec.encode(p.data_to_redis()) for p in changed})
+
+        self.raw.transaction(advance_progress, key)
+
+        return changed
+
+
+    def rebuild(self, notebook_id: int) -> List[SentenceProgress]:
+        """Replays every page section of the notebook, e.g. for the notebooks written before the
+        progress was kept. The progress already stored is replaced
+        """
+        page_section_list = PageSectionDAO(self.keys).find_by_field(PageSection(notebook=Notebook(id_=notebook_id)))
+        page_section_list.sort(key=lambda p: (str(p.created_at), p.section_number))
+
+        progress_dict = dict()
+        for page_section in page_section_list:
+            advance_sentence_progress(progress_dict, page_section)
+
+        codec = get_codec(SentenceProgress.__name__)
+        key = self.keys.sentence_progress(notebook_id)
+        pipe = self.raw.pipeline(transaction=True)
+        pipe.delete(key)
+        if progress_dict:
+            pipe.hset(key, mapping={id_: codec.encode(p.data_to_redis()) for id_, p in progress_dict.items()})
+        pipe.execute()
+
+        return list(progress_dict.values())
+
+
+    def get_all(self, entity: SentenceProgress) -> List[SentenceProgress]:
+        return self.find_by_field(SentenceProgress(notebook_id=entity.notebook_id))
+
+
+    def get_by_id(self, entity: SentenceProgress) -> SentenceProgress:
+        return self.get_many([entity.sentence_id], entity.notebook_id)[-1]
+
+
+    def get_many(self, ids: List[int], notebook_id: int=None) -> List[SentenceProgress]:
+        """The progress of each sentence in the notebook. Without the notebook the hash of every
+        notebook is read, and a sentence of several notebooks gets the progress with the latest
+        last_distillation_at
+        """
+        if not ids:
+            return []
+
+        codec = get_codec(SentenceProgress.__name__)
+        if notebook_id is not None:
+            resp_list = self.raw.hmget(self.keys.sentence_progress(notebook_id), ids)
+            return self.build_sentence_progress([codec.decode(resp) for resp in resp_list])
+
+        # The fields of the ids in every notebook are read in a single round trip
+        pipe = self.raw.pipeline(transaction=False)
+        for notebook in NotebookDAO(self.keys).get_all(Notebook()):
+            pipe.hmget(self.keys.sentence_progress(notebook.id), ids)
+
+        data_list = [None] * len(ids)
+        for resp_list in pipe.execute():
+            for i, data in enumerate(codec.decode(resp) for resp in resp_list):
+                # The dates are stored as YYYY-MM-DD strings, which sort as the dates
+                if data is not None and (data_list[i] is None or
+                                         (data['last_distillation_at'] or '') > (data_list[i]['last_distillation_at'] or '')):
+                    data_list[i] = data
+
+        return self.build_sentence_progress(data_list)
+
+
+    def build_sentence_progress(self, data_list: List[dict]) -> List[SentenceProgress]:
+        """Builds the progress of the stored data, None stays None
+        """
+        return [
+            SentenceProgress(
+                sentence_id          = data['sentence_id'],
+                notebook_id          = data['notebook_id'],
+                section_number       = data['section_number'],
+                group                = Group(data['group']),
+                created_at           = data['created_at'],
+                last_distillation_at = data['last_distillation_at'],
+                next_distillation_at = data['next_distillation_at'],
+                memorized            = data['memorized'],
+            ) if data is not None else None
+            for data in data_list
+        ]
+
+
+    def update(self, entity: SentenceProgress) -> SentenceProgress:
+        pass
+
+
+    def find_by_field(self, entity: SentenceProgress) -> List[SentenceProgress]:
+        if entity.notebook_id is None:
+            raise Exception('The notebook of the SentenceProgress objects must be given!')
+
+        filters = dict([v for v in attributes(entity).items() if bool(v[-1]) and v[0] != 'notebook_id'])
+        for attr, value in filters.items():
+            if isinstance(value, Group):
+                filters[attr] = value.value
+            elif isinstance(value, datetime.date):
+                filters[attr] = str(value)
+            elif attr not in 'sentence_id section_number next_distillation_at last_distillation_at memorized':
+                raise Exception(f'This field "{attr}" cannot be used to find SentenceProgress objects!')
+
+        # The progress of a notebook is a single hash, the filters are applied to its fields
+        codec = get_codec(SentenceProgress.__name__)
+        data_list = [codec.decode(resp) for resp in self.raw.hvals(self.keys.sentence_progress(entity.notebook_id))]
+        data_list = [data for data in data_list if all(data.get(attr) == value for attr, value in filters.items())]
+        data_list.sort(key=lambda data: data['sentence_id'])
+
+        return self.build_sentence_progress(data_list)
+
+
+    def delete(self, entity: SentenceProgress) -> bool:
+        pass
 
 
 
@@ -0,0 +1,380 @@
+"""Append-only Parquet dataset used as storage by the Parquet DAOs.
+
+A dataset is a directory of small immutable fragment files. Inserts and
+updates never rewrite existing files: they append a new fragment whose rows
+carry a ``write_seq`` column, and readers keep only the latest version of
+each record. Page sections are partitioned by ``notebook_id`` in hive style
+(``notebook_id=1/part-....parquet``). A background compaction merges the
+small fragments of a partition into a single larger one.
+
+Filtered reads go through ``ParquetDataset.query``, which turns the filters
+into pyarrow dataset expressions and reads only the requested columns, so
+partition directories and row groups whose min/max statistics cannot match
+are skipped.
+"""
+
+import datetime
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from logger import logger
+
+WRITE_SEQ_COLUMN = 'write_seq'
+
+# Number of fragments in a partition that triggers a background compaction
+COMPACTION_THRESHOLD = 32
+
+# Rows per row group, small enough for the min/max statistics to skip data in compacted fragments
+ROW_GROUP_SIZE = 8192
+
+# Dates are stored as date32 so readers get datetime.date objects, as the entities expect
+_ARROW_TYPES = {
+    'int64'          : pa.int64(),
+    'Int64'          : pa.int64(),
+    'datetime64[ns]' : pa.date32(),
+    str              : pa.string(),
+    bool             : pa.bool_(),
+}
+
+
+class ParquetDataset():
+    def __init__(self,
+                 path         : Path,
+                 columns      : List[str],
+                 types        : list,
+                 key          : List[str],
+                 row_key      : List[str]=None,
+                 partition_by : str=None,
+                 sort_by      : List[str]=None,
+                 legacy_file  : Path=None):
+        self.path         = Path(path)
+        self.columns      = columns
+        self.types        = types
+        self.key          = key                                  # identifies a record
+        self.row_key      = row_key if row_key is not None else key   # identifies a row of a record
+        self.partition_by = partition_by
+        self.sort_by      = sort_by if sort_by is not None else self.row_key   # order of the rows in a fragment
+
+        self.schema = pa.schema(
+            [(c, _ARROW_TYPES[t]) for c, t in zip(columns, types)] + [(WRITE_SEQ_COLUMN, pa.int64())]
+        )
+        self.file_schema = self.schema if partition_by is None \
+            else self.schema.remove(self.schema.get_field_index(partition_by))
+        self.partitioning = None if partition_by is None \
+            else ds.partitioning(pa.schema([self.schema.field(partition_by)]), flavor='hive')
+
+        self._lock = threading.Lock()
+        # Held while the fragments of a partition are replaced, by compact and replace_partition
+        self._rewrite_lock = threading.Lock()
+        self._last_write_seq = 0
+        self._compacting = False
+
+        # The directories are created by the first write
+        if legacy_file is not None and Path(legacy_file).exists():
+            self._import_legacy_file(Path(legacy_file))
+
+    def signature(self, partitions: List[Path]=None) -> frozenset:
+        """The fragments of the dataset, or only of the given partitions, with their mtime and size
+        """
+        fragments = self.fragments() if partitions is None \
+            else [f for partition in partitions for f in self.fragments(partition)]
+        return frozenset(
+            (str(f), s.st_mtime_ns, s.st_size) for f, s in self._stat_fragments(fragments)
+        )
+
+    def partitions(self, filters: List[Tuple[str, str, object]]) -> List[Path]:
+        """The partition directories the filters can match, None when they can match any partition
+        """
+        if self.partition_by is None:
+            return None
+        for column, operator, value in filters:
+            if column == self.partition_by and operator == '==':
+                return [self.path / f'{self.partition_by}={int(value)}']
+            if column == self.partition_by and operator == 'in':
+                return [self.path / f'{self.partition_by}={int(v)}' for v in dict.fromkeys(value)]
+        return None
+
+    def fragments(self, partition: Path=None) -> List[Path]:
+        return sorted(
+            f for f in (partition or self.path).rglob('*.parquet') if not f.name.startswith('.')
+        )
+
+    def read(self) -> pd.DataFrame:
+        return self.latest_versions(self.to_frame(self._to_table()))
+
+    def query(self, filters: List[Tuple[str, str, object]], columns: List[str]=None) -> pd.DataFrame:
+        """Reads only the rows matching the filters, a list of (column, operator, value) with
+        the operators ==, in, >=, <=, > and <, and only the given columns
+        """
+        read_columns = None if columns is None \
+            else list(dict.fromkeys(columns + self.row_key + [WRITE_SEQ_COLUMN]))
+        # Only the fragments of the partitions the filters can match are listed and read
+        partitions = self.partitions(filters)
+
+        df = self.to_frame(self._to_table(filter=self.expression(filters), columns=read_columns,
+                                          partitions=partitions), read_columns)
+
+        # A filter on a column that changes between versions may match an old version of a record,
+        # so the matches are checked against the latest write_seq of their keys
+        if not df.empty and any(column not in self.key + [self.partition_by] for column, _, _ in filters):
+            key = self.key[-1]
+            key_filters = [(key, 'in', df[key].dropna().unique().tolist())] + \
+                [f for f in filters if f[0] == self.partition_by and f[1] in ('==', 'in')]
+            df_versions = self.to_frame(self._to_table(filter=self.expression(key_filters),
+                                                       columns=[key, WRITE_SEQ_COLUMN],
+                                                       partitions=partitions),
+                                        [key, WRITE_SEQ_COLUMN])
+            latest = df_versions.groupby(key)[WRITE_SEQ_COLUMN].max()
+            df = df[df[WRITE_SEQ_COLUMN] == df[key].map(latest)]
+
+        df = self.latest_versions(df)
+        return df if columns is None else df[columns]
+
+    def filter_frame(self, df: pd.DataFrame, filters: List[Tuple[str, str, object]],
+                     columns: List[str]=None) -> pd.DataFrame:
+        """Applies the same filters of query to a frame already in memory
+        """
+        mask = np.ones(len(df), dtype=bool)
+        for column, operator, value in filters:
+            value = self._filter_value(column, value)
+            if value is None:
+                mask &= False
+            elif operator == 'in':
+                mask &= df[column].isin(value).to_numpy(dtype=bool, na_value=False)
+            else:
+                mask &= _OPERATORS[operator](df[column], value).to_numpy(dtype=bool, na_value=False)
+
+        df = df[mask]
+        return df if columns is None else df[columns]
+
+    def expression(self, filters: List[Tuple[str, str, object]]) -> ds.Expression:
+        expression = None
+        for column, operator, value in filters:
+            value = self._filter_value(column, value)
+            if value is None:
+                # Comparing with None never matches, as in pandas
+                condition = pc.scalar(False)
+            elif operator == 'in':
+                condition = ds.field(column).isin(value)
+            else:
+                condition = _OPERATORS[operator](ds.field(column), value)
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def read_fragments(self, fragments: List[Path]) -> pa.Table:
+        return ds.dataset([str(f) for f in fragments],
+                          schema=self.schema,
+                          format='parquet',
+                          partitioning=self.partitioning,
+                          partition_base_dir=str(self.path)).to_table()
+
+    def append(self, df: pd.DataFrame) -> List[Path]:
+        if df.empty:
+            return []
+
+        df = self.conform(df)
+        df[WRITE_SEQ_COLUMN] = self._next_write_seq()
+
+        written = []
+        for partition, df_partition in self._split_partitions(df):
+            written.append(self._write_fragment(partition, df_partition))
+
+            if len(self.fragments(partition)) >= COMPACTION_THRESHOLD:
+                self.compact_in_background()
+
+        return written
+
+    def replace_partition(self, value, df: pd.DataFrame) -> List[Path]:
+        """Replaces every record of the partition with the rows of df, which may be empty
+        """
+        partition = self.path / f'{self.partition_by}={int(value)}'
+
+        # Without the lock, a compaction that read the old fragments could publish their
+        # records again after they were removed
+        with self._rewrite_lock:
+            fragments = self.fragments(partition)
+
+            written = []
+            if not df.empty:
+                df = self.conform(df.assign(**{self.partition_by: value}))
+                df[WRITE_SEQ_COLUMN] = self._next_write_seq()
+                written.append(self._write_fragment(partition, df.drop(columns=self.partition_by)))
+
+            # As in compact, the new fragment is published before the old ones are removed
+            self._remove_fragments(fragments)
+
+        return written
+
+    def compact(self) -> None:
+        if not self.path.exists():
+            return
+        partitions = [self.path] if self.partition_by is None \
+            else [p for p in self.path.iterdir() if p.is_dir() and not p.name.startswith('.')]
+
+        for partition in partitions:
+            with self._rewrite_lock:
+                fragments = self.fragments(partition)
+                if len(fragments) < 2:
+                    continue
+
+                df = self.latest_versions(self.to_frame(self.read_fragments(fragments)))
+                if self.partition_by is not None:
+                    df = df.drop(columns=self.partition_by)
+
+                # The merged fragment is published before the old ones are removed, readers
+                # that see both drop the duplicated rows in latest_versions
+                self._write_fragment(partition, df, write_seq=df[WRITE_SEQ_COLUMN].max())
+                self._remove_fragments(fragments)
+
+            logger.debug(f'Compacted {len(fragments)} fragments of {partition}')
+
+    def compact_in_background(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            except Exception as error:
+                logger.error(f'Compaction of {self.path} failed: {error}')
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+        threading.Thread(target=run, name=f'compact-{self.path.name}', daemon=True).start()
+
+    def conform(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.reindex(columns=self.columns)
+        for column, type_ in zip(self.columns, self.types):
+            if type_ == 'datetime64[ns]':
+                df[column] = pd.to_datetime(df[column]).dt.date
+            elif type_ is not str:
+                df[column] = df[column].astype(type_)
+        return df
+
+    def to_frame(self, table: pa.Table, columns: List[str]=None) -> pd.DataFrame:
+        df = table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+        return df.reindex(columns=self.columns + [WRITE_SEQ_COLUMN] if columns is None else columns)
+
+    def latest_versions(self, df: pd.DataFrame) -> pd.DataFrame:
+        if df.empty:
+            return df.reset_index(drop=True)
+
+        df = df.drop_duplicates(subset=self.row_key + [WRITE_SEQ_COLUMN])
+        latest = df.groupby(self.key, dropna=False)[WRITE_SEQ_COLUMN].transform('max')
+        df = df[df[WRITE_SEQ_COLUMN] == latest]
+
+        # Keeps the insertion order, updated records move to the end as a rewrite would do
+        return df.sort_values(WRITE_SEQ_COLUMN, kind='stable').reset_index(drop=True)
+
+    def _split_partitions(self, df: pd.DataFrame):
+        if self.partition_by is None:
+            yield self.path, df
+            return
+
+        for value, df_partition in df.groupby(self.partition_by, sort=False):
+            yield self.path / f'{self.partition_by}={int(value)}', df_partition.drop(columns=self.partition_by)
+
+    def _write_fragment(self, partition: Path, df: pd.DataFrame, write_seq: int=None) -> Path:
+        partition.mkdir(parents=True, exist_ok=True)
+
+        write_seq = df[WRITE_SEQ_COLUMN].iloc[0] if write_seq is None else write_seq
+        fragment = partition / f'part-{int(write_seq):020d}-{uuid.uuid4().hex[:8]}.parquet'
+        tmp_fragment = partition / f'.{fragment.name}.tmp'
+
+        # Sorted rows keep the min/max statistics of each row group narrow
+        df = df.sort_values([c for c in self.sort_by if c in df.columns], kind='stable')
+        table = pa.Table.from_pandas(df, schema=self.file_schema, preserve_index=False)
+        pq.write_table(table, tmp_fragment, row_group_size=ROW_GROUP_SIZE)
+
+        # Readers ignore dot files, so the fragment only becomes visible complete
+        os.replace(tmp_fragment, fragment)
+        return fragment
+
+    @staticmethod
+    def _remove_fragments(fragments: List[Path]) -> None:
+        for fragment in fragments:
+            try:
+                fragment.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _next_write_seq(self) -> int:
+        with self._lock:
+            self._last_write_seq = max(time.time_ns(), self._last_write_seq + 1)
+            return self._last_write_seq
+
+    def _import_legacy_file(self, legacy_file: Path) -> None:
+        if not self.fragments():
+            df = pd.read_parquet(legacy_file)
+            if not df.empty:
+                df = self.conform(df)
+                df[WRITE_SEQ_COLUMN] = 0
+                for partition, df_partition in self._split_partitions(df):
+                    self._write_fragment(partition, df_partition)
+        legacy_file.rename(legacy_file.with_name(legacy_file.name + '.migrated'))
+        logger.info(f'Imported {legacy_file} into the dataset {self.path}')
+
+    def _to_table(self, filter: ds.Expression=None, columns: List[str]=None,
+                  partitions: List[Path]=None) -> pa.Table:
+        # A compaction may remove fragments between listing and reading them
+        if not self.path.exists():
+            return self.schema.empty_table().select(columns if columns is not None else self.schema.names)
+
+        for attempt in range(3):
+            try:
+                if partitions is None:
+                    source = self.path
+                else:
+                    source = [str(f) for partition in partitions for f in self.fragments(partition)]
+                    if not source:
+                        return self.schema.empty_table().select(columns if columns is not None else self.schema.names)
+                return ds.dataset(source,
+                                  schema=self.schema,
+                                  format='parquet',
+                                  partitioning=self.partitioning,
+                                  partition_base_dir=None if partitions is None else str(self.path)) \
+                         .to_table(filter=filter, columns=columns)
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+    def _filter_value(self, column: str, value):
+        # Date columns are compared with datetime.date values
+        if self.schema.field(column).type != pa.date32():
+            return value
+        if isinstance(value, (list, tuple)):
+            return [self._filter_value(column, v) for v in value]
+        if value is None or pd.isna(value):
+            return None
+        return pd.Timestamp(value).date() if not type(value) is datetime.date else value
+
+    @staticmethod
+    def _stat_fragments(fragments: List[Path]):
+        for fragment in fragments:
+            try:
+                yield fragment, fragment.stat()
+            except FileNotFoundError:
+                continue
+
+
+_OPERATORS = {
+    '==' : lambda a, b: a == b,
+    '>=' : lambda a, b: a >= b,
+    '<=' : lambda a, b: a <= b,
+    '>'  : lambda a, b: a > b,
+    '<'  : lambda a, b: a < b,
+}
@@ -0,0 +1,111 @@
+"""Persistent hash index from a normalized text value to an entity id.
+
+The index is an append-only log of JSON lines ``[key, id]`` kept next to the
+dataset it indexes. Each process loads it once into a dict and afterwards only
+reads the lines appended by other writers, so lookups are O(1) and never touch
+the indexed table. A missing or corrupt log is rebuilt from the table.
+"""
+
+import json
+import os
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from logger import logger
+
+
+def normalize_text(value: str) -> str:
+    if value is None:
+        return None
+    return unicodedata.normalize('NFC', ' '.join(str(value).split()))
+
+
+class HashIndex():
+    def __init__(self,
+                 path    : Path,
+                 rebuild : Callable[[], Iterable[Tuple[str, int]]],
+                 normalize : Callable[[str], str]=normalize_text):
+        self.path      = Path(path)
+        self.normalize = normalize
+        self._rebuild  = rebuild
+        self._lock     = threading.RLock()
+        self._index    = dict()
+        self._inode    = None
+        self._offset   = 0
+
+    def get(self, value: str) -> int:
+        return self.get_many([value])[-1]
+
+    def get_many(self, values: List[str]) -> List[int]:
+        with self._lock:
+            self._refresh()
+            return [self._index.get(self.normalize(value)) for value in values]
+
+    def add(self, value: str, id_: int) -> None:
+        self.add_many([(value, id_)])
+
+    def add_many(self, pairs: Iterable[Tuple[str, int]]) -> None:
+        lines = ''.join(json.dumps([self.normalize(value), int(id_)]) + '\n' for value, id_ in pairs)
+        if not lines:
+            return
+
+        with self._lock:
+            self._refresh()
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
+            self._refresh()
+
+    def rebuild(self) -> None:
+        with self._lock:
+            index = {self.normalize(value): int(id_) for value, id_ in self._rebuild()}
+
+            tmp_path = self.path.with_name(f'.{self.path.name}.tmp')
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.writelines(json.dumps([key, id_]) + '\n' for key, id_ in index.items())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+
+            self._index = dict()
+            self._inode = None
+            self._offset = 0
+            self._refresh()
+
+            logger.info(f'Rebuilt the index {self.path} with {len(index)} keys')
+
+    def _refresh(self) -> None:
+        # Loads only the lines written since the last refresh, or everything when the file was replaced
+        if not self.path.exists():
+            self.rebuild()
+            return
+
+        stat = self.path.stat()
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._index = dict()
+            self._inode = stat.st_ino
+            self._offset = 0
+
+        if stat.st_size == self._offset:
+            return
+
+        with open(self.path, 'rb') as file:
+            file.seek(self._offset)
+            data = file.read()
+
+        # A line still being written by another process is left for the next refresh
+        complete = data[:data.rfind(b'\n') + 1]
+        try:
+            for line in complete.splitlines():
+                key, id_ = json.loads(line)
+                self._index[key] = id_
+        except (ValueError, TypeError):
+            logger.error(f'The index {self.path} is corrupt and will be rebuilt')
+            self.rebuild()
+            return
+
+        self._offset += len(complete)
@@ -0,0 +1,201 @@
+"""Process-wide near cache of the entities read by the Redis DAOs.
+
+Notebooks and sentences barely change after they are inserted, so the data
+read from Redis is kept in an in-process LRU with a TTL per entity type, and
+repeated reads of the same ids do not touch the network.
+
+Writes made by any process that change a stored entity bump the version
+counter of its entity type (``bump_version``). Other processes see the new
+version and drop their entries of that type:
+
+* with ``NearCache.listen``, through keyspace notifications, when the server
+  has them enabled (notify-keyspace-events with K and $ or A);
+* otherwise by reading the version again at most every
+  ``version_check_interval`` seconds.
+
+The cache talks to the client of ``get_redis`` unless another one is given,
+so it can be exercised against a local Redis or a fakeredis server.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+import redis
+
+from app.core.redis_client import get_redis
+from logger import logger
+
+# Number of entities kept in memory, across all entity types
+MAX_SIZE = 10000
+
+# Seconds an entity is served from memory, per entity type
+TTLS = {
+    'Notebook' : 300,
+    'Sentence' : 3600,
+}
+DEFAULT_TTL = 60
+
+# Seconds between two reads of the version of an entity type, when there are no notifications
+VERSION_CHECK_INTERVAL = 5
+
+VERSION_KEY_PREFIX = 'near_cache_version:'
+
+
+class NearCache():
+    def __init__(self, client: redis.Redis=None, max_size: int=MAX_SIZE, ttls: Dict[str, float]=None,
+                 version_check_interval: float=VERSION_CHECK_INTERVAL):
+        self._client = client
+        self.max_size = max_size
+        self.ttls = dict(TTLS if ttls is None else ttls)
+        self.version_check_interval = version_check_interval
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (entity type, id) -> (data, expires_at)
+        self._versions = dict()         # entity type -> (version, checked_at)
+        self._listener = None
+        self._metrics = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    @property
+    def client(self) -> redis.Redis:
+        return self._client if self._client is not None else get_redis()
+
+    def get_many(self, entity_class: type, ids: List, loader: Callable[[List], List[dict]]) -> List[dict]:
+        """Returns the data of each id, calling loader only with the ids that are not in memory.
+        loader returns the data of each id it gets, None when it does not exist (not cached)
+        """
+        entity_type = entity_class.__name__
+        self._check_version(entity_type)
+
+        now = time.monotonic()
+        data_dict = dict()
+        with self._lock:
+            for id_ in ids:
+                entry = self._entries.get((entity_type, id_))
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[(entity_type, id_)]
+                    self._metrics['expirations'] += 1
+                    continue
+                self._entries.move_to_end((entity_type, id_))
+                data_dict[id_] = entry[0]
+
+            missing = [id_ for id_ in ids if id_ not in data_dict]
+            self._metrics['hits'] += len(ids) - len(missing)
+            self._metrics['misses'] += len(missing)
+            missing = list(dict.fromkeys(missing))
+
+        if missing:
+            for id_, data in zip(missing, loader(missing)):
+                if data is not None:
+                    self.put(entity_class, id_, data)
+                    data_dict[id_] = data
+
+        return [data_dict.get(id_) for id_ in ids]
+
+    def put(self, entity_class: type, id_, data: dict) -> None:
+        entity_type = entity_class.__name__
+        expires_at = time.monotonic() + self.ttls.get(entity_type, DEFAULT_TTL)
+
+        with self._lock:
+            self._entries[(entity_type, id_)] = (data, expires_at)
+            self._entries.move_to_end((entity_type, id_))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._metrics['evictions'] += 1
+
+    def invalidate(self, entity_class: type=None, id_=None) -> None:
+        """Drops an entity, every entity of a type or, without arguments, the whole cache
+        """
+        with self._lock:
+            if entity_class is None:
+                self._entries.clear()
+                self._versions.clear()
+            elif id_ is not None:
+                self._entries.pop((entity_class.__name__, id_), None)
+            else:
+                self._drop_type(entity_class.__name__)
+            self._metrics['invalidations'] += 1
+
+    def bump_version(self, entity_class: type) -> None:
+        """Called after a write that changes stored entities, so every process drops them
+        """
+        entity_type = entity_class.__name__
+        version = self.client.incr(f'{VERSION_KEY_PREFIX}{entity_type}')
+
+        with self._lock:
+            self._drop_type(entity_type)
+            self._versions[entity_type] = (version, time.monotonic())
+            self._metrics['invalidations'] += 1
+
+    def listen(self) -> bool:
+        """Drops the entities of a type as soon as its version changes, without reading the versions
+        again. Returns False when the server does not send keyspace notifications
+        """
+        if self._listener is not None:
+            return True
+
+        try:
+            events = self.client.config_get('notify-keyspace-events').get('notify-keyspace-events', '')
+        except redis.RedisError as error:
+            logger.warning(f'Keyspace notifications cannot be checked: {error}')
+            return False
+        if 'K' not in events or not ('$' in events or 'A' in events):
+            return False
+
+        db = self.client.connection_pool.connection_kwargs.get('db', 0)
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(**{f'__keyspace@{db}__:{VERSION_KEY_PREFIX}*': self._on_version_changed})
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+        return True
+
+    def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._metrics['hits'] + self._metrics['misses']
+            return {
+                **self._metrics,
+                'size'      : len(self._entries),
+                'hit_rate'  : self._metrics['hits'] / lookups if lookups else None,
+                'listening' : self._listener is not None,
+            }
+
+    def _check_version(self, entity_type: str) -> None:
+        if self._listener is not None:
+            return
+
+        now = time.monotonic()
+        cached = self._versions.get(entity_type)
+        if cached is not None and now - cached[1] < self.version_check_interval:
+            return
+
+        version = int(self.client.get(f'{VERSION_KEY_PREFIX}{entity_type}') or 0)
+
+        with self._lock:
+            # The entries of a type are dropped when another process changed its version
+            if cached is not None and cached[0] != version:
+                self._drop_type(entity_type)
+                self._metrics['invalidations'] += 1
+            self._versions[entity_type] = (version, now)
+
+    def _on_version_changed(self, message: dict) -> None:
+        channel = message['channel']
+        channel = channel.decode() if isinstance(channel, bytes) else channel
+
+        with self._lock:
+            self._drop_type(channel.split(VERSION_KEY_PREFIX, 1)[-1])
+            self._metrics['invalidations'] += 1
+
+    def _drop_type(self, entity_type: str) -> None:
+        for key in [key for key in self._entries if key[0] == entity_type]:
+            del self._entries[key]
+
+
+near_cache = NearCache()
@@ -0,0 +1,53 @@
+"""One-shot migrations of the Parquet datasets used by the Parquet DAOs.
+
+Run them from the repository root with:
+
+    python -m app.core.parquet_migration
+
+The single-file tables of the first versions are imported by the datasets
+themselves when they are opened (see ``app.core.dataset``).
+"""
+
+from app.core.dao_parquet import page_section_dataset
+from app.core.dataset import ParquetDataset
+from app.core.table_cache import table_cache
+from app.model import legacy_created_by_ids
+from logger import logger
+
+
+def migrate_created_by_ids(dataset: ParquetDataset=None) -> int:
+    """Rewrites the created_by_id of the page sections that still hold the page_number of the
+    page section they were created by with its section_number, as a new version of their rows.
+    It can be run again safely. Returns the number of page sections rewritten
+    """
+    dataset = dataset if dataset is not None else page_section_dataset
+
+    df = table_cache.read(dataset)
+    if df.empty:
+        return 0
+
+    df_pages = df.drop_duplicates('section_number')[['notebook_id', 'section_number', 'page_number', 'group',
+                                                     'created_by_id']]
+    # As object columns the Int64 values come out as int and the missing values as None
+    df_pages = df_pages.astype(object).where(df_pages.notna(), None)
+
+    created_by_ids = dict()
+    for _, df_notebook in df_pages.groupby('notebook_id'):
+        created_by_ids.update(legacy_created_by_ids(df_notebook.to_dict('records')))
+
+    if created_by_ids:
+        df_changed = df[df['section_number'].isin(list(created_by_ids))].copy()
+        df_changed['created_by_id'] = df_changed['section_number'].map(created_by_ids)
+        table_cache.append(dataset, df_changed)
+
+    logger.info(f'Rewrote the created_by_id of {len(created_by_ids)} page sections')
+
+    return len(created_by_ids)
+
+
+def main():
+    migrate_created_by_ids()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Process-wide Redis client shared by the Redis DAOs.
+
+Every DAO gets its client from ``get_redis``, which is backed by a single
+blocking connection pool created lazily on first use (a second pool serves
+the client that returns bytes, used for binary payloads). The DAOs can be created
+freely, even inside loops, without opening new sockets: all Streamlit
+sessions of the process reuse at most ``max_connections`` connections, and a
+caller waits up to ``timeout`` seconds for a free one when all are busy.
+
+The configuration is read from ``st.secrets`` (HOST, PORT, PASSWORD and the
+optional MAX_CONNECTIONS, POOL_TIMEOUT and HEALTH_CHECK_INTERVAL) or, when
+there are no secrets, from the environment variables with the ``REDIS_``
+prefix (REDIS_HOST, REDIS_PORT, ...). With CLUSTER set to true the client is
+a ``RedisCluster`` that keeps its own pool for each node, it needs the
+cluster key layout (KEY_LAYOUT, see ``app.core.redis_keys``). Its node pools
+do not block nor check idle connections, so POOL_TIMEOUT and
+HEALTH_CHECK_INTERVAL are rejected in cluster mode.
+"""
+
+import os
+import threading
+
+import redis
+import redis.cluster
+
+try:
+    import streamlit as st
+except ImportError:     # the DAOs are also used without the app, e.g. by redis_migration and the tests
+    st = None
+
+from logger import logger
+
+MAX_CONNECTIONS = 16
+
+# Seconds a caller waits for a free connection before an error is raised
+POOL_TIMEOUT = 5
+
+# Idle connections are checked with a PING before being used after this many seconds
+HEALTH_CHECK_INTERVAL = 30
+
+_lock = threading.RLock()
+_pools = dict()       # decode_responses -> pool
+_clients = dict()     # decode_responses -> client
+
+
+def get_setting(name: str, default=None):
+    try:
+        value = st.secrets.get(name) if st is not None else None
+    except Exception:   # there is no secrets file
+        value = None
+    if value is None:
+        value = os.getenv(f'REDIS_{name}', default)
+    return value
+
+
+def is_cluster() -> bool:
+    return str(get_setting('CLUSTER', False)).lower() in ('1', 'true', 'yes')
+
+
+def get_redis_config() -> dict:
+    return {
+        'host'                  : get_setting('HOST', 'localhost'),
+        'port'                  : int(get_setting('PORT', 6379)),
+        'password'              : get_setting('PASSWORD'),
+        'max_connections'       : int(get_setting('MAX_CONNECTIONS', MAX_CONNECTIONS)),
+        'timeout'               : float(get_setting('POOL_TIMEOUT', POOL_TIMEOUT)),
+        'health_check_interval' : int(get_setting('HEALTH_CHECK_INTERVAL', HEALTH_CHECK_INTERVAL)),
+    }
+
+
+def get_cluster_config() -> dict:
+    unsupported = [name for name in ('POOL_TIMEOUT', 'HEALTH_CHECK_INTERVAL') if get_setting(name) is not None]
+    if unsupported:
+        raise Exception(f'The settings {unsupported} are not supported by the Redis cluster client, remove them!')
+    config = get_redis_config()
+    return {name: config[name] for name in ('host', 'port', 'password', 'max_connections')}
+
+
+class CountingConnectionPool(redis.BlockingConnectionPool):
+    """Blocking pool that counts the connections it created and the ones lent to callers, see pool_stats
+    """
+    def reset(self):
+        self._stats_lock = threading.Lock()
+        self._created = 0
+        self._lent = set()
+        super().reset()
+
+    def make_connection(self):
+        connection = super().make_connection()
+        with self._stats_lock:
+            self._created += 1
+        return connection
+
+    def get_connection(self, *args, **kwargs):
+        connection = super().get_connection(*args, **kwargs)
+        with self._stats_lock:
+            self._lent.add(connection)
+        return connection
+
+    def release(self, connection):
+        # A connection that failed to connect is released without having been lent
+        with self._stats_lock:
+            self._lent.discard(connection)
+        super().release(connection)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            created, in_use = self._created, len(self._lent)
+        return {
+            'max_connections' : self.max_connections,
+            'created'         : created,
+            'idle'            : created - in_use,
+            'in_use'          : in_use,
+        }
+
+
+def get_pool(decode_responses: bool=True) -> CountingConnectionPool:
+    if decode_responses not in _pools:
+        with _lock:
+            if decode_responses not in _pools:
+                config = get_redis_config()
+                _pools[decode_responses] = CountingConnectionPool(decode_responses=decode_responses, **config)
+                logger.info(f'Created a Redis connection pool to {config["host"]}:{config["port"]} '
+                            f'with at most {config["max_connections"]} connections')
+    return _pools[decode_responses]
+
+
+def get_redis(decode_responses: bool=True) -> redis.Redis:
+    """Returns the client shared by the whole process, it is thread-safe. The client with
+    decode_responses=False returns bytes and is used to read binary payloads
+    """
+    if decode_responses not in _clients:
+        with _lock:
+            if decode_responses not in _clients and is_cluster():
+                _clients[decode_responses] = redis.cluster.RedisCluster(decode_responses=decode_responses,
+                                                                        **get_cluster_config())
+            elif decode_responses not in _clients:
+                _clients[decode_responses] = redis.Redis(connection_pool=get_pool(decode_responses))
+    return _clients[decode_responses]
+
+
+def set_redis(client: redis.Redis, decode_responses: bool=True) -> None:
+    """Replaces the shared client, e.g. with a client built for another server
+    """
+    with _lock:
+        _clients[decode_responses] = client
+
+
+def pool_stats(decode_responses: bool=True) -> dict:
+    """Connection counts of the shared pool, the cluster client and a client given to set_redis
+    have no shared pool
+    """
+    pool = _pools.get(decode_responses)
+    if pool is None:
+        return {'max_connections': None, 'created': 0, 'idle': 0, 'in_use': 0}
+    return pool.stats()
+
+
+def close_pool() -> None:
+    with _lock:
+        for pool in _pools.values():
+            pool.disconnect()
+        for client in _clients.values():
+            if isinstance(client, redis.cluster.RedisCluster):
+                client.close()
+        _pools.clear()
+        _clients.clear()
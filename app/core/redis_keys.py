@@ -0,0 +1,135 @@
+"""Key layouts of the Redis DAOs.
+
+legacy
+    The original keys: one hash per entity type (``Notebook``, ``Sentence``,
+    ``Sentence_id``, ...) and global index sets. Every request hits the same
+    few keys, so they cannot be spread across the nodes of a Redis Cluster.
+
+cluster
+    Every key of a notebook carries the hash tag ``{nb:<id>}`` (its payload,
+    page sections, index sets, sequences, sentence progress), so one notebook lives in a single
+    slot while different notebooks spread across the nodes, e.g.
+    ``{nb:42}:ps:<id>``. Sentences are shared by the notebooks, so they are
+    spread over ``SENTENCE_BUCKETS`` hashes by id, with the unique index of
+    their text spread the same way.
+
+The layout is chosen with the KEY_LAYOUT setting (see ``get_key_layout``),
+``redis_migration.migrate_to_cluster_layout`` copies a legacy keyspace.
+"""
+
+import zlib
+from typing import List
+
+from app.core.redis_client import get_setting
+from app.model import Group, Notebook, PageSection, SentenceProgress
+
+LEGACY = 'legacy'
+CLUSTER = 'cluster'
+
+# Hashes the sentences and their unique index are spread over, in the cluster layout
+SENTENCE_BUCKETS = 1024
+
+# Fields of the page sections with a secondary index
+PAGE_SECTION_INDEX_FIELDS = ['notebook_id', 'group', 'created_at', 'distillation_at',
+                             'section_number', 'created_by_id', 'distillated']
+
+
+def index_value(value):
+    if isinstance(value, Notebook):
+        return value.id
+    if isinstance(value, Group):
+        return value.value
+    return value
+
+
+class KeyLayout():
+    """The legacy layout, the notebook ids are not used by the keys shared by all notebooks
+    """
+    name = LEGACY
+    cluster = False
+
+    notebook_id_sequence = 'notebook_id_sequence'
+    sentence_id_sequence = 'sentence_id_sequence'
+
+    def page_section(self, page_section_id: str, notebook_id: int=None) -> str:
+        # Hash with the fields of a page section, its per-sentence lists take one field per sentence
+        return f'{PageSection.__name__}:{page_section_id}'
+
+    def page_section_ids(self, notebook_id: int=None) -> str:
+        # Set with the ids of the page sections stored in their own hash
+        return f'{PageSection.__name__}_ids'
+
+    def page_section_membership(self, notebook_id: int) -> str:
+        # Sorted set with the page section ids of a notebook scored by distillation_at
+        return f'notebook_has_page_section_id:{Notebook.__name__}_{notebook_id}'
+
+    def page_section_index(self, notebook_id: int, field: str, value) -> str:
+        # Set with the ids of the page sections whose field has the value
+        return f'{PageSection.__name__}_idx:{field}:{index_value(value)}'
+
+    def page_section_indexes(self, data: dict) -> List[str]:
+        return [self.page_section_index(data.get('notebook_id'), field, data.get(field))
+                for field in PAGE_SECTION_INDEX_FIELDS]
+
+    def section_number_sequence(self, notebook_id: int) -> str:
+        return f'sec_num_id_nb{notebook_id}_sequence'
+
+    def page_number_sequence(self, notebook_id: int, group: str) -> str:
+        return f'pg_num_nb{notebook_id}_gp{group}_sequence'
+
+    def sentence_progress(self, notebook_id: int) -> str:
+        # Hash with the progress of each sentence id of a notebook
+        return f'{SentenceProgress.__name__}:{Notebook.__name__}_{notebook_id}'
+
+
+class ClusterKeyLayout(KeyLayout):
+    name = CLUSTER
+    cluster = True
+
+    # Name -> id of the notebooks, small enough to stay in a single slot
+    notebook_names = 'notebook_names'
+
+    def notebook(self, notebook_id: int) -> str:
+        return f'{{nb:{notebook_id}}}:notebook'
+
+    def page_section(self, page_section_id: str, notebook_id: int=None) -> str:
+        return f'{{nb:{notebook_id}}}:ps:{page_section_id}'
+
+    def page_section_ids(self, notebook_id: int=None) -> str:
+        return f'{{nb:{notebook_id}}}:ps_ids'
+
+    def page_section_membership(self, notebook_id: int) -> str:
+        return f'{{nb:{notebook_id}}}:ps_due'
+
+    def page_section_index(self, notebook_id: int, field: str, value) -> str:
+        return f'{{nb:{notebook_id}}}:ps_idx:{field}:{index_value(value)}'
+
+    def page_section_locator(self, page_section_id: str) -> str:
+        # Hash with the notebook id of each page section, the ids are hex checksums so 256 hashes are used
+        return f'{{psl:{page_section_id[:2]}}}:ps_notebook'
+
+    def section_number_sequence(self, notebook_id: int) -> str:
+        return f'{{nb:{notebook_id}}}:seq:section_number'
+
+    def page_number_sequence(self, notebook_id: int, group: str) -> str:
+        return f'{{nb:{notebook_id}}}:seq:page_number:{group}'
+
+    def sentence_progress(self, notebook_id: int) -> str:
+        return f'{{nb:{notebook_id}}}:progress'
+
+    def sentence(self, sentence_id: int) -> str:
+        # Hash with the payload of each sentence id of the bucket
+        return f'{{s:{int(sentence_id) % SENTENCE_BUCKETS}}}:sentence'
+
+    def sentence_by_text(self, foreign_language: str) -> str:
+        # Hash with the id of each sentence text of the bucket, it keeps the texts unique
+        return f'{{st:{zlib.crc32(foreign_language.encode()) % SENTENCE_BUCKETS}}}:sentence_id'
+
+
+def get_key_layout() -> KeyLayout:
+    layout = get_setting('KEY_LAYOUT', LEGACY)
+    if layout == CLUSTER:
+        return ClusterKeyLayout()
+    if layout != LEGACY:
+        raise Exception(f'The Redis key layout "{layout}" does not exist!')
+    return KeyLayout()
@@ -0,0 +1,348 @@
+"""One-shot migrations of the keys used by the Redis DAOs.
+
+Run them from the repository root with:
+
+    python -m app.core.redis_migration
+
+The migrations to the legacy layout run against the shared client. Moving to
+the cluster layout (see ``app.core.redis_keys``) is a separate step, run once
+the others are done:
+
+    python -m app.core.redis_migration cluster
+"""
+
+import json
+import sys
+
+import redis
+
+from app.core.codec import MAGIC, get_codec
+from app.core.dao_redis import (NotebookDAO, PageSectionDAO, SentenceProgressDAO, date_to_score,
+                                page_section_to_fields)
+from app.core.hash_index import normalize_text
+from app.core.redis_client import get_redis
+from app.core.redis_keys import ClusterKeyLayout, KeyLayout
+from app.model import Group, Notebook, PageSection, Sentence, legacy_created_by_ids
+from logger import logger
+
+# Hash with the page section ids of each notebook as a JSON array, replaced by sorted sets
+LEGACY_MEMBERSHIP_HASH = 'notebook_has_page_section_id'
+
+# Commands sent in each pipeline by the copy to the cluster layout
+BATCH_SIZE = 1000
+
+# HSET of ARGV[1] to ARGV[3] only while it still holds ARGV[2]
+REPLACE_IF_EQUAL_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+end
+return 0
+"""
+
+# SET of ARGV[1] only when it is greater than the value held, so a sequence is never rewound
+SET_IF_GREATER_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+if current == nil or current < tonumber(ARGV[1]) then
+    return redis.call('SET', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+def migrate_page_section_membership(r: redis.Redis=None) -> int:
+    """Moves the JSON arrays of the legacy membership hash into one sorted set per notebook
+    and renames the hash, so running it again does nothing. Returns the number of ids moved
+    """
+    r = r if r is not None else get_redis()
+    legacy_keys = KeyLayout()
+    page_section_dao = PageSectionDAO(legacy_keys)
+
+    legacy = r.hgetall(LEGACY_MEMBERSHIP_HASH)
+    if not legacy:
+        return 0
+
+    migrated = 0
+    pipe = r.pipeline(transaction=False)
+    for hash_key, has_list in legacy.items():
+        notebook_id = int(hash_key.rsplit('_', 1)[-1])
+        page_section_id_list = json.loads(has_list)
+        if not page_section_id_list:
+            continue
+
+        # The score of each page section comes from its distillation_at
+        data_list = page_section_dao.get_data_many(page_section_id_list)
+        scores = {
+            id_: date_to_score(data['distillation_at'])
+            for id_, data in zip(page_section_id_list, data_list) if data is not None
+        }
+        if len(scores) < len(page_section_id_list):
+            logger.warning(f'{len(page_section_id_list) - len(scores)} page sections of {hash_key} '
+                           f'no longer exist and were not migrated')
+        if scores:
+            pipe.zadd(legacy_keys.page_section_membership(notebook_id), scores)
+            migrated += len(scores)
+    pipe.execute()
+
+    r.rename(LEGACY_MEMBERSHIP_HASH, f'{LEGACY_MEMBERSHIP_HASH}:migrated')
+    logger.info(f'Migrated {migrated} page section ids of {len(legacy)} notebooks to sorted sets')
+
+    return migrated
+
+
+def build_page_section_indexes(r: redis.Redis=None) -> int:
+    """Adds every stored page section to the secondary index sets of PageSectionDAO,
+    it can be run again safely. Returns the number of page sections indexed
+    """
+    r = r if r is not None else get_redis()
+    legacy_keys = KeyLayout()
+    page_section_dao = PageSectionDAO(legacy_keys)
+
+    page_section_id_list = list(r.smembers(legacy_keys.page_section_ids()) | set(r.hkeys(PageSection.__name__)))
+
+    indexed = 0
+    pipe = r.pipeline(transaction=False)
+    for page_section_id, data in zip(page_section_id_list, page_section_dao.get_data_many(page_section_id_list)):
+        if data is None:
+            continue
+        for index_key in legacy_keys.page_section_indexes(data):
+            pipe.sadd(index_key, page_section_id)
+        indexed += 1
+    pipe.execute()
+
+    logger.info(f'Indexed {indexed} page sections')
+
+    return indexed
+
+
+def split_page_section_payloads(r: redis.Redis=None) -> int:
+    """Moves each page section of the legacy PageSection hash to its own hash. The DAO reads
+    both layouts and moves a page section when it is updated, so it can be run at any time.
+    Returns the number of page sections moved
+    """
+    r = r if r is not None else get_redis(decode_responses=False)
+    legacy_keys = KeyLayout()
+    codec = get_codec(PageSection.__name__)
+
+    moved = 0
+    for page_section_id, resp in r.hscan_iter(PageSection.__name__):
+        page_section_id = page_section_id.decode() if isinstance(page_section_id, bytes) else page_section_id
+
+        pipe = r.pipeline(transaction=True)
+        pipe.hset(legacy_keys.page_section(page_section_id), mapping=page_section_to_fields(codec.decode(resp)))
+        pipe.sadd(legacy_keys.page_section_ids(), page_section_id)
+        pipe.hdel(PageSection.__name__, page_section_id)
+        pipe.execute()
+        moved += 1
+
+    logger.info(f'Moved {moved} page sections to their own hash')
+
+    return moved
+
+
+def migrate_created_by_ids(r: redis.Redis=None) -> int:
+    """Rewrites the created_by_id of the page sections that still hold the page_number of the
+    page section they were created by with its section_number, and moves them between the
+    created_by_id index sets. Run it once the page sections are in their own hash, it can be
+    run again safely. Returns the number of page sections rewritten
+    """
+    r = r if r is not None else get_redis()
+    legacy_keys = KeyLayout()
+    page_section_dao = PageSectionDAO(legacy_keys)
+
+    page_section_id_list = list(r.smembers(legacy_keys.page_section_ids()))
+
+    pages_by_notebook = dict()
+    for page_section_id, data in zip(page_section_id_list, page_section_dao.get_data_many(page_section_id_list)):
+        if data is None:
+            continue
+        pages_by_notebook.setdefault(data['notebook_id'], []).append(dict(data, id=page_section_id))
+
+    migrated = 0
+    pipe = r.pipeline(transaction=False)
+    for notebook_id, pages in pages_by_notebook.items():
+        created_by_ids = legacy_created_by_ids(pages)
+        for page in pages:
+            created_by_id = created_by_ids.get(int(page['section_number']))
+            if created_by_id is None:
+                continue
+            pipe.hset(legacy_keys.page_section(page['id']), 'created_by_id', json.dumps(created_by_id))
+            pipe.srem(legacy_keys.page_section_index(notebook_id, 'created_by_id', page['created_by_id']), page['id'])
+            pipe.sadd(legacy_keys.page_section_index(notebook_id, 'created_by_id', created_by_id), page['id'])
+            migrated += 1
+    pipe.execute()
+
+    logger.info(f'Rewrote the created_by_id of {migrated} page sections')
+
+    return migrated
+
+
+def normalize_sentence_texts(r: redis.Redis=None) -> int:
+    """Renames the fields of the Sentence hash to their normalized text (see
+    ``app.core.hash_index.normalize_text``), the key the DAO looks the sentences up by. A text
+    whose normalized form is already taken keeps its field and is reported. It can be run
+    again safely. Returns the number of sentences renamed
+    """
+    r = r if r is not None else get_redis(decode_responses=False)
+    hash_main = Sentence.__name__
+    codec = get_codec(hash_main)
+
+    renamed = 0
+    for field, payload in r.hscan_iter(hash_main):
+        text = field.decode()
+        normalized = normalize_text(text)
+        if normalized == text:
+            continue
+
+        if not r.hsetnx(hash_main, normalized, payload):
+            logger.warning(f'The Sentence "{text}" was kept, "{normalized}" is another sentence')
+            continue
+        pipe = r.pipeline(transaction=True)
+        pipe.hset(f'{hash_main}_id', codec.decode(payload)['id'], normalized)
+        pipe.hdel(hash_main, field)
+        pipe.execute()
+        renamed += 1
+
+    logger.info(f'Renamed {renamed} sentences to their normalized text')
+
+    return renamed
+
+
+def encode_payloads(r: redis.Redis=None) -> int:
+    """Rewrites the JSON payloads of the entity hashes with the codec of their key. The DAOs
+    read both formats, so the app can run meanwhile and it can be run again safely.
+    Returns the number of payloads rewritten
+    """
+    r = r if r is not None else get_redis(decode_responses=False)
+
+    encoded = 0
+    for hash_main in (Notebook.__name__, Sentence.__name__, PageSection.__name__):
+        codec = get_codec(hash_main)
+        if not codec.binary:
+            continue
+
+        pipe = r.pipeline(transaction=False)
+        for hash_key, resp in r.hscan_iter(hash_main):
+            if resp[:1] == bytes([MAGIC]):
+                continue
+            # Only the payloads that were not changed since they were read are replaced
+            pipe.eval(REPLACE_IF_EQUAL_SCRIPT, 1, hash_main, hash_key, resp, codec.encode(json.loads(resp)))
+            encoded += 1
+        pipe.execute()
+
+    logger.info(f'Rewrote {encoded} payloads with the binary codec')
+
+    return encoded
+
+
+def build_sentence_progress() -> int:
+    """Builds the progress of the sentences of every notebook from its page sections, it can be
+    run again safely. Returns the number of sentences with progress
+    """
+    legacy_keys = KeyLayout()
+    sentence_progress_dao = SentenceProgressDAO(legacy_keys)
+
+    built = 0
+    for notebook in NotebookDAO(legacy_keys).get_all(Notebook()):
+        built += len(sentence_progress_dao.rebuild(notebook.id))
+
+    logger.info(f'Built the progress of {built} sentences')
+
+    return built
+
+
+def migrate_to_cluster_layout(target: redis.Redis=None) -> dict:
+    """Copies the keyspace of the legacy layout, read with the shared client, to the cluster
+    layout on target, e.g. a RedisCluster client, or on the same server. The legacy keys are
+    kept, the app is switched with KEY_LAYOUT=cluster once the copy is done. It can be run
+    again, a sequence is only moved forward so it is not rewound by a later run. Returns the
+    number of entities copied of each type
+    """
+    r = get_redis()
+    raw = get_redis(decode_responses=False)
+    target = target if target is not None else raw
+    legacy_keys = KeyLayout()
+    cluster_keys = ClusterKeyLayout()
+
+    copied = {Notebook.__name__: 0, Sentence.__name__: 0, PageSection.__name__: 0}
+    pipe = target.pipeline(transaction=False)
+
+    def flush():
+        # Large keyspaces are sent in batches, the cluster pipeline splits each batch by node
+        if len(pipe) >= BATCH_SIZE:
+            pipe.execute()
+
+    codec = get_codec(Notebook.__name__)
+    notebook_ids = []
+    for name, payload in raw.hscan_iter(Notebook.__name__):
+        notebook_id = codec.decode(payload)['id']
+        notebook_ids.append(notebook_id)
+        pipe.hset(cluster_keys.notebook_names, name, notebook_id)
+        pipe.set(cluster_keys.notebook(notebook_id), payload)
+        progress = raw.hgetall(legacy_keys.sentence_progress(notebook_id))
+        if progress:
+            pipe.hset(cluster_keys.sentence_progress(notebook_id), mapping=progress)
+        copied[Notebook.__name__] += 1
+        flush()
+
+    codec = get_codec(Sentence.__name__)
+    for text, payload in raw.hscan_iter(Sentence.__name__):
+        sentence_id = codec.decode(payload)['id']
+        pipe.hset(cluster_keys.sentence_by_text(text.decode()), text, sentence_id)
+        pipe.hset(cluster_keys.sentence(sentence_id), sentence_id, payload)
+        copied[Sentence.__name__] += 1
+        flush()
+
+    page_section_id_list = list(r.smembers(legacy_keys.page_section_ids()) | set(r.hkeys(PageSection.__name__)))
+    page_section_dao = PageSectionDAO(legacy_keys)
+    for page_section_id, data in zip(page_section_id_list, page_section_dao.get_data_many(page_section_id_list)):
+        if data is None:
+            continue
+        notebook_id = data['notebook_id']
+        pipe.hset(cluster_keys.page_section(page_section_id, notebook_id), mapping=page_section_to_fields(data))
+        pipe.sadd(cluster_keys.page_section_ids(notebook_id), page_section_id)
+        pipe.hset(cluster_keys.page_section_locator(page_section_id), page_section_id, notebook_id)
+        pipe.zadd(cluster_keys.page_section_membership(notebook_id),
+                  {page_section_id: date_to_score(data['distillation_at'])})
+        for index_key in cluster_keys.page_section_indexes(data):
+            pipe.sadd(index_key, page_section_id)
+        copied[PageSection.__name__] += 1
+        flush()
+
+    sequences = [
+        (legacy_keys.notebook_id_sequence, cluster_keys.notebook_id_sequence),
+        (legacy_keys.sentence_id_sequence, cluster_keys.sentence_id_sequence),
+    ]
+    for notebook_id in notebook_ids:
+        sequences.append((legacy_keys.section_number_sequence(notebook_id),
+                          cluster_keys.section_number_sequence(notebook_id)))
+        for group in dict.fromkeys(g.value for g in Group):
+            sequences.append((legacy_keys.page_number_sequence(notebook_id, group),
+                              cluster_keys.page_number_sequence(notebook_id, group)))
+    pipe.execute()
+
+    set_if_greater = target.register_script(SET_IF_GREATER_SCRIPT)
+    for (key_legacy, key_cluster), value in zip(sequences, r.mget([key for key, _ in sequences])):
+        if value is not None:
+            set_if_greater(keys=[key_cluster], args=[value])
+
+    logger.info(f'Copied {copied} to the cluster layout')
+
+    return copied
+
+
+def main():
+    if sys.argv[1:] == ['cluster']:
+        migrate_to_cluster_layout()
+        return
+
+    migrate_page_section_membership()
+    normalize_sentence_texts()
+    split_page_section_payloads()
+    migrate_created_by_ids()
+    build_page_section_indexes()
+    encode_payloads()
+    build_sentence_progress()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Persistent sequence counters for the Parquet backend.
+
+Works like the ``*_sequence`` keys of the Redis backend: every counter keeps
+the last value handed out, so the next id, section number or page number is
+allocated in O(1) instead of scanning a table for its maximum. A counter that
+does not exist yet is seeded once from the table through the ``seed`` callable.
+
+The counters are kept in a small JSON file that is replaced atomically, and
+allocations from different processes are serialized with a lock file.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, the store is then only safe within one process
+    fcntl = None
+
+
+class SequenceStore():
+    def __init__(self, path: Path):
+        self.path      = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self._lock     = threading.Lock()
+
+    def next_value(self, name: str, count: int=1, seed: Callable[[], int]=None) -> int:
+        """Reserves a block of count values of the sequence and returns the first one
+        """
+        if count < 1:
+            raise Exception(f'It is not possible to reserve {count} values of the sequence "{name}"!')
+
+        with self._locked():
+            sequences = self._load()
+
+            last_value = sequences.get(name)
+            if last_value is None:
+                last_value = self._seed_value(seed)
+
+            sequences[name] = last_value + count
+            self._save(sequences)
+
+        return last_value + 1
+
+    def current_value(self, name: str) -> int:
+        with self._locked():
+            return self._load().get(name)
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return dict()
+        with open(self.path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def _save(self, sequences: dict) -> None:
+        # Written to a temporary file and renamed, so a crash never leaves a partial file
+        tmp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(sequences, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _seed_value(seed: Callable[[], int]) -> int:
+        value = seed() if seed is not None else None
+        try:
+            return int(value) if value is not None else 0
+        except (TypeError, ValueError):   # max() of an empty column is NaN/NA
+            return 0
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
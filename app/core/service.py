@@ -1,6 +1,8 @@
 import datetime
 
 from app.core.dao_parquet import PageSectionDAO, SentenceDAO
+from app.core.hash_index import normalize_text
+from app.core.session import Session
 from app.model import Group, PageSection, Sentence
 
 
@@ -9,48 +11,55 @@ def build_page_section_with_sentence_list(*,
                                           selected_day, 
                                           notebook, 
                                           group: Group, 
-                                          persit=False) -> PageSection:
-    sentence_dao = SentenceDAO()
-    page_section_dao = PageSectionDAO()
+                                          persit=False,
+                                          session: Session=None) -> PageSection:
+    sentence_dao = SentenceDAO(session)
+    page_section_dao = PageSectionDAO(session)
 
-    memorized_list  = []
-    translated_list = []
-    sentence_list   = []
+    created_at = datetime.datetime.strptime(str(selected_day), '%Y-%m-%d').date()
 
-    for index, row in dataframe.iterrows():
-        memorized_list.append(
-            row['remembered']
-        )
+    memorized_list        = dataframe['remembered'].tolist()
+    translated_list       = dataframe['translated_sentence'].tolist()
+    foreign_language_list = dataframe['foreign_language'].tolist()
+    # The translation editors of the distillation page do not carry the mother_tongue column
+    mother_tongue_list    = dataframe['mother_tongue'].tolist() if 'mother_tongue' in dataframe.columns \
+                                else [None] * len(foreign_language_list)
+
+    # Resolves every foreign_language of the list with a single lookup
+    sentence_dict = sentence_dao.find_by_foreign_languages(foreign_language_list)
 
-        translated_list.append(
-            row['translated_sentence']
+    # The texts that only differ in their normalization are the same new sentence, as in the index
+    new_sentence_dict = dict()
+    new_sentence_list = []
+    for foreign_language, mother_tongue in zip(foreign_language_list, mother_tongue_list):
+        if isinstance(sentence_dict.get(foreign_language), Sentence):
+            continue
+        if normalize_text(foreign_language) in new_sentence_dict:
+            sentence_dict[foreign_language] = new_sentence_dict[normalize_text(foreign_language)]
+            continue
+
+        sentence = Sentence(
+            created_at=created_at,
+            foreign_language=foreign_language,
+            mother_tongue=mother_tongue,
+            foreign_idiom=notebook.foreign_idiom,
+            mother_idiom=notebook.mother_idiom
         )
+        sentence_dict[foreign_language] = sentence
+        new_sentence_dict[normalize_text(foreign_language)] = sentence
+        new_sentence_list.append(sentence)
+
+    # Inserts every missing sentence with a single write
+    sentence_dao.insert_many(new_sentence_list)
 
-        sentence_filter = Sentence(foreign_language=row['foreign_language'])
-        sentence_found_list = sentence_dao.find_by_field(sentence_filter)
-        
-        if sentence_found_list and isinstance(sentence_found_list[-1], Sentence):
-            sentence_list.append(sentence_found_list[-1])
-        else:
-            sentence = sentence_dao.insert(
-                Sentence(
-                    created_at=datetime.datetime.strptime(str(selected_day), '%Y-%m-%d').date(),
-                    foreign_language=row['foreign_language'], 
-                    mother_tongue=row['mother_tongue'], 
-                    foreign_idiom=notebook.foreign_idiom, 
-                    mother_idiom=notebook.mother_idiom                
-                )
-            )
-            sentence_list.append(
-                sentence
-            )
+    sentence_list = [sentence_dict[foreign_language] for foreign_language in foreign_language_list]
 
     page_section = PageSection(
         group=group,
-        created_at=datetime.datetime.strptime(str(selected_day), '%Y-%m-%d').date(),
+        created_at=created_at,
         distillation_at=(datetime.datetime.strptime(str(selected_day), '%Y-%m-%d') + datetime.timedelta(days=notebook.days_period)).date(),
         notebook=notebook,
-        sentences=sentence_list, 
+        sentences=sentence_list,
         memorializeds=memorized_list,
         translated_sentences=translated_list
     )
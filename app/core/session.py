@@ -0,0 +1,108 @@
+"""Identity map and unit of work shared by the Parquet DAOs.
+
+DAOs created with the same session build each notebook, page section and
+sentence only once: they look up the identity map before reading a table and
+register every entity they build. Inserts and updates made through them get
+their ids at once but are only written on ``Session.commit``, which makes a
+single write per table.
+
+    session = Session()
+    page_section_dao = PageSectionDAO(session)
+    ...
+    session.commit()
+"""
+
+from typing import Dict, List
+
+from app.model import Notebook, PageSection, Sentence
+
+# Tables are written in this order, so the rows a page section refers to are written first
+FLUSH_ORDER = [Notebook, Sentence, PageSection]
+
+
+class Session():
+    def __init__(self):
+        self._identity_map = dict()     # (entity class, id) -> entity
+        self._daos = dict()             # entity class -> DAO that writes its table
+        self._new = dict()              # entity class -> {id: entity} inserted in this session
+        self._dirty = dict()            # entity class -> {id: entity} updated in this session
+
+    def get(self, entity_class: type, id_) -> object:
+        return self._identity_map.get((entity_class, id_))
+
+    def get_many(self, entity_class: type, ids: List) -> Dict[object, object]:
+        """Returns the entities of the ids already in the identity map
+        """
+        entity_dict = dict()
+        for id_ in ids:
+            entity = self._identity_map.get((entity_class, id_))
+            if entity is not None:
+                entity_dict[id_] = entity
+        return entity_dict
+
+    def register(self, entity_class: type, id_, entity: object) -> object:
+        """Adds a loaded entity to the identity map and returns the instance kept for its id
+        """
+        return self._identity_map.setdefault((entity_class, id_), entity)
+
+    def add_new(self, dao, entity_class: type, id_, entity: object) -> None:
+        self._daos[entity_class] = dao
+        self._identity_map[(entity_class, id_)] = entity
+        self._new.setdefault(entity_class, dict())[id_] = entity
+
+    def add_dirty(self, dao, entity_class: type, id_, entity: object) -> None:
+        self._daos[entity_class] = dao
+        self._identity_map[(entity_class, id_)] = entity
+
+        # An entity inserted in this session is still written only once
+        new = self._new.get(entity_class, dict())
+        if id_ in new:
+            new[id_] = entity
+        else:
+            self._dirty.setdefault(entity_class, dict())[id_] = entity
+
+    def get_pending(self, entity_class: type, id_) -> object:
+        """Returns the entity of the id inserted or updated in this session and not yet written
+        """
+        for pending in (self._new, self._dirty):
+            entity = pending.get(entity_class, dict()).get(id_)
+            if entity is not None:
+                return entity
+        return None
+
+    def pending_new(self, entity_class: type) -> List[object]:
+        return list(self._new.get(entity_class, dict()).values())
+
+    def commit(self) -> None:
+        for entity_class in FLUSH_ORDER:
+            new = list(self._new.get(entity_class, dict()).values())
+            dirty = list(self._dirty.get(entity_class, dict()).values())
+            if not (new or dirty):
+                continue
+
+            self._daos[entity_class].flush(new, dirty)
+
+            self._new.pop(entity_class, None)
+            self._dirty.pop(entity_class, None)
+
+    def rollback(self) -> None:
+        # The entities that were never written are removed from the identity map as well
+        for pending in (self._new, self._dirty):
+            for entity_class, entity_dict in pending.items():
+                for id_ in entity_dict:
+                    self._identity_map.pop((entity_class, id_), None)
+        self._new.clear()
+        self._dirty.clear()
+
+    def clear(self) -> None:
+        self.rollback()
+        self._identity_map.clear()
+
+    def __enter__(self) -> 'Session':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
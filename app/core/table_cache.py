@@ -0,0 +1,118 @@
+"""Process-wide in-memory cache of the Parquet datasets used by the DAOs.
+
+Each dataset is loaded once and served from memory until its fragments change
+on disk (a fragment is added, removed, or its mtime or size changes) or a write
+is made through ``TableCache.append`` or
+``TableCache.replace_partition``.
+
+Filtered reads use ``TableCache.query``. A filter on the partition column
+(e.g. ``notebook_id``) is pushed down to its partitions, and its result is
+kept until the fragments of those partitions change. Other filters are
+answered from the full table when it is already in memory, otherwise they are
+pushed down to the dataset. The results are kept in a small per dataset cache.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+import pandas as pd
+
+from app.core.dataset import ParquetDataset
+
+# Number of query results kept for each dataset
+QUERY_CACHE_SIZE = 256
+
+
+class TableCache():
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path_locks = dict()
+        self._tables = dict()
+        self._queries = dict()
+
+    def read(self, dataset: ParquetDataset) -> pd.DataFrame:
+        # The returned dataframe is shared by every caller, so it must be treated as read-only
+        with self._get_path_lock(dataset.path):
+            signature = dataset.signature()
+
+            cached = self._tables.get(dataset.path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            df = dataset.read()
+            self._tables[dataset.path] = (signature, df)
+
+            return df
+
+    def query(self, dataset: ParquetDataset, filters: List[Tuple[str, str, object]],
+              columns: List[str]=None) -> pd.DataFrame:
+        # As in read, the returned dataframe must be treated as read-only
+        with self._get_path_lock(dataset.path):
+            # Only the fragments of the partitions the filters can match are checked
+            partitions = dataset.partitions(filters)
+            signature = dataset.signature(partitions)
+
+            cached = self._tables.get(dataset.path)
+            if partitions is None and cached is not None and cached[0] == signature:
+                return dataset.filter_frame(cached[1], filters, columns)
+
+            queries = self._queries.setdefault(dataset.path, OrderedDict())
+            query_key = repr((filters, columns))
+
+            cached = queries.get(query_key)
+            if cached is not None and cached[0] == signature:
+                queries.move_to_end(query_key)
+                return cached[1]
+
+            df = dataset.query(filters, columns)
+
+            queries[query_key] = (signature, df)
+            if len(queries) > QUERY_CACHE_SIZE:
+                queries.popitem(last=False)
+
+            return df
+
+    def append(self, dataset: ParquetDataset, df: pd.DataFrame) -> None:
+        with self._get_path_lock(dataset.path):
+            signature = dataset.signature()
+
+            written = dataset.append(df)
+            self._queries.pop(dataset.path, None)
+
+            cached = self._tables.get(dataset.path)
+            expected = signature | frozenset(
+                (str(f), s.st_mtime_ns, s.st_size) for f, s in ((f, f.stat()) for f in written)
+            )
+
+            # Merges the new rows into the cached frame only when nobody else touched the dataset
+            if cached is not None and cached[0] == signature and dataset.signature() == expected:
+                df_new = dataset.to_frame(dataset.read_fragments(written))
+                df_merged = dataset.latest_versions(pd.concat([cached[1], df_new], ignore_index=True))
+                self._tables[dataset.path] = (expected, df_merged)
+            else:
+                self._tables.pop(dataset.path, None)
+
+    def replace_partition(self, dataset: ParquetDataset, value, df: pd.DataFrame) -> None:
+        with self._get_path_lock(dataset.path):
+            dataset.replace_partition(value, df)
+            self._tables.pop(dataset.path, None)
+            self._queries.pop(dataset.path, None)
+
+    def invalidate(self, dataset: ParquetDataset=None) -> None:
+        with self._lock:
+            if dataset is None:
+                self._tables.clear()
+                self._queries.clear()
+            else:
+                self._tables.pop(dataset.path, None)
+                self._queries.pop(dataset.path, None)
+
+    def _get_path_lock(self, path) -> threading.RLock:
+        with self._lock:
+            if path not in self._path_locks:
+                self._path_locks[path] = threading.RLock()
+            return self._path_locks[path]
+
+
+table_cache = TableCache()
@@ -1,9 +1,84 @@
 import datetime
 from enum import Enum
-from typing import List
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+class PageSectionList(list):
+    """List of the page sections of a notebook, indexed by (distillation_at, group) and counted
+    by group. append and extend update the index, the other changes of the list rebuild it. A page
+    section must be appended again (or the list rebuilt) after its created_at, distillation_at or
+    group change
+    """
+    def __init__(self, page_sections=()):
+        super().__init__(page_sections)
+        self._reindex()
+
+    def _reindex(self):
+        self._index = dict()        # (distillation_at, group) -> first page section with created_at
+        self._counts = dict()       # group value -> page sections with created_at
+        for page_section in self:
+            self._add_to_index(page_section)
+
+    def _add_to_index(self, page_section: 'PageSection'):
+        if page_section.created_at is None:
+            return
+        self._index.setdefault((page_section.distillation_at, page_section.group), page_section)
+        if page_section.created_at:
+            self._counts[page_section.group.value] = self._counts.get(page_section.group.value, 0) + 1
+
+    def __reduce__(self):
+        # Pickled and copied as a list, the index is rebuilt
+        return (PageSectionList, (list(self),))
+
+    def get(self, distillation_at, group: 'Group') -> 'PageSection':
+        return self._index.get((distillation_at, group))
+
+    def count(self, group: 'Group') -> int:
+        return self._counts.get(group.value, 0)
+
+    def append(self, page_section: 'PageSection'):
+        super().append(page_section)
+        self._add_to_index(page_section)
+
+    def extend(self, page_sections):
+        page_sections = list(page_sections)
+        super().extend(page_sections)
+        for page_section in page_sections:
+            self._add_to_index(page_section)
+
+    def __iadd__(self, page_sections):
+        self.extend(page_sections)
+        return self
+
+    def _rebuilding(name):
+        method = getattr(list, name)
+        def rebuilding(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._reindex()
+            return result
+        rebuilding.__name__ = name
+        return rebuilding
+
+    insert      = _rebuilding('insert')
+    remove      = _rebuilding('remove')
+    pop         = _rebuilding('pop')
+    clear       = _rebuilding('clear')
+    sort        = _rebuilding('sort')
+    reverse     = _rebuilding('reverse')
+    __setitem__ = _rebuilding('__setitem__')
+    __delitem__ = _rebuilding('__delitem__')
+    __imul__    = _rebuilding('__imul__')
+    del _rebuilding
 
 
 class Notebook():
+    __slots__ = ('name', 'id', 'created_at', 'updated_at', 'list_size', 'days_period', 'foreign_idiom',
+                 'mother_idiom', '_page_section_list', '_page_section_loader')
+
     def __init__(self, 
                  name              : str=None, *,
                  id_               : int=None,
@@ -11,18 +86,47 @@ class Notebook():
                  updated_at        : datetime.date=None,
                  list_size         : int=None,
                  days_period         : int=None,
-                 page_section_list : List['PageSection']=list(),
+                 page_section_list : List['PageSection']=None,
                  foreign_idiom     : str=None,
-                 mother_idiom      : str=None):
+                 mother_idiom      : str=None,
+                 page_section_loader : Callable[['Notebook'], List['PageSection']]=None):
         self.name              = name
         self.id                = id_
         self.created_at        = created_at
         self.updated_at        = updated_at
         self.list_size         = list_size
         self.days_period       = days_period
-        self.page_section_list = page_section_list
         self.foreign_idiom     = foreign_idiom
         self.mother_idiom      = mother_idiom
+        # Without a list, page_section_list is loaded on first access through the loader
+        self._page_section_list   = PageSectionList(page_section_list) if page_section_list is not None else None
+        self._page_section_loader = page_section_loader
+
+    @property
+    def page_section_list(self) -> List['PageSection']:
+        if self._page_section_list is None:
+            loader = self._page_section_loader
+            self._page_section_list = PageSectionList(loader(self) if loader is not None else ())
+            self._page_section_loader = None
+        return self._page_section_list
+
+    @page_section_list.setter
+    def page_section_list(self, page_section_list: List['PageSection']):
+        self._page_section_list = PageSectionList(page_section_list)
+        self._page_section_loader = None
+
+    @property
+    def page_section_list_loaded(self) -> bool:
+        return self._page_section_list is not None
+
+    def set_page_section_loader(self, page_section_loader: Callable[['Notebook'], List['PageSection']]):
+        self._page_section_list   = None
+        self._page_section_loader = page_section_loader
+
+    def add_page_section(self, page_section: 'PageSection'):
+        # A list not loaded yet is read with the stored page section, so it is not loaded here
+        if self._page_section_list is not None or self._page_section_loader is None:
+            self.page_section_list.append(page_section)
 
     def data_to_dataframe(self):
         return [
@@ -63,19 +167,17 @@ class Notebook():
         )
     
     def get_page_section(self, *, distillation_at, group) -> 'PageSection':
-        for page_section in self.page_section_list:
-            if distillation_at == page_section.distillation_at \
-                    and group == page_section.group \
-                        and page_section.created_at is not None:
-                return page_section
+        return self.page_section_list.get(distillation_at, group)
     
     def count_page_section_by_group(self, *, group):
-       return len([p for p in self.page_section_list if p.created_at and p.group.value == group.value])
+       return self.page_section_list.count(group)
 
     
   
 
 class Sentence():
+    __slots__ = ('id', 'created_at', 'foreign_language', 'mother_tongue', 'foreign_idiom', 'mother_idiom')
+
     def __init__(self,
                  id_              : int=None,
                  created_at       : datetime.date=None,
@@ -133,21 +235,36 @@ class Group(Enum):
     NEW_PAGE = 'NP'
 
 
+# Per sentence columns of a page section, see PageSection.to_arrow
+PAGE_SECTION_COLUMNS = pa.schema([
+    ('sentence_id', pa.int64()),
+    ('translated_sentence', pa.string()),
+    ('memorized', pa.bool_()),
+])
+
+
 class PageSection():
+    __slots__ = ('id', 'section_number', 'page_number', 'group', 'created_at', 'distillation_at', '_distillated',
+                 '_sentences', '_translated_sentences', '_memorializeds', 'notebook', '_distillation_actual', '_created_by',
+                 '_created_by_id', '_created_by_loader', '_columns')
+
     def __init__(self, *,
                  id_                  : int=None,
                  section_number       : int=None,
                  page_number          : int=None,
                  group                : Group=None,
                  created_at           : datetime.date=None,
-                 created_by           : int=None,
+                 created_by           : 'PageSection'=None,
+                 created_by_id        : int=None,
+                 created_by_loader    : Callable[['PageSection'], 'PageSection']=None,
                  distillation_at      : datetime.date=None,
                  distillation_actual  : datetime.date=None,
                  distillated          : bool=False,
-                 sentences            : List[Sentence]=[],
-                 translated_sentences : List[str]=[],
-                 memorializeds        : List[bool]=[],
-                 notebook             : Notebook=None):
+                 sentences            : List[Sentence]=None,
+                 translated_sentences : List[str]=None,
+                 memorializeds        : List[bool]=None,
+                 notebook             : Notebook=None,
+                 columns              : pa.RecordBatch=None):
         self.id                           = id_
         self.section_number               = section_number
         self.page_number                  = page_number
@@ -155,12 +272,19 @@ class PageSection():
         self.created_at                   = created_at
         self.distillation_at              = distillation_at
         self._distillated                 = distillated
-        self.sentences                    = sentences
-        self.translated_sentences         = translated_sentences
-        self.memorializeds                = memorializeds
+        # Every page section gets its own lists, a shared default would leak appends between them
+        self._sentences                   = sentences if sentences is not None else list()
+        # With columns (see PAGE_SECTION_COLUMNS) the per sentence lists are built on first access
+        self._columns                     = columns
+        self._translated_sentences        = translated_sentences if translated_sentences is not None else list()
+        self._memorializeds               = memorializeds if memorializeds is not None else list()
         self.notebook                     = notebook
         self._distillation_actual: datetime.date = distillation_actual
-        self.set_created_by(created_by)        # section_number from  PageSection
+        # Without the page section, created_by is loaded on first access through the loader
+        if created_by is not None:
+            self.set_created_by(created_by)
+        else:
+            self.set_created_by_loader(created_by_id, created_by_loader)
     
     def clone(self):
         return self.__class__(
@@ -169,7 +293,9 @@ class PageSection():
             page_number=self.page_number,
             group=self.group,
             created_at=None,
-            created_by=self.created_by,
+            created_by=self._created_by,
+            created_by_id=self._created_by_id,
+            created_by_loader=self._created_by_loader,
             distillation_at=None,
             distillation_actual=self.distillation_actual,
             distillated=True,
@@ -179,6 +305,84 @@ class PageSection():
             notebook=self.notebook
         )
     
+    @property
+    def sentences(self) -> List[Sentence]:
+        return self._sentences
+
+    @sentences.setter
+    def sentences(self, sentences: List[Sentence]):
+        # The sentence_id column of the columns would be stale
+        self._materialize_columns()
+        self._sentences = sentences
+
+    @property
+    def translated_sentences(self) -> List[str]:
+        self._materialize_columns()
+        return self._translated_sentences
+
+    @translated_sentences.setter
+    def translated_sentences(self, translated_sentences: List[str]):
+        self._materialize_columns()
+        self._translated_sentences = translated_sentences
+
+    @property
+    def memorializeds(self) -> List[bool]:
+        self._materialize_columns()
+        return self._memorializeds
+
+    @memorializeds.setter
+    def memorializeds(self, memorializeds: List[bool]):
+        self._materialize_columns()
+        self._memorializeds = memorializeds
+
+    def _materialize_columns(self):
+        # The lists can be changed in place, so the columns are dropped once they are built
+        if self._columns is not None:
+            self._translated_sentences = self._columns.column('translated_sentence').to_pylist()
+            self._memorializeds        = self._columns.column('memorized').to_pylist()
+            self._columns              = None
+
+    def to_arrow(self) -> pa.RecordBatch:
+        """The per sentence columns, without a copy when the page section was built from columns
+        and its lists were neither accessed nor reassigned. memorized is a boolean array, stored as a bitmap
+        """
+        if self._columns is not None:
+            return self._columns
+        return pa.RecordBatch.from_arrays([
+            pa.array([s.id if s is not None else None for s in self._sentences], type=pa.int64()),
+            pa.array(self._translated_sentences, type=pa.string(), from_pandas=True),
+            pa.array(self._memorializeds, type=pa.bool_(), from_pandas=True),
+        ], schema=PAGE_SECTION_COLUMNS)
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per sentence, the scalar columns are broadcast by pandas
+        """
+        columns = self.to_arrow()
+        size = columns.num_rows
+        return pd.DataFrame({
+            'id'                  : np.arange(self.id, self.id + size) if self.id is not None else None,
+            'section_number'      : self.section_number,
+            'page_number'         : self.page_number,
+            'group'               : self.group.value,
+            'created_at'          : self.created_at,
+            'created_by_id'       : self.created_by_id,
+            'distillation_at'     : self.distillation_at,
+            'distillation_actual' : self._distillation_actual,
+            'distillated'         : self._distillated,
+            'notebook_id'         : self.notebook.id,
+            'sentence_id'         : columns.column('sentence_id').to_numpy(zero_copy_only=False),
+            'translated_sentence' : columns.column('translated_sentence').to_numpy(zero_copy_only=False),
+            'memorized'           : columns.column('memorized').to_numpy(zero_copy_only=False),
+        }, index=pd.RangeIndex(size))
+
+    @property
+    def distillation_actual(self) -> datetime.date:
+        return self._distillation_actual
+
+    @distillation_actual.setter
+    def distillation_actual(self, value: datetime.date):
+        self._distillation_actual = value
+
     @property
     def distillated(self):
         return bool(self._distillated)
@@ -192,11 +396,38 @@ class PageSection():
     def set_id(self, id_):
         self.id = id_
 
+    @property
+    def created_by(self) -> 'PageSection':
+        if self._created_by is None and self._created_by_loader is not None:
+            loader = self._created_by_loader
+            self._created_by_loader = None
+            self._created_by = loader(self)
+        return self._created_by
+
+    @created_by.setter
+    def created_by(self, page_section: 'PageSection'):
+        self.set_created_by(page_section)
+
+    @property
+    def created_by_id(self) -> int:
+        # section_number of the page section this one was created by, known without loading it
+        if self._created_by is not None:
+            return self._created_by.section_number
+        return self._created_by_id
+
     def set_created_by(self, page_section: 'PageSection'=None):
         if isinstance(page_section, PageSection):
-            self.created_by = page_section
+            self._created_by = page_section
+            self._created_by_id = page_section.section_number
         else:
-            self.created_by = None
+            self._created_by = None
+            self._created_by_id = None
+        self._created_by_loader = None
+
+    def set_created_by_loader(self, created_by_id: int, created_by_loader: Callable[['PageSection'], 'PageSection']):
+        self._created_by = None
+        self._created_by_id = created_by_id
+        self._created_by_loader = created_by_loader if created_by_id is not None else None
         
     def __str__(self):
         group = {
@@ -212,9 +443,6 @@ class PageSection():
                 else f'{group.get(self.group.value)} of {self.created_at} will be able to composite a new HeadList.'
         
     def __repr__(self):
-        created_by_id = None
-        if self.created_by is not None:
-            created_by_id = self.created_by.section_number
         notebook_id = None
         if self.notebook is not None:
             notebook_id = self.notebook.id
@@ -223,7 +451,7 @@ class PageSection():
                     f'section_number={self.section_number}, '
                     f'page_number={self.page_number}, '
                     f'created_at={self.created_at}, '
-                    f'created_by_id={created_by_id}, '
+                    f'created_by_id={self.created_by_id}, '
                     f'notebook_id={notebook_id}, '
                     f'group="{self.group}", '
                     f'translated_sentences={self.translated_sentences}, '
@@ -264,46 +492,211 @@ class PageSection():
         }
 
     def data_to_dataframe(self):
-        created_by = None
-        if self.created_by is not None:
-            created_by = self.created_by.page_number
-        return {    
-            'id'                  : [i for i in range(self.id, self.id + len(self.sentences))],
-            'section_number'      : [self.section_number for _ in range(len(self.sentences))],
-            'page_number'         : [self.page_number for _ in range(len(self.sentences))],
-            'group'               : [self.group.value for _ in range(len(self.sentences))],
-            'created_at'          : [self.created_at for _ in range(len(self.sentences))],
-            'created_by_id'       : [created_by for _ in range(len(self.sentences))],
-            'distillation_at'     : [self.distillation_at for _ in range(len(self.sentences))],
-            'distillation_actual' : [self._distillation_actual for _ in range(len(self.sentences))],
-            'distillated'         : [self._distillated for _ in range(len(self.sentences))],
-            'notebook_id'         : [self.notebook.id for _ in range(len(self.sentences))],
-            'sentence_id'         : [v.id for v in self.sentences],
-            'translated_sentence' : [v for v in self.translated_sentences],
-            'memorized'           : [v for v in self.memorializeds],
-        }
+        return self.to_frame()
     
     def data_to_redis(self):
-        created_by = None
-        if self.created_by is not None:
-            created_by = self.created_by.page_number
         return {    
             'id'                  : self.id,
             'section_number'      : self.section_number,
             'page_number'         : self.page_number,
             'group'               : self.group.value,
             'created_at'          : date_to_string(self.created_at),
-            'created_by_id'       : created_by,
+            'created_by_id'       : self.created_by_id,
             'distillation_at'     : date_to_string(self.distillation_at),
             'distillation_actual' : date_to_string(self._distillation_actual),
             'distillated'         : self._distillated,
             'notebook_id'         : self.notebook.id,
-            'sentences_id'        : [s.id for s in self.sentences],
+            'sentences_id'        : [s.id if s is not None else None for s in self.sentences],
             'translated_sentence' : self.translated_sentences,
             'memorized'           : self.memorializeds,
         }
     
 
+class SentenceProgress():
+    """Where a sentence of a notebook is in the distillation: the latest page section it is in,
+    its group, when the sentence was last distilled and when it is due next (None once that page
+    section is distilled). Kept by the page section DAOs, see advance_sentence_progress
+    """
+    __slots__ = ('sentence_id', 'notebook_id', 'section_number', 'group', 'created_at',
+                 'last_distillation_at', 'next_distillation_at', 'memorized')
+
+    def __init__(self, *,
+                 sentence_id          : int=None,
+                 notebook_id          : int=None,
+                 section_number       : int=None,
+                 group                : Group=None,
+                 created_at           : datetime.date=None,
+                 last_distillation_at : datetime.date=None,
+                 next_distillation_at : datetime.date=None,
+                 memorized            : bool=False):
+        self.sentence_id          = sentence_id
+        self.notebook_id          = notebook_id
+        self.section_number       = section_number    # of the latest page section with the sentence
+        self.group:Group          = group
+        self.created_at           = created_at        # of the latest page section with the sentence
+        self.last_distillation_at = last_distillation_at
+        self.next_distillation_at = next_distillation_at
+        self.memorized            = memorized
+
+    def data_to_dataframe(self):
+        return [
+            {
+                'sentence_id'          : self.sentence_id,
+                'notebook_id'          : self.notebook_id,
+                'section_number'       : self.section_number,
+                'group'                : self.group.value,
+                'created_at'           : self.created_at,
+                'last_distillation_at' : self.last_distillation_at,
+                'next_distillation_at' : self.next_distillation_at,
+                'memorized'            : self.memorized,
+            }
+        ]
+
+    def data_to_redis(self):
+        return {
+            'sentence_id'          : self.sentence_id,
+            'notebook_id'          : self.notebook_id,
+            'section_number'       : self.section_number,
+            'group'                : self.group.value,
+            'created_at'           : date_to_string(self.created_at),
+            'last_distillation_at' : date_to_string(self.last_distillation_at),
+            'next_distillation_at' : date_to_string(self.next_distillation_at),
+            'memorized'            : self.memorized,
+        }
+
+    def __repr__(self):
+        return (f'SentenceProgress('
+                    f'sentence_id={self.sentence_id}, '
+                    f'notebook_id={self.notebook_id}, '
+                    f'section_number={self.section_number}, '
+                    f'group="{self.group}", '
+                    f'last_distillation_at={self.last_distillation_at}, '
+                    f'next_distillation_at={self.next_distillation_at}, '
+                    f'memorized={self.memorized}'
+                ')'
+        )
+
+
+def advance_sentence_progress(progress_dict: dict, page_section: PageSection) -> List[SentenceProgress]:
+    """Applies an inserted or updated page section to the progress of its sentences. progress_dict
+    has the stored SentenceProgress of each sentence id, it is updated and the changed ones are returned
+    """
+    if not page_section.created_at or page_section.notebook is None:
+        return []
+
+    # Dates are compared as ISO strings, the Redis DAOs keep them as strings
+    position = (str(page_section.created_at), page_section.section_number)
+    distillation_actual = page_section.distillation_actual if page_section.distillated else None
+
+    changed = []
+    for sentence, memorized in zip(page_section.sentences, page_section.memorializeds):
+        if sentence is None or sentence.id is None:
+            continue
+
+        progress = progress_dict.get(sentence.id)
+        if progress is None or position >= (str(progress.created_at), progress.section_number):
+            progress = SentenceProgress(
+                sentence_id          = sentence.id,
+                notebook_id          = page_section.notebook.id,
+                section_number       = page_section.section_number,
+                group                = page_section.group,
+                created_at           = page_section.created_at,
+                last_distillation_at = distillation_actual or (progress.last_distillation_at if progress else None),
+                next_distillation_at = None if page_section.distillated else page_section.distillation_at,
+                memorized            = bool(memorized),
+            )
+        elif distillation_actual and str(distillation_actual) > str(progress.last_distillation_at or ''):
+            # An older page section distilled after a newer one was added only moves the last distillation
+            progress.last_distillation_at = distillation_actual
+        else:
+            continue
+
+        progress_dict[sentence.id] = progress
+        changed.append(progress)
+
+    return changed
+
+
+# The slots behind the properties of the entities, by the public name they had as plain attributes
+_PUBLIC_SLOTS = {
+    '_sentences'           : 'sentences',
+    '_translated_sentences': 'translated_sentences',
+    '_memorializeds'       : 'memorializeds',
+    '_created_by'          : 'created_by',
+}
+
+
+def attributes(entity) -> dict:
+    # vars() of the entities, which have no __dict__
+    result = {}
+    for name in entity.__slots__:
+        public_name = _PUBLIC_SLOTS.get(name)
+        if public_name is None:
+            result[name] = getattr(entity, name)
+        elif public_name == 'created_by':
+            # Read from the slot, a page section not loaded yet is not loaded by a filter
+            result[public_name] = getattr(entity, name)
+        else:
+            result[public_name] = getattr(entity, public_name)
+    return result
+
+
+def lineage_section_numbers(section_number: int, created_by_ids: dict) -> List[int]:
+    """The section numbers of the chain of page sections created one from another that has
+    section_number, from the first one. created_by_ids has the created_by_id of each section number
+    """
+    children = dict()
+    for child, parent in sorted(created_by_ids.items()):
+        if parent is not None:
+            children.setdefault(parent, child)
+
+    chain = [section_number]
+    while created_by_ids.get(chain[0]) is not None and created_by_ids[chain[0]] not in chain:
+        chain.insert(0, created_by_ids[chain[0]])
+    while children.get(chain[-1]) is not None and children[chain[-1]] not in chain:
+        chain.append(children[chain[-1]])
+
+    return chain
+
+
+# The group of the page section each group is distilled from, A -> B -> C -> D -> NP
+CREATED_BY_GROUP = {
+    Group.B.value       : Group.A.value,
+    Group.C.value       : Group.B.value,
+    Group.D.value       : Group.C.value,
+    Group.NEW_PAGE.value: Group.D.value,
+}
+
+
+def legacy_created_by_ids(pages: List[dict]) -> dict:
+    """created_by_id used to hold the page_number of the page section it was created by, it now
+    holds its section_number. pages are the page sections of one notebook, as dicts with their
+    section_number, page_number, group value and created_by_id. Returns the section_number of the
+    parent of each page section whose link is still a page_number, by its section number.
+    A link that already points to a page section of the parent group is left as it is
+    """
+    by_section_number = {int(page['section_number']): page for page in pages}
+    by_page_number = {(page['group'], int(page['page_number'])): int(page['section_number'])
+                      for page in pages if page.get('page_number') is not None}
+
+    created_by_ids = dict()
+    for page in pages:
+        if page.get('created_by_id') is None:
+            continue
+        created_by_id = int(page['created_by_id'])
+        created_by_group = CREATED_BY_GROUP.get(page['group'])
+
+        parent = by_section_number.get(created_by_id)
+        if parent is not None and parent['group'] == created_by_group:
+            continue
+
+        section_number = by_page_number.get((created_by_group, created_by_id))
+        if section_number is not None:
+            created_by_ids[int(page['section_number'])] = section_number
+
+    return created_by_ids
+
+
 def date_to_string(date: datetime.date) -> str:
     if date is not None:
         return str(date)
@@ -6,7 +6,8 @@ from st_pages import add_page_title
 
 from app.core.dao_parquet import NotebookDAO, PageSectionDAO, SentenceDAO
 from app.core.service import build_page_section_with_sentence_list
-from app.model import Group, Notebook, PageSection
+from app.core.session import Session
+from app.model import Group, Notebook, PageSection, Sentence
 
 st.set_page_config(layout='wide')
 
@@ -15,8 +16,10 @@ placehold_container_msg.empty()
 
 add_page_title()  # Optional method to add title and icon to current page
 
-sentences_dao = SentenceDAO()
-page_section_dao = PageSectionDAO()
+# Every rerun has its own session, so each entity is loaded once and a distillation is written at once
+session = Session()
+sentences_dao = SentenceDAO(session)
+page_section_dao = PageSectionDAO(session)
 notebook_dao = NotebookDAO()
 
 if 'notebook_list' not in st.session_state:
@@ -37,7 +40,9 @@ if len(notebooks_list) > 0:
                                              on_change=on_change_session_state_notebook_list)
 
     notebook: Notebook = notebook_dict.get(selected_notebook)
-    if notebook.count_page_section_by_group(group=Group.A) == 0 \
+    # A list not loaded yet is read on first access, so it cannot be out of date
+    if notebook.page_section_list_loaded \
+            and notebook.count_page_section_by_group(group=Group.A) == 0 \
             and len(notebook.page_section_list) > 1:
         on_change_session_state_notebook_list()
 
@@ -52,14 +57,16 @@ if len(notebooks_list) > 0:
                                          datetime.datetime.now().date(), 
                                          format='DD/MM/YYYY')
 
-    page_section_group_a = notebook.get_page_section(distillation_at=selected_day, 
-                                                     group=Group.HEADLIST)
-    page_section_group_b = notebook.get_page_section(distillation_at=selected_day, 
-                                                     group=Group.B)
-    page_section_group_c = notebook.get_page_section(distillation_at=selected_day, 
-                                                     group=Group.C)
-    page_section_group_d = notebook.get_page_section(distillation_at=selected_day, 
-                                                     group=Group.D)
+    # Only the page sections due on the selected day are read
+    page_section_due_dict = dict()
+    for page_section in page_section_dao.find_due(notebook.id, selected_day, selected_day):
+        if page_section.created_at is not None:
+            page_section_due_dict.setdefault(page_section.group, page_section)
+
+    page_section_group_a = page_section_due_dict.get(Group.HEADLIST)
+    page_section_group_b = page_section_due_dict.get(Group.B)
+    page_section_group_c = page_section_due_dict.get(Group.C)
+    page_section_group_d = page_section_due_dict.get(Group.D)
 
     sentences_a  = None if page_section_group_a is None \
         else page_section_group_a.sentences
@@ -77,13 +84,13 @@ if len(notebooks_list) > 0:
         "mother_tongue"]
     
     dfa = pd.DataFrame(columns=columns) if sentences_a is None \
-        else pd.concat([pd.DataFrame(s.data_to_dataframe()) for s in sentences_a])
+        else pd.concat([pd.DataFrame((s or Sentence()).data_to_dataframe()) for s in sentences_a])
     dfb = pd.DataFrame(columns=columns) if sentences_b is None \
-        else pd.concat([pd.DataFrame(s.data_to_dataframe()) for s in sentences_b])
+        else pd.concat([pd.DataFrame((s or Sentence()).data_to_dataframe()) for s in sentences_b])
     dfc = pd.DataFrame(columns=columns) if sentences_c is None \
-        else pd.concat([pd.DataFrame(s.data_to_dataframe()) for s in sentences_c])
+        else pd.concat([pd.DataFrame((s or Sentence()).data_to_dataframe()) for s in sentences_c])
     dfd = pd.DataFrame(columns=columns) if sentences_d is None \
-        else pd.concat([pd.DataFrame(s.data_to_dataframe()) for s in sentences_d])
+        else pd.concat([pd.DataFrame((s or Sentence()).data_to_dataframe()) for s in sentences_d])
 
 
     if page_section_group_a:
@@ -221,13 +228,16 @@ if len(notebooks_list) > 0:
                                                             selected_day=page_section_group_a.created_at, 
                                                             notebook=notebook, 
                                                             group=page_section_group_a.group,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                 page_section_group_a.translated_sentences  = page_section_update_a.translated_sentences
                 page_section_update_a.section_number = page_section_group_a.section_number
                 try:
                     page_section_dao.update(page_section_update_a)
+                    session.commit()
                     st.toast('The translation of sentences has been updated!')
                 except Exception as error:
+                        session.rollback()
                         placehold_container_msg.error(str(error), icon="🚨")
 
             if distill_a:
@@ -242,7 +252,8 @@ if len(notebooks_list) > 0:
                                                             selected_day=page_section_group_a.created_at, 
                                                             notebook=notebook, 
                                                             group=page_section_group_a.group,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                         page_section_update_a.section_number = page_section_group_a.section_number
                         page_section_update_a.distillated = True
                         page_section_dao.update(page_section_update_a)
@@ -254,14 +265,17 @@ if len(notebooks_list) > 0:
                                                             selected_day=selected_day, 
                                                             notebook=notebook, 
                                                             group=Group.B,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                         page_section_after_a.set_created_by(page_section_group_a)
                         page_section_after_a = page_section_dao.insert(page_section_after_a)
+                        session.commit()
                         
                         st.toast('Distillation was saved!')
                         placehold_data_edit_headlist.success(f'{page_section_after_a} was inserted successfully!')
-                        notebook.page_section_list.append(page_section_after_a)
+                        notebook.add_page_section(page_section_after_a)
                     except Exception as error:
+                        session.rollback()
                         placehold_container_msg.error(str(error), icon="🚨")
                         st.toast('Something went wrong!')
                         if 'There is already a page'.upper() in str(error).upper():
@@ -342,13 +356,16 @@ if len(notebooks_list) > 0:
                                                             selected_day=page_section_group_b.created_at, 
                                                             notebook=notebook, 
                                                             group=page_section_group_b.group,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                 page_section_group_b.translated_sentences  = page_section_update_b.translated_sentences
                 page_section_update_b.section_number = page_section_group_b.section_number
                 try:
                     page_section_dao.update(page_section_update_b)
+                    session.commit()
                     st.toast('The translation of sentences has been updated!')
                 except Exception as error:
+                        session.rollback()
                         placehold_container_msg.error(str(error), icon="🚨")
 
             if distill_b and not dfb.empty:
@@ -363,7 +380,8 @@ if len(notebooks_list) > 0:
                                                             selected_day=page_section_group_b.created_at, 
                                                             notebook=notebook, 
                                                             group=page_section_group_b.group,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                         page_section_update_b.section_number = page_section_group_b.section_number
                         page_section_update_b.distillated = True
                         page_section_dao.update(page_section_update_b)
@@ -375,15 +393,18 @@ if len(notebooks_list) > 0:
                                                             selected_day=selected_day, 
                                                             notebook=notebook, 
                                                             group=Group.C,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                         page_section_after_b.set_created_by(page_section_group_b)
                         page_section_after_b = page_section_dao.insert(page_section_after_b)
+                        session.commit()
                         
                         st.toast('Distillation was saved!')
                         placehold_data_edit_group_b.success(f'{page_section_after_b} was inserted successfully!')
 
-                        notebook.page_section_list.append(page_section_after_b)
+                        notebook.add_page_section(page_section_after_b)
                     except Exception as error:
+                        session.rollback()
                         placehold_container_msg.error(str(error), icon="🚨")
                         if 'There is already a page'.upper() in str(error).upper():
                             st.error(str(error), icon="🚨")
@@ -459,13 +480,16 @@ if len(notebooks_list) > 0:
                                                             selected_day=page_section_group_c.created_at, 
                                                             notebook=notebook, 
                                                             group=page_section_group_c.group,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                 page_section_group_c.translated_sentences  = page_section_update_c.translated_sentences
                 page_section_update_c.section_number = page_section_group_c.section_number
                 try:
                     page_section_dao.update(page_section_update_c)
+                    session.commit()
                     st.toast('The translation of sentences has been updated!')
                 except Exception as error:
+                        session.rollback()
                         placehold_container_msg.error(str(error), icon="🚨")
 
             if distill_c and not dfc.empty:
@@ -480,7 +504,8 @@ if len(notebooks_list) > 0:
                                                             selected_day=page_section_group_c.created_at, 
                                                             notebook=notebook, 
                                                             group=page_section_group_c.group,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                         page_section_update_c.section_number = page_section_group_c.section_number
                         page_section_update_c.distillated = True
                         page_section_dao.update(page_section_update_c)
@@ -492,14 +517,17 @@ if len(notebooks_list) > 0:
                                                             selected_day=selected_day, 
                                                             notebook=notebook, 
                                                             group=Group.D,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                         page_section_after_c.set_created_by(page_section_group_c)
                         page_section_after_c = page_section_dao.insert(page_section_after_c)
+                        session.commit()
                         
                         st.toast('Distillation was saved!')
                         placehold_data_edit_group_c.success(f'{page_section_after_c} was inserted successfully!')
-                        notebook.page_section_list.append(page_section_after_c)
+                        notebook.add_page_section(page_section_after_c)
                     except Exception as error:
+                        session.rollback()
                         placehold_container_msg.error(str(error), icon="🚨")
                         if 'There is already a page'.upper() in str(error).upper():
                             st.error(str(error), icon="🚨")
@@ -577,13 +605,16 @@ if len(notebooks_list) > 0:
                                                             selected_day=page_section_group_d.created_at, 
                                                             notebook=notebook, 
                                                             group=page_section_group_d.group,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                 page_section_group_d.translated_sentences  = page_section_update_d.translated_sentences
                 page_section_update_d.section_number = page_section_group_d.section_number
                 try:
                     page_section_dao.update(page_section_update_d)
+                    session.commit()
                     st.toast('The translation of sentences has been updated!')
                 except Exception as error:
+                        session.rollback()
                         placehold_container_msg.error(str(error), icon="🚨")
 
             if distill_d and not dfd.empty:
@@ -598,7 +629,8 @@ if len(notebooks_list) > 0:
                                                             selected_day=page_section_group_d.created_at, 
                                                             notebook=notebook, 
                                                             group=page_section_group_d.group,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                         page_section_update_d.section_number = page_section_group_d.section_number
                         page_section_update_d.distillated = True
                         page_section_dao.update(page_section_update_d)
@@ -610,24 +642,29 @@ if len(notebooks_list) > 0:
                                                             selected_day=selected_day, 
                                                             notebook=notebook, 
                                                             group=Group.NEW_PAGE,
-                                                            persit=False)
+                                                            persit=False,
+                                                            session=session)
                         page_section_after_d.set_created_by(page_section_group_d)
                         page_section_after_d = page_section_dao.insert(page_section_after_d)
+                        session.commit()
 
                         st.toast('Distillation was saved!')
                         placehold_data_edit_group_d.success(f'{page_section_after_d} was inserted successfully!')
-                        notebook.page_section_list.append(page_section_after_d)
+                        notebook.add_page_section(page_section_after_d)
                     except Exception as error:
+                        session.rollback()
                         placehold_container_msg.error(str(error), icon="🚨")
                         if 'There is already a page'.upper() in str(error).upper():
                             st.error(str(error), icon="🚨")
         else:
             placehold_data_edit_group_d.warning('⚠️There is no a list of expressions in "Group D" to distill on the selected day!')
     
-    col_group_1.markdown(f'**GroupA:** {notebook.count_page_section_by_group(group=Group.A):0>7}')
-    col_group_2.markdown(f'**GroupB:** {notebook.count_page_section_by_group(group=Group.B):0>7}')
-    col_group_3.markdown(f'**GroupC:** {notebook.count_page_section_by_group(group=Group.C):0>7}')
-    col_group_4.markdown(f'**GroupD:** {notebook.count_page_section_by_group(group=Group.D):0>7}')
+    # The counts are a single query, the page sections of the notebook are not loaded
+    group_count_dict = page_section_dao.count_by_group(notebook.id)
+    col_group_1.markdown(f'**GroupA:** {group_count_dict.get(Group.A.value, 0):0>7}')
+    col_group_2.markdown(f'**GroupB:** {group_count_dict.get(Group.B.value, 0):0>7}')
+    col_group_3.markdown(f'**GroupC:** {group_count_dict.get(Group.C.value, 0):0>7}')
+    col_group_4.markdown(f'**GroupD:** {group_count_dict.get(Group.D.value, 0):0>7}')
 
 else:
     st.warning('⚠️Attention! There are no notebooks registred!')
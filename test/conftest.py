@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+# The app modules are imported from the repository root, as streamlit_app.py does
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """A fakeredis server behind the shared clients of app.core.redis_client, with the legacy key layout
+    """
+    fakeredis = pytest.importorskip('fakeredis')
+    monkeypatch.delenv('REDIS_KEY_LAYOUT', raising=False)
+    monkeypatch.delenv('REDIS_CLUSTER', raising=False)
+    from app.core import redis_client
+    from app.core.near_cache import near_cache
+
+    server = fakeredis.FakeServer()
+    redis_client.set_redis(fakeredis.FakeRedis(server=server, decode_responses=True))
+    redis_client.set_redis(fakeredis.FakeRedis(server=server), decode_responses=False)
+    near_cache.invalidate()
+
+    yield server
+
+    near_cache.invalidate()
+    redis_client.close_pool()
+
+
+@pytest.fixture
+def parquet_store(tmp_path, monkeypatch):
+    """The datasets, sequences and sentence index of app.core.dao_parquet, moved to tmp_path
+    """
+    from app.core import dao_parquet
+    from app.core.dataset import ParquetDataset
+    from app.core.hash_index import HashIndex
+    from app.core.sequence import SequenceStore
+    from app.core.table_cache import table_cache
+
+    for name, dataset in list(vars(dao_parquet).items()):
+        if isinstance(dataset, ParquetDataset):
+            monkeypatch.setattr(dao_parquet, name, ParquetDataset(tmp_path / dataset.path.name,
+                                                                  columns=dataset.columns,
+                                                                  types=dataset.types,
+                                                                  key=dataset.key,
+                                                                  row_key=dataset.row_key,
+                                                                  partition_by=dataset.partition_by,
+                                                                  sort_by=dataset.sort_by))
+    monkeypatch.setattr(dao_parquet, 'sequence_store', SequenceStore(tmp_path / 'sequence.json'))
+    monkeypatch.setattr(dao_parquet, 'sentence_index', HashIndex(
+        tmp_path / 'sentence_foreign_language.index',
+        rebuild=lambda: table_cache.read(dao_parquet.sentence_dataset)[['foreign_language', 'id']] \
+                                   .itertuples(index=False)
+    ))
+
+    yield tmp_path
+
+    table_cache.invalidate()
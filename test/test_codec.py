@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from app.core.codec import MAGIC, PayloadCodec, get_codec, pack_bools, unpack_bools, register_codec
+
+
+def test_binary_payload_round_trip():
+    codec = PayloadCodec(['id', 'name', 'memorized'])
+    data = {'id': 1, 'name': 'english', 'memorized': [True, False, False, True, True, False, False, False, True]}
+
+    payload = codec.encode(data)
+
+    assert payload[0] == MAGIC
+    assert codec.decode(payload) == data
+
+
+def test_json_payloads_are_still_read():
+    codec = PayloadCodec(['id', 'name'])
+
+    assert codec.decode(json.dumps({'id': 1, 'name': 'english'})) == {'id': 1, 'name': 'english'}
+    assert codec.decode(None) is None
+
+
+def test_fields_added_later_are_read_as_none():
+    payload = PayloadCodec(['id']).encode({'id': 1})
+
+    assert PayloadCodec(['id', 'name']).decode(payload) == {'id': 1, 'name': None}
+
+
+def test_bools_are_bit_packed():
+    values = [bool(i % 3) for i in range(20)]
+
+    assert len(pack_bools(values)) == 4 + 3
+    assert unpack_bools(pack_bools(values)) == values
+
+
+def test_codecs_are_registered_by_entity_type():
+    codec = PayloadCodec(['id'], binary=False)
+    register_codec('TestEntity', codec)
+
+    assert get_codec('TestEntity') is codec
+    with pytest.raises(Exception, match='There is no codec registered'):
+        get_codec('TestEntity:1')
@@ -0,0 +1,197 @@
+import datetime
+
+import pytest
+
+from app.model import Group, Notebook, PageSection, Sentence
+
+DAY = datetime.date(2023, 10, 1)
+
+
+@pytest.fixture
+def daos(redis_server):
+    from app.core.dao_redis import NotebookDAO, PageSectionDAO, SentenceDAO
+    return NotebookDAO(), PageSectionDAO(), SentenceDAO()
+
+
+@pytest.fixture
+def notebook(daos):
+    notebook_dao, _, _ = daos
+    return notebook_dao.insert(Notebook('english', created_at=DAY, list_size=3, days_period=15))
+
+
+@pytest.fixture
+def sentences(daos):
+    _, _, sentence_dao = daos
+    return [sentence_dao.insert(Sentence(created_at=DAY, foreign_language=f'f{i}', mother_tongue=f'm{i}'))
+            for i in range(3)]
+
+
+def new_page_section(notebook, sentences, group=Group.A, days=0, created_by=None):
+    return PageSection(group=group,
+                       created_at=DAY + datetime.timedelta(days=days),
+                       distillation_at=DAY + datetime.timedelta(days=days + 15),
+                       notebook=notebook,
+                       sentences=sentences,
+                       translated_sentences=[''] * len(sentences),
+                       memorializeds=[False] * len(sentences),
+                       created_by=created_by)
+
+
+def changed_page_section(page_section, notebook, sentences, **changes):
+    entity = new_page_section(notebook, sentences, group=page_section.group)
+    entity.section_number = page_section.section_number
+    entity.created_at = page_section.created_at
+    entity.distillation_at = page_section.distillation_at
+    for name, value in changes.items():
+        setattr(entity, name, value)
+    return entity
+
+
+def test_update_writes_the_changed_fields(daos, notebook, sentences):
+    _, page_section_dao, _ = daos
+    page_section = page_section_dao.insert(new_page_section(notebook, sentences))
+
+    page_section_dao.update(changed_page_section(page_section, notebook, sentences,
+                                                 translated_sentences=['', 'x', ''],
+                                                 memorializeds=[False, True, False]))
+
+    stored = page_section_dao.get_by_id(PageSection(id_=page_section.id))
+    assert stored.translated_sentences == ['', 'x', '']
+    assert stored.memorializeds == [False, True, False]
+    assert [s.id for s in stored.sentences] == [s.id for s in sentences]
+
+
+def test_update_of_a_missing_section_number(daos, notebook, sentences):
+    _, page_section_dao, _ = daos
+    entity = new_page_section(notebook, sentences)
+    entity.section_number = 99
+
+    with pytest.raises(Exception, match='There is no a PageSection with section_number=99'):
+        page_section_dao.update(entity)
+
+
+def test_update_of_an_indexed_id_without_payload(daos, notebook, sentences):
+    _, page_section_dao, _ = daos
+    page_section = page_section_dao.insert(new_page_section(notebook, sentences))
+    page_section_dao.r.delete(page_section_dao.keys.page_section(page_section.id))
+
+    with pytest.raises(Exception, match='There is no a PageSection'):
+        page_section_dao.update(changed_page_section(page_section, notebook, sentences))
+
+
+def test_update_of_a_distilled_page_section(daos, notebook, sentences):
+    _, page_section_dao, _ = daos
+    page_section = page_section_dao.insert(new_page_section(notebook, sentences))
+    page_section_dao.update(changed_page_section(page_section, notebook, sentences, distillated=True))
+
+    with pytest.raises(Exception, match='not allowed because it has already been distilled'):
+        page_section_dao.update(changed_page_section(page_section, notebook, sentences))
+
+
+def test_update_moves_a_legacy_page_section_to_its_own_hash(daos, notebook, sentences):
+    from app.core.codec import get_codec
+    from app.core.dao_redis import page_section_to_fields
+
+    _, page_section_dao, _ = daos
+    page_section = page_section_dao.insert(new_page_section(notebook, sentences))
+
+    # The layout before the page sections had their own hash
+    key = page_section_dao.keys.page_section(page_section.id)
+    data = page_section_dao.get_data_many([page_section.id])[0]
+    page_section_dao.r.delete(key)
+    page_section_dao.raw.hset(PageSection.__name__, page_section.id, get_codec(PageSection.__name__).encode(data))
+    assert page_section_dao.get_by_id(PageSection(id_=page_section.id)).section_number == page_section.section_number
+
+    page_section_dao.update(changed_page_section(page_section, notebook, sentences, translated_sentences=['a', 'b', 'c']))
+
+    assert not page_section_dao.r.hexists(PageSection.__name__, page_section.id)
+    assert page_section_dao.r.hgetall(key)['translated_sentence:2'] == '"c"'
+    assert page_section_to_fields(page_section_dao.get_data_many([page_section.id])[0])['translated_sentence:0'] == '"a"'
+
+
+def test_update_moves_the_index_entries(daos, notebook, sentences):
+    _, page_section_dao, _ = daos
+    page_section = page_section_dao.insert(new_page_section(notebook, sentences))
+
+    page_section_dao.update(changed_page_section(page_section, notebook, sentences, distillated=True))
+
+    assert page_section_dao.find_by_field(PageSection(notebook=notebook, distillated=True))[0].id == page_section.id
+    assert page_section_dao.r.smembers(page_section_dao.keys.page_section_index(None, 'distillated', False)) == set()
+
+
+def test_find_by_field_intersects_the_indexes(daos, notebook, sentences):
+    notebook_dao, page_section_dao, _ = daos
+    other_notebook = notebook_dao.insert(Notebook('spanish', created_at=DAY, list_size=3, days_period=15))
+
+    page_a = page_section_dao.insert(new_page_section(notebook, sentences))
+    page_b = page_section_dao.insert(new_page_section(notebook, sentences[:2], group=Group.B, days=15, created_by=page_a))
+    page_other = page_section_dao.insert(new_page_section(other_notebook, sentences, group=Group.B, days=15))
+
+    def section_numbers(**fields):
+        return [(p.notebook.id, p.section_number) for p in page_section_dao.find_by_field(PageSection(**fields))]
+
+    assert section_numbers(notebook=notebook) == [(notebook.id, page_a.section_number),
+                                                  (notebook.id, page_b.section_number)]
+    assert section_numbers(group=Group.B) == [(notebook.id, page_b.section_number),
+                                              (other_notebook.id, page_other.section_number)]
+    assert section_numbers(notebook=notebook, group=Group.B) == [(notebook.id, page_b.section_number)]
+    assert section_numbers(created_at=DAY) == [(notebook.id, page_a.section_number)]
+    assert section_numbers(notebook=notebook, created_by_id=page_a.section_number) == [(notebook.id, page_b.section_number)]
+    assert section_numbers(notebook=notebook, created_by=page_a) == [(notebook.id, page_b.section_number)]
+    assert section_numbers(notebook=other_notebook, group=Group.A) == []
+
+
+def test_find_by_field_rejects_unknown_fields(daos):
+    _, page_section_dao, _ = daos
+
+    with pytest.raises(Exception, match='cannot be used to find PageSection'):
+        page_section_dao.find_by_field(PageSection(page_number=1))
+    with pytest.raises(Exception, match='cannot be used to find PageSection'):
+        page_section_dao.find_by_field(PageSection(translated_sentences=['hola']))
+
+
+def test_hmget_by_index_with_a_missing_ids_key(daos, sentences):
+    _, _, sentence_dao = daos
+
+    assert sentence_dao.hmget_by_index(keys=['Missing_id', Sentence.__name__], args=[1, 2]) == [None, None]
+    assert sentence_dao.hmget_by_index(keys=[f'{Sentence.__name__}_id', 'Missing'], args=[1, 2]) == [None, None]
+
+
+def test_hmget_by_index_keeps_the_order_of_the_ids(daos, sentences):
+    _, _, sentence_dao = daos
+    ids = [sentences[2].id, 999, sentences[0].id]
+
+    data_list = sentence_dao.get_data_many(ids)
+
+    assert [data and data['foreign_language'] for data in data_list] == ['f2', None, 'f0']
+    assert [s and s.id for s in sentence_dao.get_many(ids)] == [sentences[2].id, None, sentences[0].id]
+
+
+def test_next_value_seeds_the_sequence_at_1(daos):
+    _, _, sentence_dao = daos
+    r = sentence_dao.r
+
+    assert sentence_dao.next_value(keys=['sequence'], args=[1]) == 1
+    assert sentence_dao.next_value(keys=['sequence'], args=[1]) == 2
+    assert r.get('sequence') == '3'
+
+
+def test_next_value_reserves_contiguous_blocks(daos):
+    _, _, sentence_dao = daos
+
+    first = sentence_dao.next_value(keys=['sequence'], args=[3])
+    second = sentence_dao.next_value(keys=['sequence'], args=[2])
+    third = sentence_dao.next_value(keys=['sequence'], args=[1])
+
+    assert (first, second, third) == (1, 4, 6)
+
+
+def test_insert_many_takes_one_block_of_ids(daos, sentences):
+    _, _, sentence_dao = daos
+
+    inserted = sentence_dao.insert_many([Sentence(created_at=DAY, foreign_language=f'g{i}', mother_tongue=f'n{i}')
+                                         for i in range(4)])
+
+    first = sentences[-1].id + 1
+    assert [s.id for s in inserted] == list(range(first, first + 4))
+    assert sentence_dao.get_sentence_id_sequence() == first + 4
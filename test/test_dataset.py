@@ -0,0 +1,130 @@
+import datetime
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from app.core.dataset import WRITE_SEQ_COLUMN, ParquetDataset
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return ParquetDataset(tmp_path / 'page',
+                          columns=['id', 'section', 'notebook_id', 'value', 'day'],
+                          types=['Int64', 'Int64', 'Int64', str, 'datetime64[ns]'],
+                          key=['section'],
+                          row_key=['section', 'id'],
+                          partition_by='notebook_id')
+
+
+def rows(*values):
+    return pd.DataFrame([{'id': id_, 'section': section, 'notebook_id': notebook_id, 'value': value,
+                          'day': datetime.date(2023, 10, 1)}
+                         for id_, section, notebook_id, value in values])
+
+
+def test_append_writes_a_fragment_per_partition(dataset):
+    written = dataset.append(rows((1, 1, 1, 'a'), (2, 2, 2, 'b')))
+
+    assert sorted(f.parent.name for f in written) == ['notebook_id=1', 'notebook_id=2']
+    assert dataset.fragments() == sorted(written)
+    assert dataset.read()[['id', 'notebook_id', 'value']].values.tolist() == [[1, 1, 'a'], [2, 2, 'b']]
+
+
+def test_read_keeps_the_latest_version_of_each_record(dataset):
+    dataset.append(rows((1, 1, 1, 'a'), (2, 1, 1, 'a'), (3, 2, 1, 'b')))
+    # A new version of a record replaces all its rows, even when it has fewer of them
+    dataset.append(rows((1, 1, 1, 'A')))
+
+    df = dataset.read()
+
+    assert df[['id', 'section', 'value']].values.tolist() == [[3, 2, 'b'], [1, 1, 'A']]
+    assert df['day'].tolist() == [datetime.date(2023, 10, 1)] * 2
+
+
+def test_query_does_not_match_old_versions(dataset):
+    dataset.append(rows((1, 1, 1, 'a'), (2, 2, 1, 'a')))
+    dataset.append(rows((1, 1, 1, 'b')))
+
+    assert dataset.query([('value', '==', 'a')])['section'].tolist() == [2]
+    assert dataset.query([('value', '==', 'b')], columns=['id'])['id'].tolist() == [1]
+    assert dataset.query([('notebook_id', '==', 1), ('section', 'in', [1, 2])], columns=['value'])['value'] \
+        .tolist() == ['a', 'b']
+    assert dataset.query([('notebook_id', '==', 3)]).empty
+
+
+def test_filter_frame_matches_query(dataset):
+    dataset.append(rows((1, 1, 1, 'a'), (2, 2, 2, 'b'), (3, 3, 2, 'c')))
+    filters = [('notebook_id', '==', 2), ('section', '>=', 3)]
+
+    df = dataset.filter_frame(dataset.read(), filters, ['id', 'value'])
+
+    assert df.values.tolist() == dataset.query(filters, ['id', 'value']).values.tolist() == [[3, 'c']]
+
+
+def test_compact_merges_the_fragments_of_each_partition(dataset):
+    dataset.append(rows((1, 1, 1, 'a')))
+    dataset.append(rows((2, 2, 1, 'b')))
+    dataset.append(rows((1, 1, 1, 'A'), (3, 3, 2, 'c')))
+    before = dataset.read()
+
+    dataset.compact()
+
+    assert len(dataset.fragments(dataset.path / 'notebook_id=1')) == 1
+    assert len(dataset.fragments(dataset.path / 'notebook_id=2')) == 1
+    after = dataset.read()
+    assert sorted(after.drop(columns=WRITE_SEQ_COLUMN).values.tolist()) == \
+        sorted(before.drop(columns=WRITE_SEQ_COLUMN).values.tolist())
+
+    # The merged fragment keeps the write_seq of its rows, so later writes still win
+    dataset.append(rows((2, 2, 1, 'B')))
+    assert dataset.query([('section', '==', 2)])['value'].tolist() == ['B']
+
+
+def test_a_legacy_file_is_imported_once(tmp_path):
+    legacy_file = tmp_path / 'page.parquet'
+    rows((1, 1, 1, 'a'), (2, 2, 2, 'b')).to_parquet(legacy_file)
+
+    dataset = ParquetDataset(tmp_path / 'page', columns=['id', 'section', 'notebook_id', 'value', 'day'],
+                             types=['Int64', 'Int64', 'Int64', str, 'datetime64[ns]'], key=['section'],
+                             row_key=['section', 'id'], partition_by='notebook_id', legacy_file=legacy_file)
+
+    assert not legacy_file.exists()
+    assert (tmp_path / 'page.parquet.migrated').exists()
+    assert sorted(dataset.read()['value'].tolist()) == ['a', 'b']
+
+
+def test_the_directory_is_created_by_the_first_write(tmp_path):
+    dataset = ParquetDataset(tmp_path / 'page', columns=['id', 'section', 'notebook_id', 'value', 'day'],
+                             types=['Int64', 'Int64', 'Int64', str, 'datetime64[ns]'], key=['section'],
+                             row_key=['section', 'id'], partition_by='notebook_id')
+
+    assert not dataset.path.exists()
+    assert dataset.read().empty
+    assert dataset.query([('notebook_id', '==', 1)]).empty
+    dataset.compact()
+    assert not dataset.path.exists()
+
+    dataset.append(rows((1, 1, 1, 'a')))
+    assert dataset.read()['value'].tolist() == ['a']
+
+
+def test_replace_partition_waits_for_a_running_compaction(dataset):
+    dataset.append(rows((1, 1, 1, 'a')))
+    dataset.append(rows((2, 2, 1, 'b')))
+    read_fragments = dataset.read_fragments
+    replace = threading.Thread(target=dataset.replace_partition,
+                               args=(1, rows((2, 2, 1, 'B')).drop(columns='notebook_id')))
+
+    def read_fragments_then_replace(fragments):
+        # The partition is replaced while the compaction holds the fragments it read
+        replace.start()
+        time.sleep(0.2)
+        return read_fragments(fragments)
+
+    dataset.read_fragments = read_fragments_then_replace
+    dataset.compact()
+    replace.join()
+
+    assert dataset.read()[['section', 'value']].values.tolist() == [[2, 'B']]
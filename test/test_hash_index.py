@@ -0,0 +1,109 @@
+import datetime
+import unicodedata
+
+import pytest
+
+from app.core.hash_index import HashIndex, normalize_text
+from app.model import Sentence
+
+DAY = datetime.date(2023, 10, 1)
+NFC = unicodedata.normalize('NFC', 'café')
+NFD = unicodedata.normalize('NFD', 'café')
+
+
+class Table():
+    """The rows the index is rebuilt from, counting the rebuilds"""
+    def __init__(self, *rows):
+        self.rows = list(rows)
+        self.rebuilds = 0
+
+    def __call__(self):
+        self.rebuilds += 1
+        return list(self.rows)
+
+
+def test_normalize_text_composes_and_collapses_the_whitespace():
+    assert NFC != NFD
+    assert normalize_text(NFD) == NFC
+    assert normalize_text('  a \t lot\nof   space ') == 'a lot of space'
+    assert normalize_text(None) is None
+
+
+def test_a_missing_log_is_rebuilt_from_the_table(tmp_path):
+    table = Table(('hello', 1), (NFD, 2))
+    index = HashIndex(tmp_path / 'index', rebuild=table)
+
+    assert index.get_many(['hello', NFC, 'other']) == [1, 2, None]
+    assert table.rebuilds == 1
+    assert (tmp_path / 'index').exists()
+
+    index.add('other', 3)
+    assert index.get('  other ') == 3
+    assert table.rebuilds == 1
+
+
+def test_a_corrupt_log_is_rebuilt_from_the_table(tmp_path):
+    table = Table(('hello', 1))
+    index = HashIndex(tmp_path / 'index', rebuild=table)
+    index.add('hello', 1)
+
+    with open(tmp_path / 'index', 'a', encoding='utf-8') as file:
+        file.write('not json\n')
+
+    assert HashIndex(tmp_path / 'index', rebuild=table).get('hello') == 1
+    assert table.rebuilds == 2
+
+
+def test_the_lines_of_another_writer_are_read(tmp_path):
+    table = Table()
+    reader = HashIndex(tmp_path / 'index', rebuild=table)
+    writer = HashIndex(tmp_path / 'index', rebuild=table)
+    assert reader.get('hello') is None
+
+    writer.add_many([('hello', 1), ('world', 2)])
+    # A line still being written is left for the next lookup
+    with open(tmp_path / 'index', 'a', encoding='utf-8') as file:
+        file.write('["partial", ')
+
+    assert reader.get_many(['hello', 'world', 'partial']) == [1, 2, None]
+
+    with open(tmp_path / 'index', 'a', encoding='utf-8') as file:
+        file.write('3]\n')
+    assert reader.get('partial') == 3
+    assert table.rebuilds == 1
+
+
+def test_a_stale_id_rebuilds_the_sentence_index(parquet_store):
+    from app.core import dao_parquet
+
+    sentence = dao_parquet.SentenceDAO().insert(Sentence(created_at=DAY, foreign_language='hello', mother_tongue='m'))
+    # An id written by a process that crashed before the sentence was stored
+    dao_parquet.sentence_index.add('ghost', 999)
+    dao_parquet.sentence_index.add('hello', 999)
+
+    found = dao_parquet.SentenceDAO().find_by_foreign_languages(['hello', 'ghost'])
+
+    assert list(found) == ['hello']
+    assert found['hello'].id == sentence.id
+    assert dao_parquet.sentence_index.get('ghost') is None
+
+
+@pytest.fixture(params=['parquet', 'redis'])
+def sentence_dao(request):
+    if request.param == 'parquet':
+        request.getfixturevalue('parquet_store')
+        from app.core.dao_parquet import SentenceDAO
+    else:
+        request.getfixturevalue('redis_server')
+        from app.core.dao_redis import SentenceDAO
+    return SentenceDAO()
+
+
+def test_both_backends_match_the_normalized_text(sentence_dao):
+    sentence = sentence_dao.insert(Sentence(created_at=DAY, foreign_language=NFD, mother_tongue='m'))
+
+    found = sentence_dao.find_by_field(Sentence(foreign_language=f' {NFC} '))
+
+    assert [s.id for s in found] == [sentence.id]
+    assert found[0].foreign_language == NFD
+    assert sentence_dao.get_by_id(Sentence(id_=sentence.id)).foreign_language == NFD
@@ -0,0 +1,200 @@
+import datetime
+import json
+
+import pandas as pd
+import pytest
+
+from app.core.dataset import ParquetDataset
+from app.core.table_cache import table_cache
+from app.model import Group, Notebook, PageSection, Sentence, legacy_created_by_ids
+
+DAY = datetime.date(2023, 10, 1)
+
+
+def page(section_number, page_number, group, created_by_id=None):
+    return {'section_number': section_number, 'page_number': page_number, 'group': group,
+            'created_by_id': created_by_id}
+
+
+def test_legacy_created_by_ids_follow_the_page_number_of_the_parent_group():
+    pages = [page(1, 1, 'A'), page(2, 1, 'B', created_by_id=1),
+             page(3, 2, 'A'), page(4, 2, 'B', created_by_id=2),
+             page(5, 1, 'C', created_by_id=2)]
+
+    # 2 is the section number of a B page, so the C page already links to its section number
+    assert legacy_created_by_ids(pages) == {4: 3}
+
+
+def test_legacy_created_by_ids_keep_the_unknown_links():
+    assert legacy_created_by_ids([page(1, 1, 'A'), page(2, 1, 'B', created_by_id=7)]) == {}
+
+
+def test_parquet_migration_rewrites_the_links(tmp_path):
+    from app.core.dao_parquet import page_section_columns, page_section_types
+    from app.core.parquet_migration import migrate_created_by_ids
+
+    dataset = ParquetDataset(tmp_path / 'page_section', columns=page_section_columns, types=page_section_types,
+                             key=['section_number'], row_key=['section_number', 'id'], partition_by='notebook_id')
+    pages = [(1, 1, 'A', None), (2, 1, 'B', 1), (3, 2, 'A', None), (4, 2, 'B', 2)]
+    dataset.append(pd.DataFrame([
+        {'id': section_number * 10 + i, 'created_at': DAY, 'section_number': section_number,
+         'page_number': page_number, 'created_by_id': created_by_id, 'group': group, 'distillation_at': DAY,
+         'distillated': False, 'memorized': False, 'translated_sentence': '', 'sentence_id': i, 'notebook_id': 1}
+        for section_number, page_number, group, created_by_id in pages for i in range(2)
+    ]))
+
+    assert migrate_created_by_ids(dataset) == 1
+    assert migrate_created_by_ids(dataset) == 0
+
+    df = table_cache.read(dataset)
+    assert df.groupby('section_number')['created_by_id'].agg(lambda s: s.unique().tolist()).to_dict() == \
+        {1: [pd.NA], 2: [1], 3: [pd.NA], 4: [3]}
+    assert len(df) == 8
+
+
+def test_redis_migration_rewrites_the_links(redis_server):
+    from app.core.dao_redis import NotebookDAO, PageSectionDAO, SentenceDAO
+    from app.core.redis_migration import migrate_created_by_ids
+
+    page_section_dao = PageSectionDAO()
+    keys = page_section_dao.keys
+    notebook = NotebookDAO().insert(Notebook('english', created_at=DAY, list_size=3, days_period=15))
+    sentence = SentenceDAO().insert(Sentence(created_at=DAY, foreign_language='f', mother_tongue='m'))
+
+    def insert(group, days, created_by=None):
+        return page_section_dao.insert(PageSection(group=group, created_at=DAY + datetime.timedelta(days=days),
+                                                   distillation_at=DAY + datetime.timedelta(days=days + 15),
+                                                   notebook=notebook, sentences=[sentence], translated_sentences=[''],
+                                                   memorializeds=[False], created_by=created_by))
+
+    page_a1 = insert(Group.A, 0)
+    insert(Group.B, 15, created_by=page_a1)
+    page_a2 = insert(Group.A, 1)
+    page_b2 = insert(Group.B, 16, created_by=page_a2)
+
+    # A link written before created_by_id held the section number
+    page_number = int(page_a2.page_number)
+    assert page_number != page_a2.section_number
+    page_section_dao.r.hset(keys.page_section(page_b2.id, notebook.id), 'created_by_id', json.dumps(page_number))
+    page_section_dao.r.smove(keys.page_section_index(notebook.id, 'created_by_id', page_a2.section_number),
+                             keys.page_section_index(notebook.id, 'created_by_id', page_number), page_b2.id)
+
+    assert migrate_created_by_ids() == 1
+    assert migrate_created_by_ids() == 0
+
+    assert page_section_dao.get_by_id(PageSection(id_=page_b2.id)).created_by.section_number == page_a2.section_number
+    found = page_section_dao.find_by_field(PageSection(notebook=notebook, created_by_id=page_a2.section_number))
+    assert [p.id for p in found] == [page_b2.id]
+
+
+def test_redis_migration_normalizes_the_sentence_texts(redis_server):
+    import unicodedata
+
+    from app.core.codec import get_codec
+    from app.core.dao_redis import SentenceDAO
+    from app.core.redis_client import get_redis
+    from app.core.redis_migration import normalize_sentence_texts
+
+    nfc, nfd = unicodedata.normalize('NFC', 'café'), unicodedata.normalize('NFD', 'café')
+    codec = get_codec(Sentence.__name__)
+    r = get_redis(decode_responses=False)
+
+    # Sentences written before their texts were normalized
+    for id_, text in ((1, nfd), (2, 'two  words'), (3, 'ok')):
+        r.hset(Sentence.__name__, text, codec.encode(Sentence(id_, DAY, text, 'm').data_to_redis()))
+        r.hset(f'{Sentence.__name__}_id', id_, text)
+
+    assert normalize_sentence_texts() == 2
+    assert normalize_sentence_texts() == 0
+
+    sentence_dao = SentenceDAO()
+    assert [s.id for s in sentence_dao.find_by_field(Sentence(foreign_language=nfc))] == [1]
+    assert [s.id for s in sentence_dao.find_by_field(Sentence(foreign_language='two words'))] == [2]
+    assert [s.foreign_language for s in sentence_dao.get_many([1, 2, 3])] == [nfd, 'two  words', 'ok']
+
+
+def insert_page_section(page_section_dao, notebook, sentences, group, days, created_by=None):
+    return page_section_dao.insert(PageSection(group=group, created_at=DAY + datetime.timedelta(days=days),
+                                               distillation_at=DAY + datetime.timedelta(days=days + 15),
+                                               notebook=notebook, sentences=sentences,
+                                               translated_sentences=[''] * len(sentences),
+                                               memorializeds=[False] * len(sentences), created_by=created_by))
+
+
+def test_redis_migration_moves_the_membership_hash_to_sorted_sets(redis_server):
+    from app.core.dao_redis import NotebookDAO, PageSectionDAO, SentenceDAO
+    from app.core.redis_client import get_redis
+    from app.core.redis_migration import LEGACY_MEMBERSHIP_HASH, migrate_page_section_membership
+
+    page_section_dao = PageSectionDAO()
+    notebook = NotebookDAO().insert(Notebook('english', created_at=DAY, list_size=3, days_period=15))
+    sentence = SentenceDAO().insert(Sentence(created_at=DAY, foreign_language='f', mother_tongue='m'))
+    page_a = insert_page_section(page_section_dao, notebook, [sentence], Group.A, 1)
+    page_b = insert_page_section(page_section_dao, notebook, [sentence], Group.B, 0)
+
+    # The membership as it was stored before the sorted sets, with an id that no longer exists
+    r = get_redis()
+    membership = page_section_dao.keys.page_section_membership(notebook.id)
+    r.delete(membership)
+    r.hset(LEGACY_MEMBERSHIP_HASH, f'{Notebook.__name__}_{notebook.id}',
+           json.dumps([page_a.id, page_b.id, 'missing']))
+
+    assert migrate_page_section_membership() == 2
+    assert migrate_page_section_membership() == 0
+
+    assert r.zrange(membership, 0, -1, withscores=True) == [(page_b.id, 20231016.0), (page_a.id, 20231017.0)]
+    assert not r.exists(LEGACY_MEMBERSHIP_HASH)
+    assert r.exists(f'{LEGACY_MEMBERSHIP_HASH}:migrated')
+    [loaded] = NotebookDAO().get_all(Notebook())
+    assert sorted(p.id for p in loaded.page_section_list) == sorted([page_a.id, page_b.id])
+
+
+def test_redis_migration_copies_the_keyspace_to_the_cluster_layout(redis_server, monkeypatch):
+    from app.core.dao_redis import NotebookDAO, PageSectionDAO, SentenceDAO, SentenceProgressDAO
+    from app.core.near_cache import near_cache
+    from app.core.redis_migration import migrate_to_cluster_layout
+
+    notebook = NotebookDAO().insert(Notebook('english', created_at=DAY, list_size=3, days_period=15))
+    sentences = [SentenceDAO().insert(Sentence(created_at=DAY, foreign_language=f'f{i}', mother_tongue=f'm{i}'))
+                 for i in range(2)]
+    page_a = insert_page_section(PageSectionDAO(), notebook, sentences, Group.A, 0)
+    page_b = insert_page_section(PageSectionDAO(), notebook, sentences, Group.B, 15, created_by=page_a)
+    progress = [(p.sentence_id, p.section_number) for p in SentenceProgressDAO().get_many(
+        [s.id for s in sentences], notebook_id=notebook.id)]
+
+    copied = migrate_to_cluster_layout()
+    assert copied == {Notebook.__name__: 1, Sentence.__name__: 2, PageSection.__name__: 2}
+
+    monkeypatch.setenv('REDIS_KEY_LAYOUT', 'cluster')
+    near_cache.invalidate()
+    page_section_dao = PageSectionDAO()
+    assert page_section_dao.keys.cluster
+
+    [loaded] = NotebookDAO().get_all(Notebook())
+    assert (loaded.id, loaded.name) == (notebook.id, 'english')
+    assert sorted(p.section_number for p in loaded.page_section_list) == [page_a.section_number,
+                                                                         page_b.section_number]
+    assert page_section_dao.get_by_id(PageSection(id_=page_b.id)).created_by.section_number == page_a.section_number
+    found = page_section_dao.find_by_field(PageSection(notebook=notebook, group=Group.B))
+    assert [p.id for p in found] == [page_b.id]
+    assert [s.id for s in SentenceDAO().find_by_field(Sentence(foreign_language='f1'))] == [sentences[1].id]
+    assert [(p.sentence_id, p.section_number) for p in SentenceProgressDAO().get_many(
+        [s.id for s in sentences], notebook_id=notebook.id)] == progress
+
+    # The sequences go on from the legacy values
+    page_c = insert_page_section(page_section_dao, notebook, sentences[:1], Group.A, 1)
+    sentence = SentenceDAO().insert(Sentence(created_at=DAY, foreign_language='f2', mother_tongue='m2'))
+    assert page_c.section_number == page_b.section_number + 1
+    assert int(page_c.page_number) == int(page_a.page_number) + 1
+    assert sentence.id == sentences[-1].id + 1
+    assert NotebookDAO().insert(Notebook('spanish', created_at=DAY, list_size=3, days_period=15)).id == notebook.id + 1
+
+    # A second run copies the legacy keys again without rewinding the sequences
+    assert migrate_to_cluster_layout() == copied
+    near_cache.invalidate()
+
+    assert insert_page_section(page_section_dao, notebook, sentences[:1], Group.A, 2).section_number == \
+        page_c.section_number + 1
+    assert SentenceDAO().get_sentence_id_sequence() == sentence.id + 1
+    [loaded, _] = NotebookDAO().get_all(Notebook())
+    assert len(loaded.page_section_list) == 4
@@ -0,0 +1,74 @@
+import datetime
+
+import pyarrow as pa
+
+from app.model import PAGE_SECTION_COLUMNS, Group, Notebook, PageSection, Sentence, attributes
+
+
+def page_section_from_columns():
+    columns = pa.RecordBatch.from_pydict({'sentence_id': [1, 2], 'translated_sentence': ['one', 'two'],
+                                          'memorized': [True, False]}, schema=PAGE_SECTION_COLUMNS)
+    return PageSection(id_=10, section_number=1, page_number=1, group=Group.A, created_at=datetime.date(2023, 10, 1),
+                       sentences=[Sentence(1), Sentence(2)], notebook=Notebook('english', id_=1), columns=columns)
+
+
+def test_attributes_use_the_public_names():
+    parent = PageSection(section_number=1)
+    page_section = PageSection(section_number=2, created_by=parent, translated_sentences=['hola'], memorializeds=[True])
+
+    fields = attributes(page_section)
+
+    assert fields['created_by'] is parent
+    assert fields['translated_sentences'] == ['hola']
+    assert fields['memorializeds'] == [True]
+    assert not {'_created_by', '_translated_sentences', '_memorializeds'} & set(fields)
+
+
+def test_attributes_do_not_load_created_by():
+    loads = []
+    page_section = PageSection(section_number=2, created_by_id=1,
+                               created_by_loader=lambda p: loads.append(p) or PageSection(section_number=1))
+
+    assert attributes(page_section)['created_by'] is None
+    assert page_section.created_by_id == 1
+    assert loads == []
+
+
+def test_to_frame_uses_the_columns_it_was_built_from():
+    page_section = page_section_from_columns()
+
+    df = page_section.to_frame()
+
+    assert df['sentence_id'].tolist() == [1, 2]
+    assert df['translated_sentence'].tolist() == ['one', 'two']
+    assert df['memorized'].tolist() == [True, False]
+
+
+def test_to_frame_reflects_reassigned_sentences():
+    page_section = page_section_from_columns()
+
+    page_section.sentences = [Sentence(3), Sentence(4)]
+
+    assert page_section.to_frame()['sentence_id'].tolist() == [3, 4]
+    assert page_section.translated_sentences == ['one', 'two']
+
+
+def test_to_frame_reflects_reassigned_lists():
+    page_section = page_section_from_columns()
+
+    page_section.translated_sentences = ['uno', 'dos']
+    page_section.memorializeds = [False, True]
+
+    df = page_section.to_frame()
+    assert df['translated_sentence'].tolist() == ['uno', 'dos']
+    assert df['memorized'].tolist() == [False, True]
+
+
+def test_clone_keeps_the_sentences():
+    page_section = page_section_from_columns()
+
+    clone = page_section.clone()
+
+    assert [s.id for s in clone.sentences] == [1, 2]
+    assert clone.memorializeds == [True, False]
+    assert attributes(clone)['sentences'] is clone.sentences
@@ -0,0 +1,123 @@
+import fakeredis
+import pytest
+
+from app.core.near_cache import NearCache
+from app.model import Notebook, Sentence
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+
+class Loader():
+    def __init__(self, data_dict):
+        self.data_dict = data_dict
+        self.calls = []
+
+    def __call__(self, ids):
+        self.calls.append(list(ids))
+        return [self.data_dict.get(id_) for id_ in ids]
+
+
+def test_get_many_loads_only_the_missing_ids(client):
+    cache = NearCache(client)
+    loader = Loader({1: {'id': 1}, 2: {'id': 2}})
+
+    assert cache.get_many(Notebook, [1, 2], loader) == [{'id': 1}, {'id': 2}]
+    assert cache.get_many(Notebook, [2, 1, 3, 3], loader) == [{'id': 2}, {'id': 1}, None, None]
+
+    # A missing id is not cached, it is loaded again
+    assert loader.calls == [[1, 2], [3]]
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 4
+
+
+def test_entries_expire_by_entity_type(client):
+    cache = NearCache(client, ttls={'Notebook': 0, 'Sentence': 3600})
+    loader = Loader({1: {'id': 1}})
+
+    cache.get_many(Notebook, [1], loader)
+    cache.get_many(Sentence, [1], loader)
+    cache.get_many(Notebook, [1], loader)
+    cache.get_many(Sentence, [1], loader)
+
+    assert loader.calls == [[1], [1], [1]]
+    assert cache.stats()['expirations'] == 1
+
+
+def test_least_recently_used_entries_are_evicted(client):
+    cache = NearCache(client, max_size=2)
+    loader = Loader({1: {'id': 1}, 2: {'id': 2}, 3: {'id': 3}})
+
+    cache.get_many(Notebook, [1, 2], loader)
+    cache.get_many(Notebook, [1], loader)
+    cache.get_many(Notebook, [3], loader)
+    cache.get_many(Notebook, [1, 2], loader)
+
+    assert loader.calls == [[1, 2], [3], [2]]
+    assert cache.stats()['evictions'] == 2
+
+
+def test_version_bumped_by_another_process_drops_the_entries(client):
+    cache = NearCache(client, version_check_interval=0)
+    other_process = NearCache(client, version_check_interval=0)
+    loader = Loader({1: {'id': 1}})
+
+    cache.get_many(Notebook, [1], loader)
+    cache.get_many(Sentence, [1], loader)
+    other_process.bump_version(Notebook)
+    cache.get_many(Notebook, [1], loader)
+    cache.get_many(Sentence, [1], loader)
+
+    assert loader.calls == [[1], [1], [1]]
+
+
+def test_version_is_read_again_only_after_the_interval(client):
+    cache = NearCache(client, version_check_interval=3600)
+    other_process = NearCache(client)
+    loader = Loader({1: {'id': 1}})
+
+    cache.get_many(Notebook, [1], loader)
+    other_process.bump_version(Notebook)
+    cache.get_many(Notebook, [1], loader)
+
+    assert loader.calls == [[1]]
+
+
+def test_invalidate(client):
+    cache = NearCache(client)
+    loader = Loader({1: {'id': 1}, 2: {'id': 2}})
+
+    cache.get_many(Notebook, [1, 2], loader)
+    cache.invalidate(Notebook, 1)
+    cache.get_many(Notebook, [1, 2], loader)
+    cache.invalidate()
+    cache.get_many(Notebook, [1, 2], loader)
+
+    assert loader.calls == [[1, 2], [1], [1, 2]]
+
+
+def test_listen_without_keyspace_notifications(client):
+    cache = NearCache(client)
+
+    assert cache.listen() is False
+    assert cache.stats()['listening'] is False
+
+
+def test_notebook_dao_reads_are_served_from_memory(redis_server):
+    from app.core.dao_redis import NotebookDAO
+    from app.core.near_cache import near_cache
+
+    notebook_dao = NotebookDAO()
+    notebook = notebook_dao.insert(Notebook('english', list_size=3, days_period=15))
+
+    assert notebook_dao.get_by_id(Notebook(id_=notebook.id)).name == 'english'
+    hits = near_cache.stats()['hits']
+    assert notebook_dao.get_by_id(Notebook(id_=notebook.id)).name == 'english'
+    assert near_cache.stats()['hits'] == hits + 1
+
+    # A deleted notebook is dropped by the version bump
+    notebook_dao.delete(notebook)
+    with pytest.raises(Exception, match='There is no a notebook'):
+        notebook_dao.get_by_id(Notebook(id_=notebook.id))
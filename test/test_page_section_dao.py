@@ -0,0 +1,249 @@
+import datetime
+
+import pytest
+
+from app.model import Group, Notebook, PageSection, Sentence, attributes
+
+DAY = datetime.date(2023, 10, 1)
+
+
+@pytest.fixture(params=['parquet', 'redis'])
+def daos(request):
+    if request.param == 'parquet':
+        request.getfixturevalue('parquet_store')
+        from app.core import dao_parquet as dao_module
+    else:
+        request.getfixturevalue('redis_server')
+        from app.core import dao_redis as dao_module
+    return dao_module.NotebookDAO(), dao_module.PageSectionDAO(), dao_module.SentenceDAO()
+
+
+@pytest.fixture
+def notebooks(daos):
+    notebook_dao, _, _ = daos
+    return [notebook_dao.insert(Notebook(name, created_at=DAY, list_size=3, days_period=15))
+            for name in ('english', 'spanish')]
+
+
+@pytest.fixture
+def sentences(daos):
+    _, _, sentence_dao = daos
+    return [sentence_dao.insert(Sentence(created_at=DAY, foreign_language=f'f{i}', mother_tongue=f'm{i}'))
+            for i in range(2)]
+
+
+def insert(page_section_dao, notebook, sentences, group, days, created_by=None):
+    return page_section_dao.insert(PageSection(group=group,
+                                               created_at=DAY + datetime.timedelta(days=days),
+                                               distillation_at=DAY + datetime.timedelta(days=days + 15),
+                                               notebook=notebook,
+                                               sentences=sentences,
+                                               translated_sentences=[''] * len(sentences),
+                                               memorializeds=[False] * len(sentences),
+                                               created_by=created_by))
+
+
+def section_numbers(page_section_list):
+    return sorted(p.section_number for p in page_section_list)
+
+
+@pytest.fixture
+def due_pages(daos, notebooks, sentences):
+    """Two A pages due on days 15 and 16 and two B pages due on days 30 and 31 of the first notebook,
+    the second notebook has a page due on each of those days
+    """
+    _, page_section_dao, _ = daos
+    pages = [insert(page_section_dao, notebooks[0], sentences, group, days)
+             for group, days in ((Group.A, 0), (Group.A, 1), (Group.B, 15), (Group.B, 16))]
+    for group, days in ((Group.A, 0), (Group.A, 1), (Group.B, 15), (Group.B, 16)):
+        insert(page_section_dao, notebooks[1], sentences, group, days)
+    return pages
+
+
+def test_find_due_includes_both_ends_of_the_range(daos, notebooks, due_pages):
+    _, page_section_dao, _ = daos
+    page_a1, page_a2, page_b1, page_b2 = due_pages
+
+    def find_due(start_days, end_days, group=None):
+        return section_numbers(page_section_dao.find_due(notebooks[0].id, DAY + datetime.timedelta(days=start_days),
+                                                         DAY + datetime.timedelta(days=end_days), group))
+
+    assert find_due(15, 16) == [page_a1.section_number, page_a2.section_number]
+    assert find_due(16, 16) == [page_a2.section_number]
+    assert find_due(16, 30) == [page_a2.section_number, page_b1.section_number]
+    assert find_due(0, 100) == section_numbers(due_pages)
+
+
+def test_find_due_filters_by_group(daos, notebooks, due_pages):
+    _, page_section_dao, _ = daos
+    page_a1, page_a2, page_b1, page_b2 = due_pages
+    start, end = DAY, DAY + datetime.timedelta(days=100)
+
+    assert section_numbers(page_section_dao.find_due(notebooks[0].id, start, end, Group.B)) == \
+        [page_b1.section_number, page_b2.section_number]
+    assert section_numbers(page_section_dao.find_due(notebooks[0].id, start, end, Group.HEADLIST)) == \
+        [page_a1.section_number, page_a2.section_number]
+    assert page_section_dao.find_due(notebooks[0].id, start, end, Group.C) == []
+
+
+def test_find_due_of_an_empty_range(daos, notebooks, due_pages):
+    _, page_section_dao, _ = daos
+
+    assert page_section_dao.find_due(notebooks[0].id, DAY + datetime.timedelta(days=17),
+                                     DAY + datetime.timedelta(days=29)) == []
+    assert page_section_dao.find_due(notebooks[0].id, DAY + datetime.timedelta(days=16),
+                                     DAY + datetime.timedelta(days=15)) == []
+
+
+def test_find_due_reads_only_the_notebook(daos, notebooks, due_pages):
+    _, page_section_dao, _ = daos
+
+    found = page_section_dao.find_due(notebooks[1].id, DAY, DAY + datetime.timedelta(days=100))
+
+    assert len(found) == 4
+    assert {p.notebook.id for p in found} == {notebooks[1].id}
+    assert {p.id for p in found}.isdisjoint(p.id for p in due_pages)
+
+
+def test_count_by_group(daos, notebooks, sentences, due_pages):
+    notebook_dao, page_section_dao, _ = daos
+    insert(page_section_dao, notebooks[0], sentences, Group.C, 30)
+    insert(page_section_dao, notebooks[1], sentences, Group.D, 45)
+
+    assert page_section_dao.count_by_group(notebooks[0].id) == {'A': 2, 'B': 2, 'C': 1}
+    assert page_section_dao.count_by_group(notebooks[1].id) == {'A': 2, 'B': 2, 'D': 1}
+
+    empty = notebook_dao.insert(Notebook('french', created_at=DAY, list_size=3, days_period=15))
+    assert page_section_dao.count_by_group(empty.id) == {}
+
+
+
+def distill(page_section_dao, page_section, notebook):
+    # Built as the distillation page does, without the fields set on insert
+    entity = PageSection(section_number=page_section.section_number,
+                         group=page_section.group,
+                         created_at=page_section.created_at,
+                         distillation_at=page_section.distillation_at,
+                         notebook=notebook,
+                         sentences=page_section.sentences,
+                         translated_sentences=page_section.translated_sentences,
+                         memorializeds=[True] * len(page_section.sentences))
+    entity.distillated = True
+    return page_section_dao.update(entity)
+
+
+@pytest.fixture
+def chains(daos, notebooks, sentences):
+    """Per notebook, the chain A -> B -> C with each page section distilled before the next one is
+    created, and an A page section that is the root of no chain
+    """
+    _, page_section_dao, _ = daos
+    chain_dict = dict()
+    for notebook in notebooks:
+        page_a = insert(page_section_dao, notebook, sentences, Group.A, 0)
+        distill(page_section_dao, page_a, notebook)
+        page_b = insert(page_section_dao, notebook, sentences, Group.B, 15, created_by=page_a)
+        distill(page_section_dao, page_b, notebook)
+        page_c = insert(page_section_dao, notebook, sentences, Group.C, 30, created_by=page_b)
+        unlinked = insert(page_section_dao, notebook, sentences, Group.A, 1)
+        chain_dict[notebook.id] = (page_a, page_b, page_c, unlinked)
+    return chain_dict
+
+
+def find(page_section_dao, notebook, section_number):
+    [page_section] = page_section_dao.find_by_field(PageSection(notebook=notebook, section_number=section_number))
+    return page_section
+
+
+def test_update_keeps_the_fields_it_is_not_given(daos, notebooks, chains):
+    _, page_section_dao, _ = daos
+    page_a, page_b, _, _ = chains[notebooks[0].id]
+
+    stored = find(page_section_dao, notebooks[0], page_b.section_number)
+
+    assert stored.created_by_id == page_a.section_number
+    assert int(stored.page_number) == int(page_b.page_number)
+    assert stored.distillated
+    assert stored.distillation_actual is not None
+
+
+def test_lineage_survives_the_distillation_of_each_page_section(daos, notebooks, sentences, chains):
+    _, page_section_dao, _ = daos
+    notebook = notebooks[0]
+    page_a, page_b, page_c, _ = chains[notebook.id]
+    distill(page_section_dao, page_c, notebook)
+    page_d = insert(page_section_dao, notebook, sentences, Group.D, 45, created_by=page_c)
+
+    expected = [page_a.section_number, page_b.section_number, page_c.section_number, page_d.section_number]
+    for page_section in (page_a, page_b, page_c, page_d):
+        assert [p.section_number for p in page_section_dao.lineage(page_section)] == expected
+
+
+def test_lineage_of_an_unlinked_root(daos, notebooks, chains):
+    _, page_section_dao, _ = daos
+    _, _, _, unlinked = chains[notebooks[0].id]
+
+    assert [p.section_number for p in page_section_dao.lineage(unlinked)] == [unlinked.section_number]
+
+
+def test_lineage_stays_in_the_notebook(daos, notebooks, chains):
+    _, page_section_dao, _ = daos
+
+    for notebook in notebooks:
+        lineage = page_section_dao.lineage(chains[notebook.id][2])
+        assert [p.section_number for p in lineage] == [p.section_number for p in chains[notebook.id][:3]]
+        assert {p.notebook.id for p in lineage} == {notebook.id}
+
+
+def test_created_by_is_loaded_on_first_access(daos, notebooks, chains):
+    _, page_section_dao, _ = daos
+
+    for notebook in notebooks:
+        page_a, page_b, page_c, unlinked = chains[notebook.id]
+        found = find(page_section_dao, notebook, page_c.section_number)
+
+        assert found.created_by_id == page_b.section_number
+        assert attributes(found)['created_by'] is None
+
+        created_by = found.created_by
+        assert (created_by.section_number, created_by.notebook.id) == (page_b.section_number, notebook.id)
+        assert created_by.created_by.section_number == page_a.section_number
+        assert created_by.created_by.created_by is None
+        assert find(page_section_dao, notebook, unlinked.section_number).created_by is None
+
+
+def test_find_by_created_by_id(daos, notebooks, chains):
+    _, page_section_dao, _ = daos
+
+    for notebook in notebooks:
+        page_a, page_b, page_c, unlinked = chains[notebook.id]
+
+        def created_by(section_number):
+            return [p.section_number for p in page_section_dao.find_by_field(
+                PageSection(notebook=notebook, created_by_id=section_number))]
+
+        assert created_by(page_a.section_number) == [page_b.section_number]
+        assert created_by(page_b.section_number) == [page_c.section_number]
+        # The page sections without children
+        assert created_by(page_c.section_number) == []
+        assert created_by(unlinked.section_number) == []
+
+
+def test_update_in_a_session_keeps_the_fields_of_the_pending_page_section(parquet_store):
+    from app.core.dao_parquet import NotebookDAO, PageSectionDAO, SentenceDAO
+    from app.core.session import Session
+
+    notebook = NotebookDAO().insert(Notebook('english', created_at=DAY, list_size=3, days_period=15))
+    sentence = SentenceDAO().insert(Sentence(created_at=DAY, foreign_language='f', mother_tongue='m'))
+    page_a = insert(PageSectionDAO(), notebook, [sentence], Group.A, 0)
+
+    session = Session()
+    page_section_dao = PageSectionDAO(session)
+    page_b = insert(page_section_dao, notebook, [sentence], Group.B, 15, created_by=page_a)
+    distill(page_section_dao, page_b, notebook)
+    session.commit()
+
+    stored = find(PageSectionDAO(), notebook, page_b.section_number)
+    assert stored.created_by_id == page_a.section_number
+    assert stored.page_number == page_b.page_number
+    assert stored.distillated
@@ -0,0 +1,153 @@
+import datetime
+import pickle
+
+import pytest
+
+from app.model import Group, Notebook, PageSection, PageSectionList, Sentence
+
+DAY = datetime.date(2023, 10, 1)
+GROUPS = [Group.A, Group.B, Group.C, Group.D]
+
+
+def page_section(number, group, days, created_at=DAY):
+    return PageSection(section_number=number, group=group, created_at=created_at,
+                       distillation_at=DAY + datetime.timedelta(days=days))
+
+
+def page_sections():
+    # Repeated (distillation_at, group) pairs and page sections without created_at
+    return [page_section(1, Group.A, 0),
+            page_section(2, Group.A, 0),
+            page_section(3, Group.B, 0),
+            page_section(4, Group.A, 1, created_at=None),
+            page_section(5, Group.A, 1),
+            page_section(6, Group.C, 2),
+            page_section(7, Group.D, 2, created_at=None)]
+
+
+def scan_get(page_section_list, distillation_at, group):
+    return next((p for p in page_section_list
+                 if p.created_at is not None and p.distillation_at == distillation_at and p.group == group), None)
+
+
+def scan_count(page_section_list, group):
+    return sum(1 for p in page_section_list if p.created_at and p.group.value == group.value)
+
+
+def assert_matches_scan(page_section_list):
+    for days in range(4):
+        distillation_at = DAY + datetime.timedelta(days=days)
+        for group in GROUPS:
+            assert page_section_list.get(distillation_at, group) is scan_get(page_section_list, distillation_at, group)
+    for group in GROUPS:
+        assert page_section_list.count(group) == scan_count(page_section_list, group)
+
+
+MUTATIONS = {
+    'append'     : lambda l: l.append(page_section(8, Group.B, 3)),
+    'extend'     : lambda l: l.extend(iter([page_section(8, Group.A, 0), page_section(9, Group.D, 3)])),
+    'iadd'       : lambda l: l.__iadd__([page_section(8, Group.C, 2)]),
+    'insert'     : lambda l: l.insert(0, page_section(8, Group.A, 0)),
+    'remove'     : lambda l: l.remove(l[0]),
+    'pop'        : lambda l: l.pop(0),
+    'clear'      : lambda l: l.clear(),
+    'sort'       : lambda l: l.sort(key=lambda p: -p.section_number),
+    'reverse'    : lambda l: l.reverse(),
+    'setitem'    : lambda l: l.__setitem__(0, page_section(8, Group.D, 0)),
+    'set_slice'  : lambda l: l.__setitem__(slice(0, 3), [page_section(8, Group.B, 1)]),
+    'delitem'    : lambda l: l.__delitem__(1),
+    'del_slice'  : lambda l: l.__delitem__(slice(0, 2)),
+    'imul'       : lambda l: l.__imul__(2),
+}
+
+
+@pytest.mark.parametrize('mutation', MUTATIONS.values(), ids=MUTATIONS.keys())
+def test_lookups_match_a_linear_scan_after_a_change(mutation):
+    page_section_list = PageSectionList(page_sections())
+    assert_matches_scan(page_section_list)
+
+    mutation(page_section_list)
+
+    assert_matches_scan(page_section_list)
+
+
+def test_lookups_match_a_linear_scan_after_pickling():
+    page_section_list = pickle.loads(pickle.dumps(PageSectionList(page_sections())))
+
+    assert isinstance(page_section_list, PageSectionList)
+    assert_matches_scan(page_section_list)
+
+
+def test_notebook_lookups_go_through_the_index():
+    notebook = Notebook('english', page_section_list=page_sections())
+
+    assert notebook.get_page_section(distillation_at=DAY, group=Group.A).section_number == 1
+    assert notebook.get_page_section(distillation_at=DAY, group=Group.D) is None
+    assert notebook.count_page_section_by_group(group=Group.A) == 3
+    assert notebook.count_page_section_by_group(group=Group.HEADLIST) == 3
+    assert notebook.count_page_section_by_group(group=Group.D) == 0
+
+    notebook.add_page_section(page_section(8, Group.D, 3))
+
+    assert notebook.count_page_section_by_group(group=Group.D) == 1
+
+
+def test_loader_runs_once_on_first_access():
+    loads = []
+    notebook = Notebook('english', page_section_loader=lambda n: loads.append(n) or page_sections())
+
+    assert not notebook.page_section_list_loaded
+    assert loads == []
+
+    assert notebook.count_page_section_by_group(group=Group.A) == 3
+    assert notebook.get_page_section(distillation_at=DAY, group=Group.B).section_number == 3
+    assert len(notebook.page_section_list) == 7
+
+    assert loads == [notebook]
+    assert notebook.page_section_list_loaded
+
+
+def test_add_page_section_does_not_load_the_list():
+    loads = []
+    stored = page_sections()
+    notebook = Notebook('english', page_section_loader=lambda n: loads.append(n) or list(stored))
+
+    # The page section is stored first, the loader then reads it with the others
+    stored.append(page_section(8, Group.D, 3))
+    notebook.add_page_section(stored[-1])
+
+    assert loads == []
+    assert notebook.count_page_section_by_group(group=Group.D) == 1
+    assert loads == [notebook]
+
+
+@pytest.fixture(params=['parquet', 'redis'])
+def dao_module(request):
+    if request.param == 'parquet':
+        request.getfixturevalue('parquet_store')
+        from app.core import dao_parquet as dao_module
+    else:
+        request.getfixturevalue('redis_server')
+        from app.core import dao_redis as dao_module
+    return dao_module
+
+
+def test_get_all_loads_each_page_section_list_once(dao_module, monkeypatch):
+    notebook = dao_module.NotebookDAO().insert(Notebook('english', created_at=DAY, list_size=3, days_period=15))
+    sentence = dao_module.SentenceDAO().insert(Sentence(created_at=DAY, foreign_language='f', mother_tongue='m'))
+    dao_module.PageSectionDAO().insert(PageSection(group=Group.A, created_at=DAY, distillation_at=DAY,
+                                                   notebook=notebook, sentences=[sentence],
+                                                   translated_sentences=[''], memorializeds=[False]))
+
+    loads = []
+    load_page_section_list = dao_module.NotebookDAO.load_page_section_list
+    monkeypatch.setattr(dao_module.NotebookDAO, 'load_page_section_list',
+                        lambda self, n: loads.append(n.id) or load_page_section_list(self, n))
+
+    [loaded] = dao_module.NotebookDAO().get_all(Notebook())
+
+    assert loads == []
+    assert loaded.count_page_section_by_group(group=Group.A) == 1
+    [stored] = loaded.page_section_list
+    assert loaded.get_page_section(distillation_at=stored.distillation_at, group=Group.A) is stored
+    assert loads == [notebook.id]
@@ -0,0 +1,82 @@
+import datetime
+
+import pytest
+
+from app.model import Notebook, Sentence
+
+fakeredis = pytest.importorskip('fakeredis')
+
+DAY = datetime.date(2023, 10, 1)
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """app.core.redis_client with its shared pools opened on a fakeredis server
+    """
+    monkeypatch.delenv('REDIS_KEY_LAYOUT', raising=False)
+    monkeypatch.delenv('REDIS_CLUSTER', raising=False)
+    from app.core import redis_client
+    from app.core.near_cache import near_cache
+
+    server = fakeredis.FakeServer()
+    get_redis_config = redis_client.get_redis_config
+    monkeypatch.setattr(redis_client, 'get_redis_config',
+                        lambda: dict(get_redis_config(), connection_class=fakeredis.FakeRedisConnection, server=server))
+    redis_client.close_pool()
+    near_cache.invalidate()
+
+    yield redis_client
+
+    near_cache.invalidate()
+    redis_client.close_pool()
+
+
+def test_daos_created_in_a_loop_share_one_pool(redis_client):
+    from app.core.dao_redis import NotebookDAO, SentenceDAO
+
+    pools = set()
+    for i in range(20):
+        notebook_dao, sentence_dao = NotebookDAO(), SentenceDAO()
+        notebook_dao.insert(Notebook(f'notebook {i}', created_at=DAY, list_size=3, days_period=15))
+        sentence_dao.insert(Sentence(created_at=DAY, foreign_language=f'f{i}', mother_tongue=f'm{i}'))
+        pools |= {id(notebook_dao.r.connection_pool), id(sentence_dao.r.connection_pool)}
+
+    assert pools == {id(redis_client.get_pool())}
+    assert len(NotebookDAO().get_all(Notebook())) == 20
+    assert redis_client.pool_stats() == {'max_connections': redis_client.MAX_CONNECTIONS,
+                                         'created': 1, 'idle': 1, 'in_use': 0}
+
+
+def test_pool_stats_counts_the_lent_connections(redis_client):
+    assert redis_client.pool_stats() == {'max_connections': None, 'created': 0, 'idle': 0, 'in_use': 0}
+
+    pool = redis_client.get_pool()
+    first, second = pool.get_connection(), pool.get_connection()
+
+    assert redis_client.pool_stats()['created'] == 2
+    assert redis_client.pool_stats()['in_use'] == 2
+
+    pool.release(first)
+
+    assert redis_client.pool_stats() == {'max_connections': redis_client.MAX_CONNECTIONS,
+                                         'created': 2, 'idle': 1, 'in_use': 1}
+
+    pool.release(second)
+    assert redis_client.pool_stats()['in_use'] == 0
+
+
+def test_cluster_mode_rejects_the_blocking_pool_settings(monkeypatch):
+    from app.core import redis_client
+
+    for name in ('HOST', 'PORT', 'PASSWORD', 'POOL_TIMEOUT', 'HEALTH_CHECK_INTERVAL'):
+        monkeypatch.delenv(f'REDIS_{name}', raising=False)
+    monkeypatch.setenv('REDIS_CLUSTER', 'true')
+    monkeypatch.setenv('REDIS_MAX_CONNECTIONS', '4')
+    assert redis_client.get_cluster_config() == {'host': 'localhost', 'port': 6379, 'password': None,
+                                                 'max_connections': 4}
+
+    for name in ('POOL_TIMEOUT', 'HEALTH_CHECK_INTERVAL'):
+        with monkeypatch.context() as m:
+            m.setenv(f'REDIS_{name}', '10')
+            with pytest.raises(Exception, match=name):
+                redis_client.get_cluster_config()
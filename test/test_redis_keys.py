@@ -0,0 +1,88 @@
+import datetime
+
+import pytest
+from redis.crc import key_slot
+
+from app.core.redis_keys import PAGE_SECTION_INDEX_FIELDS, ClusterKeyLayout, KeyLayout, get_key_layout
+from app.model import Group, Notebook, PageSection, Sentence
+
+DAY = datetime.date(2023, 10, 1)
+
+# Keys of the cluster layout shared by all notebooks
+GLOBAL_KEYS = {'notebook_names', 'notebook_id_sequence', 'sentence_id_sequence'}
+
+
+def slot(key):
+    return key_slot(key.encode() if isinstance(key, str) else key)
+
+
+def notebook_keys(keys, notebook_id):
+    data = {'notebook_id': notebook_id, 'group': 'A', 'created_at': '2023-10-01', 'distillation_at': '2023-10-16',
+            'section_number': 1, 'created_by_id': None, 'distillated': False}
+    return [keys.notebook(notebook_id),
+            keys.page_section('0a1b', notebook_id),
+            keys.page_section_ids(notebook_id),
+            keys.page_section_membership(notebook_id),
+            keys.section_number_sequence(notebook_id),
+            keys.sentence_progress(notebook_id),
+            *(keys.page_number_sequence(notebook_id, group.value) for group in Group),
+            *keys.page_section_indexes(data)]
+
+
+@pytest.mark.parametrize('notebook_id', [1, 42, 100000])
+def test_the_keys_of_a_notebook_share_the_slot_of_its_hash_tag(notebook_id):
+    keys = notebook_keys(ClusterKeyLayout(), notebook_id)
+
+    assert len(keys) == 6 + len(Group) + len(PAGE_SECTION_INDEX_FIELDS)
+    assert {slot(key) for key in keys} == {slot(f'nb:{notebook_id}')}
+
+
+def test_the_notebooks_spread_over_the_slots():
+    keys = ClusterKeyLayout()
+
+    assert len({slot(keys.notebook(notebook_id)) for notebook_id in range(1, 101)}) > 90
+    assert len({slot(keys.sentence(sentence_id)) for sentence_id in range(1, 101)}) > 90
+    assert keys.sentence(1) == keys.sentence(1 + 1024)
+
+
+def test_get_key_layout(monkeypatch):
+    monkeypatch.delenv('REDIS_KEY_LAYOUT', raising=False)
+    assert type(get_key_layout()) is KeyLayout
+
+    monkeypatch.setenv('REDIS_KEY_LAYOUT', 'cluster')
+    assert type(get_key_layout()) is ClusterKeyLayout
+
+    monkeypatch.setenv('REDIS_KEY_LAYOUT', 'sharded')
+    with pytest.raises(Exception, match='"sharded" does not exist'):
+        get_key_layout()
+
+
+def test_every_key_written_in_the_cluster_layout_has_a_hash_tag(redis_server, monkeypatch):
+    from app.core.dao_redis import NotebookDAO, PageSectionDAO, SentenceDAO
+    from app.core.redis_client import get_redis
+
+    monkeypatch.setenv('REDIS_KEY_LAYOUT', 'cluster')
+    notebook_dao, page_section_dao, sentence_dao = NotebookDAO(), PageSectionDAO(), SentenceDAO()
+    sentences = sentence_dao.insert_many([Sentence(created_at=DAY, foreign_language=f'f{i}', mother_tongue=f'm{i}')
+                                          for i in range(3)])
+    notebooks = [notebook_dao.insert(Notebook(name, created_at=DAY, list_size=3, days_period=15))
+                 for name in ('english', 'spanish')]
+    for notebook in notebooks:
+        page_a = page_section_dao.insert(PageSection(group=Group.A, created_at=DAY, distillation_at=DAY,
+                                                     notebook=notebook, sentences=sentences,
+                                                     translated_sentences=[''] * 3, memorializeds=[False] * 3))
+        page_section_dao.insert(PageSection(group=Group.B, created_at=DAY, distillation_at=DAY, notebook=notebook,
+                                            sentences=sentences, translated_sentences=[''] * 3,
+                                            memorializeds=[False] * 3, created_by=page_a))
+
+    written = {key for key in get_redis().scan_iter()}
+
+    assert GLOBAL_KEYS <= written
+    untagged = {key for key in written - GLOBAL_KEYS if not (key.startswith('{') and '}' in key)}
+    assert untagged == set()
+    for notebook in notebooks:
+        tag = f'{{nb:{notebook.id}}}'
+        notebook_keys_written = {key for key in written if key.startswith(tag)}
+        assert notebook_dao.keys.notebook(notebook.id) in notebook_keys_written
+        assert len(notebook_keys_written) > 10
+        assert {slot(key) for key in notebook_keys_written} == {slot(f'nb:{notebook.id}')}
@@ -0,0 +1,132 @@
+import datetime
+
+import pytest
+
+from app.model import Group, Notebook, PageSection, Sentence, SentenceProgress
+
+DAY = datetime.date(2023, 10, 1)
+
+
+@pytest.fixture(params=['parquet', 'redis'])
+def daos(request):
+    if request.param == 'parquet':
+        request.getfixturevalue('parquet_store')
+        from app.core import dao_parquet as dao_module
+    else:
+        request.getfixturevalue('redis_server')
+        from app.core import dao_redis as dao_module
+    return (dao_module.NotebookDAO(), dao_module.PageSectionDAO(), dao_module.SentenceDAO(),
+            dao_module.SentenceProgressDAO())
+
+
+@pytest.fixture
+def notebook(daos):
+    notebook_dao, _, _, _ = daos
+    return notebook_dao.insert(Notebook('english', created_at=DAY, list_size=3, days_period=15))
+
+
+@pytest.fixture
+def sentences(daos):
+    _, _, sentence_dao, _ = daos
+    return [sentence_dao.insert(Sentence(created_at=DAY, foreign_language=f'f{i}', mother_tongue=f'm{i}'))
+            for i in range(2)]
+
+
+def insert(page_section_dao, notebook, sentences, group, days, created_by=None):
+    return page_section_dao.insert(PageSection(group=group,
+                                               created_at=DAY + datetime.timedelta(days=days),
+                                               distillation_at=DAY + datetime.timedelta(days=days + 15),
+                                               notebook=notebook,
+                                               sentences=sentences,
+                                               translated_sentences=[''] * len(sentences),
+                                               memorializeds=[False] * len(sentences),
+                                               created_by=created_by))
+
+
+def distill(page_section_dao, page_section, notebook, days):
+    entity = PageSection(section_number=page_section.section_number,
+                         group=page_section.group,
+                         created_at=page_section.created_at,
+                         distillation_at=page_section.distillation_at,
+                         distillation_actual=DAY + datetime.timedelta(days=days),
+                         distillated=True,
+                         notebook=notebook,
+                         sentences=page_section.sentences,
+                         translated_sentences=page_section.translated_sentences,
+                         memorializeds=page_section.memorializeds)
+    return page_section_dao.update(entity)
+
+
+def progress_of(sentence_progress_dao, sentences, notebook_id=None):
+    return [(p.section_number, p.group, str(p.last_distillation_at) if p.last_distillation_at else None)
+            for p in sentence_progress_dao.get_many([s.id for s in sentences], notebook_id)]
+
+
+def test_a_newer_page_section_replaces_the_progress(daos, notebook, sentences):
+    _, page_section_dao, _, sentence_progress_dao = daos
+
+    page_a = insert(page_section_dao, notebook, sentences, Group.A, 0)
+    page_b = insert(page_section_dao, notebook, sentences[:1], Group.B, 15, created_by=page_a)
+
+    assert progress_of(sentence_progress_dao, sentences, notebook.id) == [
+        (page_b.section_number, Group.B, None),
+        (page_a.section_number, Group.A, None),
+    ]
+
+
+def test_an_older_page_section_distilled_later_only_moves_the_last_distillation(daos, notebook, sentences):
+    _, page_section_dao, _, sentence_progress_dao = daos
+
+    page_a = insert(page_section_dao, notebook, sentences, Group.A, 0)
+    page_b = insert(page_section_dao, notebook, sentences[:1], Group.B, 15, created_by=page_a)
+    distill(page_section_dao, page_a, notebook, 20)
+
+    assert progress_of(sentence_progress_dao, sentences, notebook.id) == [
+        (page_b.section_number, Group.B, '2023-10-21'),
+        (page_a.section_number, Group.A, '2023-10-21'),
+    ]
+
+
+def test_get_many_without_the_notebook_reads_every_notebook(daos, notebook, sentences):
+    notebook_dao, page_section_dao, _, sentence_progress_dao = daos
+    other_notebook = notebook_dao.insert(Notebook('spanish', created_at=DAY, list_size=3, days_period=15))
+
+    page_a = insert(page_section_dao, notebook, sentences, Group.A, 0)
+    page_other = insert(page_section_dao, other_notebook, sentences[1:], Group.A, 1)
+    distill(page_section_dao, page_other, other_notebook, 16)
+
+    assert progress_of(sentence_progress_dao, sentences) == [
+        (page_a.section_number, Group.A, None),
+        (page_other.section_number, Group.A, '2023-10-17'),
+    ]
+    assert sentence_progress_dao.get_by_id(SentenceProgress(sentence_id=sentences[0].id)).notebook_id == notebook.id
+
+
+def test_rebuild_replaces_the_progress_of_the_notebook(daos, notebook, sentences):
+    _, page_section_dao, _, sentence_progress_dao = daos
+
+    page_a = insert(page_section_dao, notebook, sentences, Group.A, 0)
+    insert(page_section_dao, notebook, sentences[:1], Group.B, 15, created_by=page_a)
+    expected = sentence_progress_dao.get_all(SentenceProgress(notebook_id=notebook.id))
+
+    def stored():
+        return sorted(attributes_of(p) for p in sentence_progress_dao.get_all(SentenceProgress(notebook_id=notebook.id)))
+
+    def attributes_of(progress):
+        return (progress.sentence_id, progress.section_number, progress.group, str(progress.created_at),
+                progress.next_distillation_at and str(progress.next_distillation_at))
+
+    # The progress of a page section that is not stored is dropped by the rebuild
+    stray = PageSection(section_number=99, group=Group.A, created_at=DAY, distillation_at=DAY, notebook=notebook,
+                        sentences=[Sentence(99)], memorializeds=[False])
+    if sentence_progress_dao.__module__.endswith('dao_parquet'):
+        sentence_progress_dao.advance([stray])
+    else:
+        sentence_progress_dao.advance(stray)
+    assert len(stored()) == len(expected) + 1
+
+    sentence_progress_dao.rebuild(notebook.id)
+    first = stored()
+    sentence_progress_dao.rebuild(notebook.id)
+
+    assert stored() == first == sorted(attributes_of(p) for p in expected)
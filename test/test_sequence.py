@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from app.core.sequence import SequenceStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SequenceStore(tmp_path / 'sequence.json')
+
+
+def test_next_value_counts_from_one(store):
+    assert [store.next_value('id') for _ in range(3)] == [1, 2, 3]
+    assert store.next_value('other') == 1
+    assert store.current_value('id') == 3
+
+
+def test_a_block_of_values_is_reserved(store):
+    assert store.next_value('id', count=5) == 1
+    assert store.next_value('id') == 6
+
+    with pytest.raises(Exception, match='not possible to reserve 0 values'):
+        store.next_value('id', count=0)
+
+
+def test_the_seed_is_used_only_for_a_new_sequence(store):
+    seeds = []
+
+    def seed():
+        seeds.append(1)
+        return 41
+
+    assert store.next_value('id', seed=seed) == 42
+    assert store.next_value('id', seed=seed) == 43
+    assert seeds == [1]
+
+    # The max() of an empty column is not a number
+    assert store.next_value('empty', seed=lambda: float('nan')) == 1
+
+
+def test_the_values_are_kept_on_disk(tmp_path, store):
+    store.next_value('id', count=10)
+
+    assert SequenceStore(tmp_path / 'sequence.json').next_value('id') == 11
+
+
+def test_concurrent_stores_never_hand_out_a_value_twice(tmp_path):
+    # Each thread has its own store, so only the lock file serializes them
+    values = []
+
+    def allocate():
+        store = SequenceStore(tmp_path / 'sequence.json')
+        allocated = [store.next_value('id') for _ in range(50)]
+        values.extend(allocated)
+
+    threads = [threading.Thread(target=allocate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(values) == list(range(1, 201))
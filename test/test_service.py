@@ -0,0 +1,91 @@
+import datetime
+import unicodedata
+
+import pandas as pd
+import pytest
+
+from app.core.session import Session
+from app.model import Group, Notebook, Sentence
+
+DAY = datetime.date(2023, 10, 1)
+
+
+@pytest.fixture
+def insert_calls(parquet_store, monkeypatch):
+    from app.core.dao_parquet import SentenceDAO
+
+    calls = []
+    insert_many = SentenceDAO.insert_many
+
+    def recording_insert_many(self, entities):
+        calls.append([s.foreign_language for s in entities])
+        return insert_many(self, entities)
+
+    monkeypatch.setattr(SentenceDAO, 'insert_many', recording_insert_many)
+    return calls
+
+
+@pytest.fixture
+def notebook(parquet_store):
+    from app.core.dao_parquet import NotebookDAO
+    return NotebookDAO().insert(Notebook('english', created_at=DAY, list_size=3, days_period=15,
+                                         foreign_idiom='en', mother_idiom='pt'))
+
+
+def headlist(*foreign_languages):
+    return pd.DataFrame({'foreign_language': list(foreign_languages),
+                         'mother_tongue': [f'm-{f}' for f in foreign_languages],
+                         'remembered': [False] * len(foreign_languages),
+                         'translated_sentence': [''] * len(foreign_languages)})
+
+
+def build(notebook, dataframe, session=None):
+    from app.core.service import build_page_section_with_sentence_list
+    return build_page_section_with_sentence_list(dataframe=dataframe, selected_day=DAY, notebook=notebook,
+                                                 group=Group.HEADLIST, session=session)
+
+
+def test_existing_sentences_are_reused_and_new_ones_inserted_at_once(notebook, insert_calls):
+    from app.core.dao_parquet import SentenceDAO
+    existing = SentenceDAO().insert(Sentence(created_at=DAY, foreign_language='b', mother_tongue='B'))
+    insert_calls.clear()
+
+    page_section = build(notebook, headlist('a', 'b', 'c'))
+
+    assert insert_calls == [['a', 'c']]
+    assert [s.foreign_language for s in page_section.sentences] == ['a', 'b', 'c']
+    assert page_section.sentences[1].id == existing.id
+    assert page_section.sentences[0].mother_tongue == 'm-a'
+    assert page_section.sentences[0].foreign_idiom == 'en'
+    assert page_section.distillation_at == DAY + datetime.timedelta(days=15)
+
+
+def test_a_sentence_repeated_in_the_list_is_inserted_once(notebook, insert_calls):
+    page_section = build(notebook, headlist('a', 'b', 'a'))
+
+    assert insert_calls == [['a', 'b']]
+    assert page_section.sentences[0] is page_section.sentences[2]
+
+
+def test_the_sentences_pending_in_the_session_are_reused(notebook, insert_calls):
+    from app.core.dao_parquet import SentenceDAO
+
+    session = Session()
+    first = build(notebook, headlist('a', 'b'), session=session)
+    second = build(notebook, headlist('b', 'c'), session=session)
+
+    assert insert_calls == [['a', 'b'], ['c']]
+    assert second.sentences[0] is first.sentences[1]
+    # Nothing is written before the commit
+    assert SentenceDAO().find_by_foreign_languages(['a', 'b', 'c']) == {}
+
+    session.commit()
+    assert sorted(SentenceDAO().find_by_foreign_languages(['a', 'b', 'c'])) == ['a', 'b', 'c']
+
+
+def test_texts_that_only_differ_in_their_normalization_are_one_sentence(notebook, insert_calls):
+    page_section = build(notebook, headlist('café', unicodedata.normalize('NFD', 'café'), 'a  b', 'a b'))
+
+    assert len(insert_calls) == 1 and len(insert_calls[0]) == 2
+    assert page_section.sentences[0] is page_section.sentences[1]
+    assert page_section.sentences[2] is page_section.sentences[3]
@@ -0,0 +1,114 @@
+import datetime
+
+import pytest
+
+from app.core.session import Session
+from app.model import Group, Notebook, PageSection, Sentence
+
+DAY = datetime.date(2023, 10, 1)
+
+
+class RecordingDAO():
+    def __init__(self, flushes):
+        self.flushes = flushes
+
+    def flush(self, inserted, updated):
+        self.flushes.append((type((inserted + updated)[0]).__name__, inserted, updated))
+
+
+def test_commit_flushes_each_table_once_in_order():
+    flushes = []
+    dao = RecordingDAO(flushes)
+    session = Session()
+    page_section = PageSection(section_number=1)
+    notebook = Notebook('english', id_=1)
+    sentence = Sentence(1)
+
+    session.add_new(dao, PageSection, 1, page_section)
+    session.add_new(dao, Sentence, 1, sentence)
+    session.add_new(dao, Notebook, 1, notebook)
+    session.commit()
+
+    assert flushes == [('Notebook', [notebook], []), ('Sentence', [sentence], []),
+                       ('PageSection', [page_section], [])]
+
+    session.commit()
+    assert len(flushes) == 3
+
+
+def test_an_entity_inserted_and_updated_is_written_once():
+    flushes = []
+    dao = RecordingDAO(flushes)
+    session = Session()
+    inserted = PageSection(section_number=1)
+    updated = PageSection(section_number=1, distillated=True)
+
+    session.add_new(dao, PageSection, 1, inserted)
+    session.add_dirty(dao, PageSection, 1, updated)
+    session.add_dirty(dao, PageSection, 2, PageSection(section_number=2))
+
+    assert session.get_pending(PageSection, 1) is updated
+    session.commit()
+
+    assert len(flushes) == 1
+    _, new, dirty = flushes[0]
+    assert new == [updated]
+    assert [p.section_number for p in dirty] == [2]
+
+
+def test_rollback_forgets_the_pending_entities():
+    flushes = []
+    session = Session()
+    loaded = session.register(Notebook, 1, Notebook('english', id_=1))
+
+    session.add_new(RecordingDAO(flushes), Notebook, 2, Notebook('spanish', id_=2))
+    session.rollback()
+    session.commit()
+
+    assert flushes == []
+    assert session.get(Notebook, 2) is None
+    assert session.get(Notebook, 1) is loaded
+    assert session.pending_new(Notebook) == []
+
+
+def test_the_identity_map_keeps_the_first_instance():
+    session = Session()
+    first = session.register(Notebook, 1, Notebook('english', id_=1))
+
+    assert session.register(Notebook, 1, Notebook('english', id_=1)) is first
+    assert session.get_many(Notebook, [1, 2]) == {1: first}
+
+
+def test_the_context_manager_commits_or_rolls_back():
+    flushes = []
+
+    with Session() as session:
+        session.add_new(RecordingDAO(flushes), Notebook, 1, Notebook('english', id_=1))
+    assert len(flushes) == 1
+
+    with pytest.raises(ValueError):
+        with Session() as session:
+            session.add_new(RecordingDAO(flushes), Notebook, 2, Notebook('spanish', id_=2))
+            raise ValueError()
+    assert len(flushes) == 1
+
+
+def test_parquet_daos_write_on_commit(parquet_store):
+    from app.core.dao_parquet import NotebookDAO, PageSectionDAO, SentenceDAO
+
+    session = Session()
+    notebook = NotebookDAO(session).insert(Notebook('english', created_at=DAY, list_size=3, days_period=15))
+    sentence = SentenceDAO(session).insert(Sentence(created_at=DAY, foreign_language='f', mother_tongue='m'))
+    page_section = PageSectionDAO(session).insert(PageSection(group=Group.A, created_at=DAY, distillation_at=DAY,
+                                                              notebook=notebook, sentences=[sentence],
+                                                              translated_sentences=[''], memorializeds=[False]))
+
+    # Nothing is written before the commit, but the session already returns its entities
+    assert PageSectionDAO().get_many([page_section.section_number]) == [None]
+    assert PageSectionDAO(session).get_many([page_section.section_number]) == [page_section]
+
+    session.commit()
+
+    stored = PageSectionDAO().get_many([page_section.section_number])[0]
+    assert stored.notebook.name == 'english'
+    assert [s.foreign_language for s in stored.sentences] == ['f']
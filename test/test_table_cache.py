@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+
+from app.core.dataset import ParquetDataset
+from app.core.table_cache import TableCache
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return ParquetDataset(tmp_path / 'page',
+                          columns=['id', 'notebook_id', 'value'],
+                          types=['Int64', 'Int64', str],
+                          key=['id'],
+                          partition_by='notebook_id')
+
+
+def rows(*values):
+    return pd.DataFrame([{'id': id_, 'notebook_id': notebook_id, 'value': value} for id_, notebook_id, value in values])
+
+
+def test_query_is_cached_until_its_partition_changes(dataset):
+    cache = TableCache()
+    cache.append(dataset, rows((1, 1, 'a'), (2, 2, 'b')))
+
+    df = cache.query(dataset, [('notebook_id', '==', 1)])
+    assert df['value'].tolist() == ['a']
+
+    # A write to another partition, made outside the cache, keeps the result
+    dataset.append(rows((3, 2, 'c')))
+    assert cache.query(dataset, [('notebook_id', '==', 1)]) is df
+
+    # A write to the partition of the query, made outside the cache, is seen
+    dataset.append(rows((4, 1, 'd')))
+    assert cache.query(dataset, [('notebook_id', '==', 1)])['value'].tolist() == ['a', 'd']
+
+
+def test_partition_query_is_pushed_down_after_a_full_read(dataset, monkeypatch):
+    cache = TableCache()
+    cache.append(dataset, rows((1, 1, 'a'), (2, 2, 'b')))
+    assert len(cache.read(dataset)) == 2
+
+    def filter_frame(*args, **kwargs):
+        raise AssertionError('the full table was filtered')
+
+    monkeypatch.setattr(dataset, 'filter_frame', filter_frame)
+    assert cache.query(dataset, [('notebook_id', '==', 2)])['value'].tolist() == ['b']
+    assert cache.query(dataset, [('notebook_id', 'in', [1, 3])])['value'].tolist() == ['a']
+
+    with pytest.raises(AssertionError):
+        cache.query(dataset, [('value', '==', 'b')])
+
+
+def test_append_invalidates_the_cached_queries_and_table(dataset):
+    cache = TableCache()
+    cache.append(dataset, rows((1, 1, 'a')))
+    assert cache.query(dataset, [('notebook_id', '==', 1)])['value'].tolist() == ['a']
+    assert len(cache.read(dataset)) == 1
+
+    cache.append(dataset, rows((1, 1, 'a2'), (2, 1, 'b')))
+
+    assert cache.query(dataset, [('notebook_id', '==', 1)])['value'].tolist() == ['a2', 'b']
+    assert cache.read(dataset)['value'].tolist() == ['a2', 'b']
+    assert cache.query(dataset, [('value', '==', 'a')]).empty
+
+
+def test_out_of_band_write_invalidates_the_full_table(dataset):
+    cache = TableCache()
+    cache.append(dataset, rows((1, 1, 'a')))
+    assert len(cache.read(dataset)) == 1
+
+    dataset.append(rows((2, 2, 'b')))
+
+    assert cache.read(dataset)['value'].tolist() == ['a', 'b']
+    assert cache.query(dataset, [('value', '==', 'b')])['id'].tolist() == [2]
+
+
+def test_query_of_a_missing_partition_is_empty(dataset):
+    cache = TableCache()
+    cache.append(dataset, rows((1, 1, 'a')))
+
+    df = cache.query(dataset, [('notebook_id', '==', 9)], columns=['id', 'value'])
+
+    assert df.empty
+    assert list(df.columns) == ['id', 'value']
+
+
+def test_replace_partition_drops_the_old_records(dataset):
+    cache = TableCache()
+    cache.append(dataset, rows((1, 1, 'a'), (2, 1, 'b'), (3, 2, 'c')))
+    assert cache.read(dataset)['value'].tolist() == ['a', 'b', 'c']
+
+    cache.replace_partition(dataset, 1, rows((2, 1, 'B')).drop(columns='notebook_id'))
+
+    assert sorted(cache.read(dataset)['value'].tolist()) == ['B', 'c']
+    assert cache.query(dataset, [('notebook_id', '==', 1)])['id'].tolist() == [2]
+
+    cache.replace_partition(dataset, 1, rows())
+    assert cache.query(dataset, [('notebook_id', '==', 1)]).empty